@@ -3,196 +3,337 @@
 Fixed Face Recognition Backend - Proper name storage and retrieval
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 import cv2
-import face_recognition
-import pickle
 import os
-import pandas as pd
+import sys
 import uuid
+import threading
 from datetime import datetime
 import numpy as np
 import traceback
 import json
+import shutil
+import tempfile
+
+# Shared modules (face_gallery, face_store, ...) live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_gallery import FaceGallery, LiveGallery
+from face_store import open_store
+from face_config import load_config
+from user_registry import open_registry
+from face_index import (create_index, load_or_build_index, match_batch, match_top_k, match_candidates,
+                        match_identities, search_identities, load_identity_policy, IDENTITY_AGGREGATES)
+from registration_writer import RegistrationWriter, RegistrationQueueFull
+from registration_jobs import RegistrationJobs, JobQueueFull
+from encoding_pool import EncodingPool, PoolSaturated
+from micro_batcher import MicroBatcher
+from recognition_sessions import RecognitionSessions
+from result_cache import ResultCache, content_key, perceptual_key
+from recognition_stream import RecognitionStreams, StreamLimitReached
+from batch_recognition import BatchRecognizer, BatchStats, iter_archive
+
+try:
+    from flask_sock import Sock
+except ImportError:  # optional: without it streaming clients use Server-Sent Events
+    Sock = None
 
 # Create Flask app
 app = Flask(__name__)
-CORS(app, origins="*", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
+# max_age: streaming clients POST raw frames, so let browsers cache the preflight
+CORS(app, origins="*", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"], max_age=600)
+sock = Sock(app) if Sock is not None else None
 
 # Constants
 REGISTER_DIR = "registered_faces"
-EXCEL_FILE = "registered_users.xlsx"
-ENCODINGS_FILE = "face_encodings.pkl"
+EXCEL_FILE = "registered_users.xlsx"  # export of REGISTRY_FILE
+REGISTRY_FILE = "registered_users.db"
+ENCODINGS_FILE = "face_encodings.pkl"  # legacy format, migrated into STORE_DIR
+STORE_DIR = "face_store"
+REGISTRATION_PROGRESS_INTERVAL = 30  # seconds between "still saving" job updates while a commit is queued
+MAX_CLIENT_FACES = 32  # client-supplied boxes/chips accepted per recognition request
+MIN_FACE_SIZE = 20  # pixels; smaller client boxes/chips cannot be encoded reliably
+ENCODING_DIM = 128  # face_recognition encoding length
+MAX_MATCH_QUERIES = 4096  # encodings per /api/match request
+MAX_MATCH_K = 50  # candidates returned per encoding
+STREAM_SLOT_TIMEOUT = 10  # seconds a stream waits for an encoding worker before reporting busy
+STREAM_KEEPALIVE = 15  # seconds between keep-alives on an idle stream
+BATCH_SLOT_TIMEOUT = 60  # seconds a batch image waits for an encoding worker
+ARCHIVE_SPOOL_BYTES = 64 * 1024 * 1024  # uploaded archives are copied to memory up to this, then to disk
+ARCHIVE_TYPES = ('application/zip', 'application/x-zip-compressed', 'application/x-tar',
+                 'application/gzip', 'application/x-gzip', 'application/x-bzip2', 'application/x-xz')
 
 # Ensure directories exist
 os.makedirs(REGISTER_DIR, exist_ok=True)
 
 class FixedFaceRecognitionSystem:
     def __init__(self):
-        self.known_encodings = []
-        self.known_names = []
-        self.known_metadata = []
+        self.config = load_config()
+        # Warm detection/encoding processes; request threads only decode and match
+        self.encoder = EncodingPool.from_config(self.config)
+        self.store = open_store(STORE_DIR, ENCODINGS_FILE)
+        # Held while serving: gallery_verify.py --swap refuses to replace a store in use
+        self.store_lease = self.store.hold()
+        self.registry = open_registry(
+            REGISTRY_FILE, EXCEL_FILE, self.store,
+            excel_export_every=self.config.getint("REGISTRY", "excel_export_every")
+        )
+        # Readers use live.snapshot; only registrations and reloads write
+        self.live = LiveGallery(FaceGallery(), create_index(self.config))
         self.load_known_faces()
         
+        # All registration writes go through one group-committing writer thread
+        self.writer = RegistrationWriter.from_config(
+            self.config, self.store, self.registry, self.live, reload=self.load_known_faces
+        ).start()
+        
         # Recognition settings
         self.tolerance = 0.45
         self.min_confidence = 60.0
+        # A session's recently seen person closer than this is accepted without the full search
+        self.early_accept = min(self.config.getfloat("SESSIONS", "early_accept"), self.tolerance)
+        # Match by nearest row or by nearest person ([IDENTITIES])
+        self.match_by, self.identity_aggregate, self.identity_probe = load_identity_policy(self.config)
+        
+        # Faces from concurrent requests are matched together in one gallery query
+        self.matcher = None
+        if self.config.getboolean("BATCHING", "enabled"):
+            self.matcher = MicroBatcher(
+                self._match_blocks,
+                max_batch=self.config.getint("BATCHING", "max_batch_faces"),
+                max_wait=self.config.getfloat("BATCHING", "max_wait_ms") / 1000.0,
+                name="recognition-batcher"
+            )
+        
+        # Polling clients that send a session id skip detection on unchanged frames
+        self.sessions = RecognitionSessions.from_config(self.config)
+        # Identical (or, optionally, perceptually identical) uploads reuse the last result
+        self.result_cache = ResultCache.from_config(self.config)
+        # Persistent WebSocket / Server-Sent Events recognition streams
+        self.streams = RecognitionStreams.from_config(self.config)
+    
+    @property
+    def snapshot(self):
+        """Current immutable gallery + index; grab it once per request"""
+        return self.live.snapshot
+    
+    @property
+    def gallery(self):
+        return self.live.snapshot.gallery
+    
+    @property
+    def index(self):
+        return self.live.snapshot.index
     
     def load_known_faces(self):
         """Load known faces with proper name association"""
-        self.known_encodings = []
-        self.known_names = []
-        self.known_metadata = []
-        
-        if os.path.exists(ENCODINGS_FILE):
-            try:
-                with open(ENCODINGS_FILE, "rb") as f:
-                    known_data = pickle.load(f)
-                
-                print(f"📂 Loading {len(known_data)} face records...")
-                
-                for i, entry in enumerate(known_data):
-                    if isinstance(entry, dict):
-                        # Check if entry has required fields
-                        if "encoding" in entry and "name" in entry:
-                            name = entry["name"]
-                            encoding = entry["encoding"]
-                            
-                            # Validate encoding
-                            if isinstance(encoding, np.ndarray) and encoding.shape == (128,):
-                                self.known_encodings.append(encoding)
-                                self.known_names.append(name)
-                                self.known_metadata.append(entry)
-                                print(f"   ✅ Loaded: {name} (ID: {entry.get('id', 'unknown')})")
-                            else:
-                                print(f"   ❌ Invalid encoding for {name}")
-                        else:
-                            print(f"   ❌ Missing name or encoding in entry {i}")
-                    else:
-                        print(f"   ❌ Invalid entry format at index {i}")
-                
-                print(f"✅ Successfully loaded {len(self.known_names)} valid faces")
-                return True
-                
-            except Exception as e:
-                print(f"❌ Error loading faces: {e}")
-                traceback.print_exc()
-                return False
-        else:
-            print("📝 No existing face database found")
-            return False
-    
-    def save_face_data(self, name, encoding, image_path, unique_id):
-        """Save face data with proper name association"""
         try:
-            # Load existing data
-            if os.path.exists(ENCODINGS_FILE):
-                with open(ENCODINGS_FILE, "rb") as f:
-                    data = pickle.load(f)
-            else:
-                data = []
+            # Built off to the side; recognitions keep the old snapshot until the swap
+            snapshot = self.live.rebuild(self._build_gallery)
             
-            # Create new entry with all required fields
-            new_entry = {
-                "name": name,
-                "encoding": encoding,
-                "image_path": image_path,
-                "id": unique_id,
-                "timestamp": datetime.now().isoformat(),
-                "quality": "high"
-            }
-            
-            # Add to data
-            data.append(new_entry)
-            
-            # Save back to file
-            with open(ENCODINGS_FILE, "wb") as f:
-                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
-            
-            print(f"💾 Saved face data for {name} with ID {unique_id}")
-            
-            # Also save to Excel for backup
-            self.save_to_excel(name, unique_id, image_path)
-            
-            # Reload the known faces
-            self.load_known_faces()
+            if len(snapshot) == 0:
+                print("📝 No existing face database found")
+                return False
             
+            print(f"✅ Successfully loaded {len(snapshot)} valid faces")
             return True
             
         except Exception as e:
-            print(f"❌ Error saving face data: {e}")
+            print(f"❌ Error loading faces: {e}")
             traceback.print_exc()
             return False
     
-    def save_to_excel(self, name, unique_id, image_path):
-        """Save registration to Excel file"""
+    def _build_gallery(self):
+        """Fresh (gallery, index) pair from the face store"""
+        precision = self.config.get("GALLERY", "precision")
+        rerank = self.config.getint("GALLERY", "rerank")
+        vectors, metadata = self.store.load()
+        
+        if not metadata:
+            return FaceGallery(precision=precision, rerank=rerank), create_index(self.config)
+        
+        # Vectors stay memory-mapped; only names/ids are materialized
+        names = [entry["name"] for entry in metadata]
+        gallery = FaceGallery.from_arrays(
+            vectors, names, metadata,
+            precision=precision,
+            rerank=rerank,
+            exact_source=self.store.load_vectors
+        )
+        return gallery, load_or_build_index(gallery, self.config)
+    
+    def submit_registration(self, name, encoding, image_path, unique_id, image_bytes=None):
+        """Queue a registration for the writer thread (raises RegistrationQueueFull)"""
+        return self.writer.submit(name, encoding, image_path, unique_id, image_bytes)
+    
+    def recognize_faces_with_names(self, face_encodings, session=None):
+        """Recognize a K x 128 block of faces, batched with other concurrent requests
+        
+        With a session, faces are first compared with the people it recognized
+        recently; only faces none of them clearly matches take the full search.
+        """
+        if len(face_encodings) == 0:
+            return []
+        
+        face_encodings = np.asarray(face_encodings, dtype=np.float32)
+        results = [None] * len(face_encodings)
+        if session is not None:
+            results = self._match_recent(face_encodings, session)
+        
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            block = face_encodings[pending]
+            matches = self.matcher(block) if self.matcher is not None else self._recognize_block(block)
+            for i, match in zip(pending, matches):
+                results[i] = match
+        
+        if session is not None:
+            session.remember([name for name, _, _ in results if name != "Unknown"])
+        return results
+    
+    def _match_recent(self, face_encodings, session):
+        """Match faces against the session's recent people only; None where the full search is needed"""
+        results = [None] * len(face_encodings)
+        snapshot = self.snapshot
+        identities = snapshot.identities
+        candidates = [identity for identity in map(identities.find, session.recent_identities()) if identity is not None]
+        if not candidates:
+            return results
+        
+        # Same distance definition as the full search, over a handful of people
+        aggregate = self.identity_aggregate if self.match_by == "identity" else "min"
+        rows, distances, confidences = match_candidates(
+            identities, snapshot.gallery, face_encodings, candidates, aggregate
+        )
+        for i, (row, distance, confidence) in enumerate(zip(rows, distances, confidences)):
+            distance, confidence = float(distance), float(confidence)
+            if row >= 0 and distance <= self.early_accept and confidence >= self.min_confidence:
+                recognized_name = snapshot.gallery.names[row]
+                app.logger.debug("Recognized %s (confidence %.1f%%, distance %.3f, recent)", recognized_name, confidence, distance)
+                results[i] = (recognized_name, confidence, distance)
+        
+        session.count_lookups(len(results), sum(result is not None for result in results))
+        return results
+    
+    def _match_blocks(self, blocks):
+        """Micro-batcher callback: one gallery query for the faces of several requests"""
+        results = self._recognize_block(np.concatenate(blocks))
+        bounds = np.cumsum([0] + [len(block) for block in blocks])
+        return [results[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    
+    def _recognize_block(self, face_encodings):
+        """Recognize a K x 128 block of faces with a single batched gallery query"""
+        # One snapshot for the whole batch: names, vectors and index always agree
+        snapshot = self.snapshot
+        gallery = snapshot.gallery
+        
+        if len(gallery) == 0:
+            return [("Unknown", 0.0, 1.0)] * len(face_encodings)
+        
         try:
-            log_data = {
-                "Name": name,
-                "ID": unique_id,
-                "Image": image_path,
-                "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "Status": "Active"
-            }
-            
-            if os.path.exists(EXCEL_FILE):
-                df = pd.read_excel(EXCEL_FILE)
-                df = pd.concat([df, pd.DataFrame([log_data])], ignore_index=True)
+            # One index query (one matrix product for brute force) for all K faces
+            if self.match_by == "identity":
+                rows, distances, confidences = match_identities(
+                    snapshot.identities, gallery, face_encodings, self.identity_aggregate, self.identity_probe
+                )
             else:
-                df = pd.DataFrame([log_data])
+                rows, distances, confidences = match_batch(snapshot.index, gallery, face_encodings)
             
-            df.to_excel(EXCEL_FILE, index=False)
-            print(f"📊 Excel updated for {name}")
+            results = []
+            for row, best_distance, confidence in zip(rows, distances, confidences):
+                best_distance, confidence = float(best_distance), float(confidence)
+                
+                if row < 0:
+                    results.append(("Unknown", 0.0, 1.0))
+                # Check if match is good enough
+                elif best_distance <= self.tolerance and confidence >= self.min_confidence:
+                    recognized_name = gallery.names[row]
+                    app.logger.debug("Recognized %s (confidence %.1f%%, distance %.3f)", recognized_name, confidence, best_distance)
+                    results.append((recognized_name, confidence, best_distance))
+                else:
+                    app.logger.debug("No match (best %s, confidence %.1f%%)", gallery.names[row], confidence)
+                    results.append(("Unknown", confidence, best_distance))
+            
+            return results
             
         except Exception as e:
-            print(f"⚠️ Excel update warning: {e}")
+            print(f"❌ Recognition error: {e}")
+            return [("Unknown", 0.0, 1.0)] * len(face_encodings)
     
     def recognize_face_with_name(self, face_encoding):
         """Recognize face and return correct name"""
-        if not self.known_encodings:
-            return "Unknown", 0.0, 1.0
+        return self.recognize_faces_with_names([face_encoding])[0]
+    
+    def match_encodings(self, face_encodings, k=1, by="row", aggregate=None):
+        """Top-k gallery candidates for each encoding; the nearest one is accepted
+        with the same tolerance/confidence rules as recognize_face_with_name
         
-        try:
-            # Calculate distances to all known faces
-            face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
-            
-            # Find best match
-            best_match_index = np.argmin(face_distances)
-            best_distance = face_distances[best_match_index]
-            
-            # Calculate confidence
-            confidence = max(0, (1 - best_distance) * 100)
-            
-            # Check if match is good enough
-            if best_distance <= self.tolerance and confidence >= self.min_confidence:
-                recognized_name = self.known_names[best_match_index]
-                
-                print(f"✅ Recognized: {recognized_name} (confidence: {confidence:.1f}%, distance: {best_distance:.3f})")
-                
-                return recognized_name, confidence, best_distance
-            else:
-                print(f"❓ No match found (best: {self.known_names[best_match_index] if self.known_names else 'None'}, confidence: {confidence:.1f}%)")
-                return "Unknown", confidence, best_distance
-                
-        except Exception as e:
-            print(f"❌ Recognition error: {e}")
-            return "Unknown", 0.0, 1.0
+        by="row" ranks stored encodings; by="identity" ranks people, combining
+        each person's encodings with `aggregate` (min, mean or centroid).
+        """
+        snapshot = self.snapshot
+        gallery = snapshot.gallery
+        names, ids = gallery.names, gallery.ids
+        
+        if by == "identity":
+            identities = snapshot.identities
+            ranked = search_identities(identities, gallery, face_encodings, k,
+                                       aggregate or self.identity_aggregate, self.identity_probe)
+            candidate_lists = [[{
+                'name': identities.names[identity],
+                'user_id': ids[row] if row is not None else None,
+                'confidence': max(0.0, (1.0 - distance) * 100.0),
+                'distance': distance,
+                'encodings': len(identities.members[identity])
+            } for identity, distance, row in best] for best in ranked]
+        else:
+            rows, distances, confidences = match_top_k(snapshot.index, gallery, face_encodings, k)
+            candidate_lists = [[{
+                'name': names[row],
+                'user_id': ids[row],
+                'confidence': float(confidence),
+                'distance': float(distance)
+            } for row, distance, confidence in zip(query_rows, query_distances, query_confidences) if row >= 0]
+                for query_rows, query_distances, query_confidences in zip(rows, distances, confidences)]
+        
+        results = []
+        for candidates in candidate_lists:
+            best = candidates[0] if candidates else {'confidence': 0.0, 'distance': 1.0}
+            matched = bool(candidates) and best['distance'] <= self.tolerance and best['confidence'] >= self.min_confidence
+            results.append({
+                'name': best['name'] if matched else 'Unknown',
+                'confidence': best['confidence'],
+                'distance': best['distance'],
+                'matched': matched,
+                'candidates': candidates
+            })
+        
+        return results
 
-# Initialize the system
-face_system = FixedFaceRecognitionSystem()
+# Initialize the system (encoding workers re-import this file as __mp_main__ and skip it)
+if __name__ != '__mp_main__':
+    face_system = FixedFaceRecognitionSystem()
 
 @app.route('/', methods=['GET'])
 def root():
     return jsonify({
         'message': 'Fixed Face Recognition Backend Server',
         'status': 'running',
-        'registered_faces': len(face_system.known_names),
+        'registered_faces': len(face_system.gallery),
         'endpoints': {
             'GET /api/status': 'Server status',
-            'POST /api/register': 'Register new face',
+            'POST /api/register': 'Register new face (returns a job id)',
+            'GET /api/register/jobs/<id>': 'Registration job progress and result',
             'POST /api/recognize': 'Recognize faces',
-            'GET /api/users': 'List registered users'
+            'POST /api/recognize/batch': 'Recognize many images (multipart images or a zip/tar archive), NDJSON out',
+            'GET /api/recognize/stream': 'Server-Sent Events recognition stream (?session=)',
+            'POST /api/recognize/stream/<id>/frames': 'Push a JPEG frame into an open stream',
+            'WS /api/recognize/ws': 'WebSocket recognition stream (needs flask-sock)',
+            'POST /api/match': 'Top-k gallery matches (rows or identities) for raw 128-d encodings',
+            'GET /api/users': 'List registered users (?offset=&limit=&prefix=)',
+            'GET /api/users/<id>': 'Look up one registered user',
+            'GET /api/users/export': 'Download registered users as Excel'
         }
     })
 
@@ -202,16 +343,98 @@ def get_status():
         return '', 200
     
     try:
+        registered_faces = len(face_system.snapshot)
         return jsonify({
             'status': 'connected',
             'message': 'Backend server running',
-            'registered_faces': len(face_system.known_names),
-            'database_loaded': len(face_system.known_encodings) > 0,
+            'registered_faces': registered_faces,
+            'database_loaded': registered_faces > 0,
+            'registration_writer': face_system.writer.stats(),
+            'pending_registrations': registration_jobs.pending(),
+            'encoding_workers': face_system.encoder.stats(),
+            'recognition_batching': face_system.matcher.stats() if face_system.matcher else None,
+            'recognition_sessions': face_system.sessions.stats(),
+            'result_cache': face_system.result_cache.stats() if face_system.result_cache else None,
+            'recognition_streams': face_system.streams.stats(),
+            'websocket': sock is not None,
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def process_registration(job, name, image_data):
+    """Registration pipeline run by a job worker; records progress on the job"""
+    job.update('decoding', 'Decoding image')
+    nparr = np.frombuffer(image_data, np.uint8)
+    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    
+    if frame is None:
+        job.finish(False, 'Invalid image format', 400)
+        return
+    
+    # Convert to RGB for face_recognition
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    
+    # Find and encode the face on an encoding worker (waits for a free slot)
+    job.update('detecting', 'Detecting and encoding face')
+    face_locations, face_encodings = face_system.encoder.detect_and_encode(
+        rgb_frame, num_jitters=10, max_faces=1, block=True
+    )
+    
+    if len(face_locations) == 0:
+        job.finish(False, 'No face detected in image', 400)
+        return
+    
+    if len(face_locations) > 1:
+        job.finish(False, 'Multiple faces detected. Please ensure only one face is visible', 400)
+        return
+    
+    if len(face_encodings) == 0:
+        job.finish(False, 'Could not encode face', 400)
+        return
+    
+    encoding = face_encodings[0]
+    
+    # Check for duplicates
+    job.update('checking', 'Checking for duplicates')
+    snapshot = face_system.snapshot
+    if len(snapshot) > 0:
+        face_distances, rows = snapshot.index.search(snapshot.gallery, encoding, k=1)
+        if rows[0, 0] >= 0 and face_distances[0, 0] < 0.4:
+            existing_name = snapshot.gallery.names[rows[0, 0]]
+            job.finish(False, f'Face already registered as "{existing_name}"', 400)
+            return
+    
+    # Generate unique ID; the image is written by the registration writer
+    unique_id = str(uuid.uuid4())[:8]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{name}_{unique_id}_{timestamp}.jpg"
+    image_path = os.path.join(REGISTER_DIR, filename)
+    
+    encoded, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    if not encoded:
+        job.finish(False, 'Could not encode image', 500)
+        return
+    
+    # Queue for the next group commit and wait until it is durable
+    job.update('saving', 'Saving registration')
+    try:
+        pending = face_system.submit_registration(name, encoding, image_path, unique_id, jpeg.tobytes())
+    except RegistrationQueueFull:
+        job.finish(False, 'Too many registrations in progress, please try again shortly', 503)
+        return
+    
+    job.wait_for(pending, REGISTRATION_PROGRESS_INTERVAL, 'Still saving registration, the writer is busy')
+    
+    if pending.success:
+        print(f"💾 Image saved: {filename}")
+        job.finish(True, pending.message, 200, user_id=unique_id, registered_count=len(face_system.snapshot))
+    else:
+        job.finish(False, pending.message, 400 if pending.duplicate_of else 500)
+
+if __name__ != '__mp_main__':
+    registration_jobs = RegistrationJobs.from_config(face_system.config, process_registration)
+
 @app.route('/api/register', methods=['POST', 'OPTIONS'])
 def register_face():
     if request.method == 'OPTIONS':
@@ -244,82 +467,29 @@ def register_face():
                 'message': 'No image file selected'
             }), 400
         
-        # Process image
         image_data = image_file.read()
-        nparr = np.frombuffer(image_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if frame is None:
+        if not image_data:
             return jsonify({
                 'success': False,
-                'message': 'Invalid image format'
+                'message': 'Empty image file'
             }), 400
         
-        # Convert to RGB for face_recognition
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Find faces
-        face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-        
-        if len(face_locations) == 0:
-            return jsonify({
-                'success': False,
-                'message': 'No face detected in image'
-            }), 400
-        
-        if len(face_locations) > 1:
-            return jsonify({
-                'success': False,
-                'message': 'Multiple faces detected. Please ensure only one face is visible'
-            }), 400
-        
-        # Get face encoding
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=10)
-        
-        if len(face_encodings) == 0:
+        # Cheap checks only; detection, encoding and saving run as a background job
+        try:
+            job = registration_jobs.submit(name, name, image_data)
+        except JobQueueFull:
             return jsonify({
                 'success': False,
-                'message': 'Could not encode face'
-            }), 400
-        
-        encoding = face_encodings[0]
-        
-        # Check for duplicates
-        if face_system.known_encodings:
-            face_distances = face_recognition.face_distance(face_system.known_encodings, encoding)
-            if len(face_distances) > 0 and np.min(face_distances) < 0.4:
-                min_index = np.argmin(face_distances)
-                existing_name = face_system.known_names[min_index]
-                return jsonify({
-                    'success': False,
-                    'message': f'Face already registered as "{existing_name}"'
-                }), 400
-        
-        # Generate unique ID and save image
-        unique_id = str(uuid.uuid4())[:8]
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{name}_{unique_id}_{timestamp}.jpg"
-        image_path = os.path.join(REGISTER_DIR, filename)
-        
-        # Save image
-        cv2.imwrite(image_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        print(f"💾 Image saved: {filename}")
+                'message': 'Too many registrations in progress, please try again shortly'
+            }), 503
         
-        # Save face data with proper name association
-        success = face_system.save_face_data(name, encoding, image_path, unique_id)
-        
-        if success:
-            return jsonify({
-                'success': True,
-                'message': f'Face registered successfully for {name}',
-                'user_id': unique_id,
-                'registered_count': len(face_system.known_names)
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Failed to save face data'
-            }), 500
+        return jsonify({
+            'success': True,
+            'message': f'Registration queued for {name}',
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': f'/api/register/jobs/{job.job_id}'
+        }), 202
             
     except Exception as e:
         print(f"❌ Registration error: {e}")
@@ -329,6 +499,201 @@ def register_face():
             'message': f'Registration failed: {str(e)}'
         }), 500
 
+@app.route('/api/register/jobs/<job_id>', methods=['GET', 'OPTIONS'])
+def registration_job_status(job_id):
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    job = registration_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': f'Registration job {job_id} not found'
+        }), 404
+    
+    # 200 while running or after success; failures carry the pipeline's status code
+    status = job.to_dict()
+    return jsonify(status), job.http_status if job.finished and not job.success else 200
+
+def parse_face_boxes(raw, shape=None):
+    """Client-supplied face boxes: a JSON list of {top, right, bottom, left} objects or
+    [top, right, bottom, left] lists, clipped to the frame when its shape is given"""
+    try:
+        boxes = json.loads(raw)
+    except ValueError:
+        raise ValueError('boxes must be JSON')
+    if not isinstance(boxes, list):
+        raise ValueError('boxes must be a list')
+    if len(boxes) > MAX_CLIENT_FACES:
+        raise ValueError(f'at most {MAX_CLIENT_FACES} faces per request')
+    
+    face_locations = []
+    for box in boxes:
+        try:
+            if isinstance(box, dict):
+                box = [box['top'], box['right'], box['bottom'], box['left']]
+            top, right, bottom, left = (int(round(float(value))) for value in box)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('each box needs top, right, bottom and left')
+        
+        if shape is not None:
+            top, left = max(0, top), max(0, left)
+            bottom, right = min(shape[0], bottom), min(shape[1], right)
+        if bottom - top < MIN_FACE_SIZE or right - left < MIN_FACE_SIZE:
+            raise ValueError(f'boxes must be at least {MIN_FACE_SIZE}x{MIN_FACE_SIZE} pixels inside the image')
+        face_locations.append((top, right, bottom, left))
+    
+    return face_locations
+
+def recognition_result(matches, face_locations):
+    """/api/recognize response body for per-face matches and their locations"""
+    recognized_faces = []
+    
+    for (name, confidence, distance), face_location in zip(matches, face_locations):
+        top, right, bottom, left = face_location
+        
+        recognized_faces.append({
+            'name': name,
+            'confidence': float(confidence),
+            'distance': float(distance),
+            'location': {
+                'top': int(top),
+                'right': int(right),
+                'bottom': int(bottom),
+                'left': int(left)
+            }
+        })
+    
+    return {
+        'success': True,
+        'faces': recognized_faces,
+        'total_faces': len(recognized_faces),
+        'known_faces': len([f for f in recognized_faces if f['name'] != 'Unknown'])
+    }
+
+def busy_response(error):
+    """503 with Retry-After for a saturated encoding pool"""
+    response = jsonify({
+        'success': False,
+        'message': 'Server busy, please retry shortly',
+        'retry_after': error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def recognize_face_chips(chip_files):
+    """Pre-cropped face chips: each chip is encoded as one face filling the whole chip"""
+    if len(chip_files) > MAX_CLIENT_FACES:
+        return jsonify({
+            'success': False,
+            'message': f'At most {MAX_CLIENT_FACES} face chips per request'
+        }), 400
+    
+    items = []
+    for chip_file in chip_files:
+        chip = cv2.imdecode(np.frombuffer(chip_file.read(), np.uint8), cv2.IMREAD_COLOR)
+        if chip is None or min(chip.shape[:2]) < MIN_FACE_SIZE:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid face chip image'
+            }), 400
+        
+        height, width = chip.shape[:2]
+        items.append((cv2.cvtColor(chip, cv2.COLOR_BGR2RGB), [(0, width, height, 0)]))
+    
+    # Boxes sent along say where each chip sits in the client's frame
+    face_locations = [locations[0] for _, locations in items]
+    if 'boxes' in request.form:
+        try:
+            face_locations = parse_face_boxes(request.form['boxes'])
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'Invalid face boxes: {e}'}), 400
+        if len(face_locations) != len(items):
+            return jsonify({'success': False, 'message': 'Need exactly one box per face chip'}), 400
+    
+    try:
+        face_encodings = face_system.encoder.encode(items, num_jitters=5)
+    except PoolSaturated as e:
+        return busy_response(e)
+    
+    matches = face_system.recognize_faces_with_names(face_encodings)
+    return jsonify({**recognition_result(matches, face_locations), 'reused': False})
+
+def recognize_image(image_data, session=None, client_boxes=None, block=False):
+    """Full /api/recognize pipeline for one encoded image; returns the response body
+    
+    Raises ValueError for unusable input and PoolSaturated when the encoding
+    workers are busy (block=True waits up to STREAM_SLOT_TIMEOUT for a slot).
+    """
+    # Face boxes from client-side detection replace the HOG pass (and its caches)
+    if client_boxes is not None:
+        session = None
+    
+    # Same bytes as a recent upload (checked before decoding): answer from the cache
+    cache = face_system.result_cache if client_boxes is None else None
+    version = face_system.snapshot.version
+    cache_keys = []
+    if cache is not None:
+        cache_keys.append(content_key(image_data))
+        cached = cache.get(cache_keys[0], version)
+        if cached is not None:
+            return {**cached, 'reused': True, 'cached': True}
+    
+    nparr = np.frombuffer(image_data, np.uint8)
+    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    
+    if frame is None:
+        raise ValueError('Invalid image format')
+    
+    face_locations = None
+    if client_boxes is not None:
+        try:
+            face_locations = parse_face_boxes(client_boxes, frame.shape)
+        except ValueError as e:
+            raise ValueError(f'Invalid face boxes: {e}')
+    
+    if cache is not None and cache.perceptual:
+        cache_keys.append(perceptual_key(frame))
+        cached = cache.get(cache_keys[1], version)
+        if cached is not None:
+            return {**cached, 'reused': True, 'cached': True}
+    
+    # Nothing moved since this client's last analysed frame: answer from that result
+    if session is not None:
+        previous = session.reuse(frame, version)
+        if previous is not None:
+            return {**previous, 'reused': True}
+    
+    # Convert to RGB
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    
+    # Find faces on an encoding worker; shed load instead of queueing without bound
+    timeout = STREAM_SLOT_TIMEOUT if block else None
+    try:
+        if face_locations is None:
+            face_locations, face_encodings = face_system.encoder.detect_and_encode(
+                rgb_frame, num_jitters=5, block=block, timeout=timeout
+            )
+        else:
+            face_encodings = face_system.encoder.encode(
+                [(rgb_frame, face_locations)], num_jitters=5, block=block, timeout=timeout
+            )
+    except PoolSaturated:
+        if session is not None:
+            session.invalidate()
+        raise
+    
+    # Match every detected face: this client's recent people first, then the gallery in one batch
+    matches = face_system.recognize_faces_with_names(face_encodings, session)
+    
+    result = recognition_result(matches, face_locations)
+    if session is not None:
+        session.store(result, version)
+    if cache is not None:
+        cache.put(cache_keys, result, version)
+    
+    return {**result, 'reused': False}
+
 @app.route('/api/recognize', methods=['POST', 'OPTIONS'])
 def recognize_face():
     if request.method == 'OPTIONS':
@@ -337,6 +702,11 @@ def recognize_face():
     try:
         print("🔍 Recognition request received")
         
+        # Faces already detected and cropped by the client: nothing to detect
+        chip_files = request.files.getlist('chips')
+        if chip_files:
+            return recognize_face_chips(chip_files)
+        
         if 'image' not in request.files:
             return jsonify({
                 'success': False,
@@ -352,55 +722,281 @@ def recognize_face():
         
         # Process image
         image_data = image_file.read()
-        nparr = np.frombuffer(image_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        session_id = request.form.get('session')
+        session = face_system.sessions.get(session_id) if session_id else None
         
-        if frame is None:
+        try:
+            return jsonify(recognize_image(image_data, session, request.form.get('boxes')))
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'message': 'Invalid image format'
+                'message': str(e)
             }), 400
+        except PoolSaturated as e:
+            return busy_response(e)
         
-        # Convert to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Find faces
-        face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=5)
-        
-        recognized_faces = []
+    except Exception as e:
+        print(f"❌ Recognition error: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'message': f'Recognition failed: {str(e)}'
+        }), 500
+
+def stream_analyzer(session):
+    """analyze(frame_bytes) for a recognition stream: never raises, errors become messages"""
+    def analyze(image_data):
+        try:
+            # Waiting for a worker is fine here: newer frames replace this one meanwhile
+            return recognize_image(image_data, session, block=True)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}
+        except PoolSaturated as e:
+            return {'success': False, 'message': 'Server busy', 'retry_after': e.retry_after}
+        except Exception as e:
+            # Includes a worker timing out: the stream reports it and carries on with the next frame
+            print(f"❌ Stream recognition error: {e}")
+            traceback.print_exc()
+            return {'success': False, 'message': f'Recognition failed: {str(e) or type(e).__name__}'}
+    return analyze
+
+def open_recognition_stream(session_id):
+    """Open (or reopen) the stream for a client session; raises StreamLimitReached"""
+    session_id = session_id or uuid.uuid4().hex
+    session = face_system.sessions.get(session_id)
+    return face_system.streams.open(session_id, stream_analyzer(session))
+
+def stream_message(stream, item):
+    """Result message sent back on a stream, tagged with its frame number"""
+    frame_no, result = item
+    return {**result, 'frame': frame_no, 'dropped': stream.stats()['dropped']}
+
+@app.route('/api/recognize/stream', methods=['GET'])
+def recognize_stream_events():
+    """Server-Sent Events half of a stream; frames arrive via POST .../frames"""
+    try:
+        stream = open_recognition_stream(request.args.get('session'))
+    except StreamLimitReached as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    
+    def events():
+        try:
+            yield f"event: ready\ndata: {json.dumps({'stream_id': stream.stream_id})}\n\n"
+            while not stream.closed:
+                item = stream.next_result(timeout=STREAM_KEEPALIVE)
+                if item is not None:
+                    yield f"data: {json.dumps(stream_message(stream, item))}\n\n"
+                elif stream.idle_for() > face_system.streams.idle_timeout:
+                    break
+                else:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+        finally:
+            face_system.streams.close(stream)
+    
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/recognize/stream/<stream_id>/frames', methods=['POST', 'OPTIONS'])
+def recognize_stream_frame(stream_id):
+    """Push one JPEG frame (raw body or multipart 'image') into an open stream"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    stream = face_system.streams.get(stream_id)
+    if stream is None:
+        return jsonify({'success': False, 'message': 'Stream not found'}), 404
+    
+    image_data = request.files['image'].read() if 'image' in request.files else request.get_data()
+    if not image_data:
+        return jsonify({'success': False, 'message': 'Empty frame'}), 400
+    
+    return jsonify({'success': True, 'frame': stream.submit(image_data)}), 202
+
+if sock is not None:
+    @sock.route('/api/recognize/ws')
+    def recognize_stream_socket(ws):
+        """WebSocket stream: binary JPEG frames in, JSON results out"""
+        try:
+            stream = open_recognition_stream(request.args.get('session'))
+        except StreamLimitReached as e:
+            ws.send(json.dumps({'success': False, 'message': str(e)}))
+            return
         
-        for i, (face_encoding, face_location) in enumerate(zip(face_encodings, face_locations)):
-            # Use fixed recognition with proper name retrieval
-            name, confidence, distance = face_system.recognize_face_with_name(face_encoding)
-            
-            top, right, bottom, left = face_location
-            
-            recognized_faces.append({
-                'name': name,
-                'confidence': float(confidence),
-                'distance': float(distance),
-                'location': {
-                    'top': int(top),
-                    'right': int(right),
-                    'bottom': int(bottom),
-                    'left': int(left)
-                }
-            })
+        def send_results():
+            while not stream.closed:
+                item = stream.next_result(timeout=STREAM_KEEPALIVE)
+                if item is None:
+                    continue
+                try:
+                    ws.send(json.dumps(stream_message(stream, item)))
+                except Exception:
+                    break
         
+        threading.Thread(target=send_results, name="stream-sender", daemon=True).start()
+        try:
+            while True:
+                data = ws.receive(timeout=face_system.streams.idle_timeout)
+                if data is None:
+                    break
+                if isinstance(data, (bytes, bytearray)):
+                    stream.submit(bytes(data))
+        finally:
+            face_system.streams.close(stream)
+
+def batch_images():
+    """(name, bytes) images of a /api/recognize/batch request; raises ValueError when none were sent"""
+    max_image_bytes = face_system.config.getint("BATCH_RECOGNITION", "max_image_mb") * 1024 * 1024
+    
+    # Uploaded files are closed when the view returns, before the streamed response reads them
+    image_files = request.files.getlist('images')
+    if image_files:
+        return [(image_file.filename or f'image-{i}', image_file.read()) for i, image_file in enumerate(image_files)]
+    if 'archive' in request.files:
+        archive = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_BYTES)
+        shutil.copyfileobj(request.files['archive'].stream, archive)
+        archive.seek(0)
+        return iter_archive(archive, max_image_bytes)
+    # Raw archive body: tar is read while it uploads
+    if request.mimetype in ARCHIVE_TYPES:
+        return iter_archive(request.stream, max_image_bytes)
+    
+    raise ValueError("Send 'images' files, an 'archive' file, or a zip/tar body")
+
+def batch_analyzer(num_jitters):
+    """analyze(image_bytes) -> (locations, encodings) for BatchRecognizer"""
+    def analyze(image_data):
+        frame = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError('Invalid image format')
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # A batch waits for workers instead of being shed like interactive requests
+        return face_system.encoder.detect_and_encode(
+            rgb_frame, num_jitters=num_jitters, block=True, timeout=BATCH_SLOT_TIMEOUT
+        )
+    return analyze
+
+def batch_line(index, name, face_locations, matches, error):
+    """One NDJSON result line of /api/recognize/batch"""
+    if error is None:
+        return {'index': index, 'image': name, **recognition_result(matches, face_locations)}
+    
+    line = {'index': index, 'image': name, 'success': False, 'message': str(error)}
+    if isinstance(error, PoolSaturated):
+        line.update(message='Server busy', retry_after=error.retry_after)
+    elif not isinstance(error, ValueError):
+        line['message'] = f'Recognition failed: {error}'
+    return line
+
+@app.route('/api/recognize/batch', methods=['POST', 'OPTIONS'])
+def recognize_batch():
+    """Recognize many images; one JSON line per image (input order), then a summary line"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        images = batch_images()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    recognizer = BatchRecognizer.from_config(
+        face_system.config,
+        batch_analyzer(face_system.config.getint("BATCH_RECOGNITION", "num_jitters")),
+        face_system.recognize_faces_with_names,
+        workers=face_system.encoder.workers
+    )
+    
+    def lines():
+        stats = BatchStats()
+        try:
+            for index, name, face_locations, matches, error in recognizer.run(images):
+                stats.add(matches, error)
+                yield json.dumps(batch_line(index, name, face_locations, matches, error)) + "\n"
+        except ValueError as e:
+            # Unreadable archive: report it in-band, the 200 status is already sent
+            yield json.dumps({'success': False, 'message': str(e)}) + "\n"
+        print(f"📦 Batch recognition: {stats.images} images, {stats.faces} faces, {stats.errors} errors")
+        yield json.dumps({'done': True, **stats.summary()}) + "\n"
+    
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+
+def parse_match_request():
+    """(K x 128 float32 encodings, k, by, aggregate) from an /api/match body
+
+    Either raw little-endian float32 values (application/octet-stream, options
+    in the query string) or JSON {"encodings": [[...128 numbers], ...], "k": 3}
+    (a single "encoding" is accepted too). Options: k, by (row or identity)
+    and aggregate (min, mean or centroid; identity search only).
+    """
+    options = dict(request.args.items())
+    
+    if request.mimetype == 'application/octet-stream':
+        data = request.get_data()
+        if not data or len(data) % (ENCODING_DIM * 4):
+            raise ValueError(f'body must hold a whole number of {ENCODING_DIM}-value float32 encodings')
+        encodings = np.frombuffer(data, dtype='<f4').reshape(-1, ENCODING_DIM)
+    else:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise ValueError('expected a JSON object or an application/octet-stream body')
+        raw = body.get('encodings', [body['encoding']] if 'encoding' in body else None)
+        if raw is None:
+            raise ValueError('missing "encodings"')
+        try:
+            encodings = np.asarray(raw, dtype=np.float32)
+        except (TypeError, ValueError):
+            raise ValueError('encodings must be lists of numbers')
+        if encodings.ndim != 2 or encodings.shape[1] != ENCODING_DIM or len(encodings) == 0:
+            raise ValueError(f'each encoding must have {ENCODING_DIM} values')
+        options.update((key, body[key]) for key in ('k', 'by', 'aggregate') if key in body)
+    
+    if len(encodings) > MAX_MATCH_QUERIES:
+        raise ValueError(f'at most {MAX_MATCH_QUERIES} encodings per request')
+    if not np.isfinite(encodings).all():
+        raise ValueError('encodings must be finite numbers')
+    try:
+        k = int(options.get('k', 1))
+    except (TypeError, ValueError):
+        raise ValueError('k must be an integer')
+    if not 1 <= k <= MAX_MATCH_K:
+        raise ValueError(f'k must be between 1 and {MAX_MATCH_K}')
+    
+    by = options.get('by', 'row')
+    if by not in ('row', 'identity'):
+        raise ValueError('by must be "row" or "identity"')
+    aggregate = options.get('aggregate')
+    if aggregate is not None and aggregate not in IDENTITY_AGGREGATES:
+        raise ValueError(f'aggregate must be one of {", ".join(IDENTITY_AGGREGATES)}')
+    
+    return encodings, k, by, aggregate
+
+@app.route('/api/match', methods=['POST', 'OPTIONS'])
+def match_encodings():
+    """Identify precomputed face encodings: pure gallery search, no image decoding"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        encodings, k, by, aggregate = parse_match_request()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid match request: {e}'
+        }), 400
+    
+    try:
+        matches = face_system.match_encodings(encodings, k, by, aggregate)
         return jsonify({
             'success': True,
-            'faces': recognized_faces,
-            'total_faces': len(recognized_faces),
-            'known_faces': len([f for f in recognized_faces if f['name'] != 'Unknown'])
+            'matches': matches,
+            'total': len(matches),
+            'known': len([m for m in matches if m['matched']])
         })
-        
     except Exception as e:
-        print(f"❌ Recognition error: {e}")
+        print(f"❌ Match error: {e}")
         traceback.print_exc()
         return jsonify({
             'success': False,
-            'message': f'Recognition failed: {str(e)}'
+            'message': f'Match failed: {str(e)}'
         }), 500
 
 @app.route('/api/users', methods=['GET', 'OPTIONS'])
@@ -409,19 +1005,24 @@ def list_users():
         return '', 200
     
     try:
-        users = []
-        for i, (name, metadata) in enumerate(zip(face_system.known_names, face_system.known_metadata)):
-            users.append({
-                'id': metadata.get('id', f'user_{i}'),
-                'name': name,
-                'timestamp': metadata.get('timestamp', 'Unknown'),
-                'image_path': metadata.get('image_path', '')
-            })
+        # Served from the registry: no gallery vectors are touched
+        prefix = request.args.get('prefix', '').strip() or None
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = request.args.get('limit', type=int)
+        
+        users = [{
+            'id': user['id'],
+            'name': user['name'],
+            'timestamp': user['timestamp'],
+            'image_path': user['image_path']
+        } for user in face_system.registry.list_users(offset=offset, limit=limit, prefix=prefix)]
         
         return jsonify({
             'success': True,
             'users': users,
-            'total_users': len(users)
+            'total_users': face_system.registry.count(prefix=prefix),
+            'offset': offset,
+            'limit': limit
         })
         
     except Exception as e:
@@ -431,11 +1032,54 @@ def list_users():
             'message': str(e)
         }), 500
 
+@app.route('/api/users/<user_id>', methods=['GET', 'OPTIONS'])
+def get_user(user_id):
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        user = face_system.registry.get_user(user_id)
+        if user is None:
+            return jsonify({
+                'success': False,
+                'message': f'User {user_id} not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'user': user
+        })
+        
+    except Exception as e:
+        print(f"❌ Error fetching user {user_id}: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@app.route('/api/users/export', methods=['GET', 'OPTIONS'])
+def export_users():
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    try:
+        # On-demand spreadsheet for people who still want it
+        face_system.registry.export_excel(EXCEL_FILE)
+        project_dir = os.path.dirname(os.path.abspath(EXCEL_FILE))
+        return send_from_directory(project_dir, os.path.basename(EXCEL_FILE), as_attachment=True)
+        
+    except Exception as e:
+        print(f"❌ Error exporting users: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 if __name__ == '__main__':
     print("🚀 Starting Fixed Face Recognition Backend...")
     print("=" * 50)
     print(f"📍 Backend URL: http://localhost:5000")
-    print(f"📂 Registered faces: {len(face_system.known_names)}")
+    print(f"📂 Registered faces: {len(face_system.gallery)}")
     print("=" * 50)
     
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
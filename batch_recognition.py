@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Batch Recognition Module - Recognize many images per request
+
+Images come from a multipart upload or a zip/tar archive (tar may be
+compressed and is read as a stream, so results start before the upload is
+complete). A bounded window of images is decoded and detected/encoded on
+`threads` threads at once (each hands its frame to the encoding workers),
+then the faces of every `chunk_images` consecutive images are matched in one
+gallery query. Results come out in input order, one per image, as soon as
+their chunk is matched, so memory stays flat however many images are sent.
+"""
+
+import io
+import time
+import shutil
+import tarfile
+import zipfile
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CHUNK_IMAGES = 64
+DEFAULT_MAX_IMAGE_BYTES = 32 * 1024 * 1024
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+SPOOL_BYTES = 64 * 1024 * 1024  # zip archives without a seekable source are buffered, in memory up to this
+
+class ImageTooLarge(ValueError):
+    """An archive entry larger than the per-image limit"""
+
+def is_image_name(name):
+    """True for image file names, ignoring hidden files and macOS resource forks"""
+    base = name.replace("\\", "/").rsplit("/", 1)[-1]
+    return (not base.startswith(".") and "__MACOSX/" not in name
+            and base.lower().endswith(IMAGE_EXTENSIONS))
+
+class _Prefixed(io.RawIOBase):
+    """Read `head` first, then the rest of `stream` (puts back bytes peeked from a non-seekable stream)"""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.head:
+            count = min(len(buffer), len(self.head))
+            buffer[:count] = self.head[:count]
+            self.head = self.head[count:]
+            return count
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def iter_archive(stream, max_image_bytes=DEFAULT_MAX_IMAGE_BYTES):
+    """(name, bytes) for every image in a zip or tar archive, in archive order
+
+    Entries over max_image_bytes yield (name, ImageTooLarge) instead of their
+    bytes. Raises ValueError if the stream is neither format.
+    """
+    head = stream.read(4)
+    if head.startswith(b"PK"):
+        try:
+            stream.seek(0)
+            source = stream
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            # The zip directory is at the end: buffer the upload first
+            source = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+            source.write(head)
+            shutil.copyfileobj(stream, source)
+            source.seek(0)
+        try:
+            archive = zipfile.ZipFile(source)
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Invalid zip archive: {e}")
+        with archive:
+            for entry in archive.infolist():
+                if entry.is_dir() or not is_image_name(entry.filename):
+                    continue
+                if entry.file_size > max_image_bytes:
+                    yield entry.filename, ImageTooLarge(f"Image larger than {max_image_bytes} bytes")
+                    continue
+                yield entry.filename, archive.read(entry)
+        return
+
+    try:
+        archive = tarfile.open(fileobj=io.BufferedReader(_Prefixed(head, stream)), mode="r|*")
+    except tarfile.TarError as e:
+        raise ValueError(f"Expected a zip or tar archive: {e}")
+    with archive:
+        for entry in archive:
+            if not entry.isfile() or not is_image_name(entry.name):
+                continue
+            if entry.size > max_image_bytes:
+                yield entry.name, ImageTooLarge(f"Image larger than {max_image_bytes} bytes")
+                continue
+            yield entry.name, archive.extractfile(entry).read()
+
+class BatchRecognizer:
+    """Pipelined analyze(bytes) -> (locations, encodings) and batched match(encodings) -> matches"""
+
+    def __init__(self, analyze, match, threads=4, chunk_images=DEFAULT_CHUNK_IMAGES):
+        self.analyze = analyze
+        self.match = match
+        self.threads = max(1, int(threads))
+        self.chunk_images = max(1, int(chunk_images))
+        # Keep every thread busy while a whole chunk waits for its slowest image
+        self.window = self.chunk_images + 2 * self.threads
+
+    @classmethod
+    def from_config(cls, config, analyze, match, workers=1):
+        """BatchRecognizer from [BATCH_RECOGNITION]; threads = 0 means twice the encoding workers"""
+        threads = config.getint("BATCH_RECOGNITION", "threads") or 2 * workers
+        return cls(analyze, match, threads=threads,
+                   chunk_images=config.getint("BATCH_RECOGNITION", "chunk_images"))
+
+    def run(self, images):
+        """Yield (index, name, locations, matches, error) per (name, data) image, in input order
+
+        error is the exception that image raised (then locations/matches are
+        None); data may itself be an exception from the image source.
+        """
+        images = iter(images)
+        executor = ThreadPoolExecutor(self.threads, thread_name_prefix="batch-recognition")
+        pending = deque()
+        index = 0
+        try:
+            while True:
+                while len(pending) < self.window:
+                    item = next(images, None)
+                    if item is None:
+                        break
+                    name, data = item
+                    future = None if isinstance(data, Exception) else executor.submit(self.analyze, data)
+                    pending.append((index, name, future, data))
+                    index += 1
+
+                if not pending:
+                    return
+
+                chunk = [pending.popleft() for _ in range(min(self.chunk_images, len(pending)))]
+                analysed = []
+                for position, name, future, data in chunk:
+                    try:
+                        if future is None:
+                            raise data
+                        locations, encodings = future.result()
+                        analysed.append((position, name, locations, encodings, None))
+                    except Exception as e:
+                        analysed.append((position, name, None, None, e))
+
+                # One gallery query for every face of the chunk
+                encodings = [encoding for *_, found, error in analysed if error is None for encoding in found]
+                matches = self.match(encodings) if encodings else []
+                offset = 0
+                for position, name, locations, found, error in analysed:
+                    if error is not None:
+                        yield position, name, None, None, error
+                        continue
+                    yield position, name, locations, matches[offset:offset + len(found)], None
+                    offset += len(found)
+        finally:
+            # A client that disconnects mid-batch must not leave its queued images running
+            for _, _, future, _ in pending:
+                if future is not None:
+                    future.cancel()
+            executor.shutdown(wait=False)
+
+class BatchStats:
+    """Running totals of one batch, for its closing summary line"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.images = 0
+        self.faces = 0
+        self.known = 0
+        self.errors = 0
+
+    def add(self, matches, error):
+        self.images += 1
+        if error is not None:
+            self.errors += 1
+            return
+        self.faces += len(matches)
+        self.known += sum(1 for name, _, _ in matches if name != "Unknown")
+
+    def summary(self):
+        seconds = time.monotonic() - self.started
+        return {
+            "images": self.images,
+            "faces": self.faces,
+            "known_faces": self.known,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "images_per_second": round(self.images / seconds, 1) if seconds > 0 else 0.0
+        }
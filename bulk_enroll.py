@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Bulk Enrolment Module - Register a directory tree or CSV manifest of labelled images
+
+Labels come from:
+    file names      <Name>_<id>[_<YYYYmmdd_HHMMSS>].jpg, the registered_faces naming
+    directories     <root>/<Name>/<any>.jpg, one sub-directory per person
+    a CSV manifest  columns path,name[,id] (paths relative to the CSV file)
+Images without an id get one derived from their content, so the same photo
+gets the same id from any source or re-run and is skipped once enrolled.
+
+Detection and encoding run on one spawn worker process per core (each worker
+reads its own image files). Results are deduplicated and committed in
+batches of `batch_size`: one index query against the gallery, one store
+append_many() and one registry transaction per batch. After each commit the
+processed paths are appended to a checkpoint file, so an interrupted run
+resumes where it stopped.
+
+Usage:
+    python bulk_enroll.py registered_faces
+    python bulk_enroll.py --csv hr_export/manifest.csv --workers 16
+"""
+
+import os
+import re
+import csv
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+
+import cv2
+import numpy as np
+
+from face_config import load_config
+from face_detection import detect_faces, load_policy
+from face_gallery import FaceGallery, LiveGallery
+from face_index import create_index, load_or_build_index
+from face_store import open_store
+from registration_writer import DUPLICATE_TOLERANCE
+from user_registry import open_registry
+
+STORE_DIR = "face_store"
+ENCODINGS_FILE = "face_encodings.pkl"  # legacy format, migrated into STORE_DIR
+REGISTRY_FILE = "registered_users.db"
+EXCEL_FILE = "registered_users.xlsx"  # export of REGISTRY_FILE
+CHECKPOINT_FILE = "bulk_enroll.checkpoint.jsonl"
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+# <Name>_<8 hex id>[_<YYYYmmdd>_<HHMMSS>], as written by the registration paths
+REGISTERED_NAME = re.compile(r"^(?P<name>.+?)_(?P<id>[0-9a-f]{8})(?:_\d{8}_\d{6})?$")
+
+# Per-process state set up by _init_worker()
+_worker = {}
+
+def content_id(data):
+    """Stable 8-character id for an image that does not carry one"""
+    return hashlib.sha1(data).hexdigest()[:8]
+
+def label_from_path(path, root):
+    """(name, id or None) for an image under root
+
+    In a <Name>/ sub-directory the directory names the person; the file name
+    only contributes an id when it is <Name>_<id> for that same name, so
+    camera names like IMG_20240101.jpg never become people. Flat files
+    (registered_faces/<Name>_<id>.jpg) are labelled from the file name.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    match = REGISTERED_NAME.match(stem)
+    parent = os.path.relpath(os.path.dirname(path), root)
+
+    if parent != ".":
+        name = os.path.basename(parent)
+        return name, match.group("id") if match and match.group("name") == name else None
+    if match:
+        return match.group("name"), match.group("id")
+    return stem, None
+
+def scan_directory(root):
+    """(path, name, id or None) for every image under root, in a stable order"""
+    tasks = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(files):
+            if filename.startswith(".") or not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, filename)
+            name, unique_id = label_from_path(path, root)
+            tasks.append((path, name, unique_id))
+    return tasks
+
+def read_manifest(csv_path):
+    """(path, name, id or None) rows of a CSV manifest with path,name[,id] columns"""
+    base = os.path.dirname(os.path.abspath(csv_path))
+    tasks = []
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = {"path", "name"} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{csv_path} is missing column(s): {', '.join(sorted(missing))}")
+        for row in reader:
+            name = (row.get("name") or "").strip()
+            relative = (row.get("path") or "").strip()
+            if not name or not relative:
+                continue
+            path = relative if os.path.isabs(relative) else os.path.join(base, relative)
+            unique_id = (row.get("id") or "").strip() or None
+            tasks.append((path, name, unique_id))
+    return tasks
+
+def _init_worker(model, max_side, upsample, num_jitters):
+    """Import face_recognition once per worker"""
+    import face_recognition
+
+    _worker["face_recognition"] = face_recognition
+    _worker["model"] = model
+    _worker["max_side"] = max_side
+    _worker["upsample"] = upsample
+    _worker["num_jitters"] = num_jitters
+
+def _encode_image(task):
+    """(task, encoding, error) for one (path, name, id); the worker reads the file itself
+
+    The returned task has its id filled in from the file content when it had none.
+    """
+    path, name, unique_id = task
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError as e:
+        return task, None, f"unreadable: {e}"
+
+    task = (path, name, unique_id or content_id(data.tobytes()))
+    frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if frame is None:
+        return task, None, "unreadable: not an image"
+
+    face_recognition = _worker["face_recognition"]
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    locations = detect_faces(face_recognition, rgb_frame, _worker["max_side"], _worker["upsample"], _worker["model"])
+    # Same rule as interactive registration: exactly one face per image
+    if len(locations) == 0:
+        return task, None, "no face detected"
+    if len(locations) > 1:
+        return task, None, f"{len(locations)} faces detected"
+
+    encodings = face_recognition.face_encodings(rgb_frame, locations, num_jitters=_worker["num_jitters"])
+    if len(encodings) == 0:
+        return task, None, "could not encode face"
+    return task, np.asarray(encodings[0], dtype=np.float32), None
+
+class Checkpoint:
+    """Append-only log of processed image paths and their outcome"""
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["path"])
+                    except (ValueError, KeyError):
+                        # A crash mid-line only loses that line; its image is redone
+                        continue
+
+    def record(self, entries):
+        """Durably mark a batch of {path, status, ...} entries as processed"""
+        if not self.path or not entries:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(entry["path"] for entry in entries)
+
+class BulkEnroller:
+    """Deduplicate and commit encoded images in large batches"""
+
+    def __init__(self, store, registry, live, batch_size=1024, tolerance=DUPLICATE_TOLERANCE, checkpoint=None):
+        self.store = store
+        self.registry = registry
+        self.live = live
+        self.batch_size = max(1, int(batch_size))
+        self.tolerance = tolerance
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.counts = {}
+        self.known_ids = set(live.snapshot.gallery.ids)
+
+    @classmethod
+    def from_config(cls, config, store, registry, live, checkpoint=None):
+        return cls(
+            store, registry, live,
+            batch_size=config.getint("BULK_ENROLL", "batch_size"),
+            tolerance=config.getfloat("BULK_ENROLL", "duplicate_tolerance"),
+            checkpoint=checkpoint
+        )
+
+    def commit(self, results):
+        """Dedupe one batch of (task, encoding, error) results and commit the new faces"""
+        entries, accepted = [], []
+        # Ids taken earlier in this batch: the same photo twice in one batch is enrolled once
+        batch_ids = set()
+        for (path, name, unique_id), encoding, error in results:
+            if error is not None:
+                entries.append({"path": path, "status": "skipped", "reason": error})
+            elif unique_id in self.known_ids or unique_id in batch_ids:
+                entries.append({"path": path, "status": "already_enrolled", "id": unique_id})
+            else:
+                batch_ids.add(unique_id)
+                accepted.append((path, name, unique_id, encoding))
+
+        accepted = self._reject_conflicts(accepted, entries)
+        if accepted:
+            encodings = [encoding for _, _, _, encoding in accepted]
+            records = [self.store.make_record(name, path, unique_id) for path, name, unique_id, _ in accepted]
+            with self.live.write_lock:
+                self.store.append_many(encodings, records)
+                self.live.extend([record["name"] for record in records], encodings, records)
+            try:
+                self.registry.add_users(records, export=False)
+            except Exception as e:
+                # The store is the source of truth; open_registry() re-syncs missing rows
+                print(f"⚠️ Registry update warning: {e}")
+            for record in records:
+                self.known_ids.add(record["id"])
+                entries.append({"path": record["image_path"], "status": "enrolled", "id": record["id"]})
+
+        self.checkpoint.record(entries)
+        for entry in entries:
+            self.counts[entry["status"]] = self.counts.get(entry["status"], 0) + 1
+
+    def _reject_conflicts(self, accepted, entries):
+        """Drop faces within tolerance of a different person, in the gallery or earlier in the batch
+
+        Several photos of the same name are kept: they become extra encodings of that person.
+        """
+        if not accepted:
+            return accepted
+
+        encodings = np.stack([encoding for _, _, _, encoding in accepted])
+        names = [name for _, name, _, _ in accepted]
+        conflicts = [None] * len(accepted)
+
+        # One index query for the whole batch
+        snapshot = self.live.snapshot
+        if len(snapshot) > 0:
+            distances, rows = snapshot.index.search(snapshot.gallery, encodings, k=1)
+            for i, (row, distance) in enumerate(zip(rows[:, 0], distances[:, 0])):
+                if row >= 0 and distance < self.tolerance and snapshot.gallery.names[row] != names[i]:
+                    conflicts[i] = snapshot.gallery.names[row]
+
+        # Faces of one batch never saw each other in the gallery: one pairwise matrix for them
+        sq_norms = np.einsum("ij,ij->i", encodings, encodings)
+        within = sq_norms[:, None] + sq_norms[None, :] - 2.0 * (encodings @ encodings.T)
+        close = within < self.tolerance ** 2
+        kept_mask = np.zeros(len(accepted), dtype=bool)
+        for i in range(len(accepted)):
+            if conflicts[i] is None:
+                earlier = np.flatnonzero(close[i, :i] & kept_mask[:i])
+                others = [j for j in earlier if names[j] != names[i]]
+                conflicts[i] = names[others[0]] if others else None
+            kept_mask[i] = conflicts[i] is None
+
+        kept = []
+        for item, conflict in zip(accepted, conflicts):
+            if conflict is None:
+                kept.append(item)
+            else:
+                entries.append({"path": item[0], "status": "conflict", "looks_like": conflict})
+        return kept
+
+def open_live_gallery(store, config):
+    """LiveGallery of everything already in the store, for deduplication"""
+    vectors, metadata = store.load()
+    if not metadata:
+        return LiveGallery(FaceGallery(), create_index(config))
+    gallery = FaceGallery.from_arrays(vectors, [entry["name"] for entry in metadata], metadata,
+                                      exact_source=store.load_vectors)
+    return LiveGallery(gallery, load_or_build_index(gallery, config))
+
+def enroll(tasks, config=None, workers=0, checkpoint_path=CHECKPOINT_FILE, store_dir=STORE_DIR):
+    """Enrol (path, name, id) tasks; returns a dict of counts by outcome plus throughput"""
+    config = config or load_config()
+    store = open_store(store_dir, ENCODINGS_FILE)
+    registry = open_registry(REGISTRY_FILE, EXCEL_FILE, store,
+                             excel_export_every=config.getint("REGISTRY", "excel_export_every"))
+    checkpoint = Checkpoint(checkpoint_path)
+    enroller = BulkEnroller.from_config(config, store, registry, open_live_gallery(store, config), checkpoint)
+
+    remaining = [task for task in tasks if task[0] not in checkpoint.done]
+    if len(remaining) < len(tasks):
+        print(f"⏩ Resuming: {len(tasks) - len(remaining)} images already processed")
+    if not remaining:
+        return {"images": 0, "seconds": 0.0, "images_per_second": 0.0}
+
+    workers = int(workers) or config.getint("BULK_ENROLL", "workers") or os.cpu_count() or 1
+    max_side, upsample = load_policy(config)
+    initargs = (config.get("ENCODING", "model"), max_side, upsample, config.getint("BULK_ENROLL", "num_jitters"))
+    print(f"⚙️  Enrolling {len(remaining)} images on {workers} worker(s)")
+
+    started = time.monotonic()
+    processed = 0
+    # spawn: workers start clean and load the dlib models once each
+    with multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        batch = []
+        for result in pool.imap(_encode_image, remaining, chunksize=4):
+            batch.append(result)
+            if len(batch) >= enroller.batch_size:
+                enroller.commit(batch)
+                processed += len(batch)
+                batch = []
+                rate = processed / (time.monotonic() - started)
+                print(f"💾 {processed}/{len(remaining)} images ({rate:.1f}/s), {enroller.counts.get('enrolled', 0)} enrolled")
+        enroller.commit(batch)
+        processed += len(batch)
+
+    # Registry rows were added without per-batch exports
+    registry.export_excel_if_due()
+
+    seconds = time.monotonic() - started
+    return {
+        **enroller.counts,
+        "images": processed,
+        "seconds": round(seconds, 1),
+        "images_per_second": round(processed / seconds, 1) if seconds > 0 else 0.0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrol a directory tree or CSV manifest of labelled face images")
+    parser.add_argument("directory", nargs="?", help="image directory (<Name>_<id>.jpg files or <Name>/ folders)")
+    parser.add_argument("--csv", help="CSV manifest with path,name[,id] columns")
+    parser.add_argument("--workers", type=int, default=0, help="encoding processes (default: [BULK_ENROLL] workers)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="progress file used to resume")
+    args = parser.parse_args(argv)
+
+    if bool(args.directory) == bool(args.csv):
+        parser.error("give either an image directory or --csv")
+
+    tasks = read_manifest(args.csv) if args.csv else scan_directory(args.directory)
+    if not tasks:
+        print("❌ No labelled images found")
+        return 1
+
+    summary = enroll(tasks, workers=args.workers, checkpoint_path=args.checkpoint)
+    print(f"✅ Bulk enrolment finished: {json.dumps(summary)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
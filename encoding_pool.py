@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Encoding Pool Module - Warm face detection/encoding worker processes
+
+dlib releases the GIL only in parts of the pipeline, so detection and
+encoding on Flask request threads contend for one core. An EncodingPool runs
+them in worker processes that import face_recognition (and load the dlib
+models) once at start-up. Requests hand over decoded RGB frames.
+
+At most `max_pending` frames may be queued or running; beyond that
+detect_and_encode() raises PoolSaturated, carrying a Retry-After estimate,
+so overload sheds excess requests instead of slowing every request down.
+"""
+
+import os
+import math
+import time
+import threading
+import importlib.util
+import multiprocessing
+
+import numpy as np
+
+from face_detection import DEFAULT_MAX_SIDE, DEFAULT_UPSAMPLE, detect_faces, load_policy
+
+DEFAULT_MODEL = "hog"
+DEFAULT_TASK_TIMEOUT = 60  # seconds before a caller gives up on its frame
+
+# Per-process state set up by _init_worker()
+_worker = {}
+# In-process fallback: concurrent first requests must load the dlib models once
+_init_lock = threading.Lock()
+
+class PoolSaturated(Exception):
+    """Raised when the pool already has max_pending frames in flight"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Encoding workers busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+def _init_worker(model=DEFAULT_MODEL, max_side=DEFAULT_MAX_SIDE, upsample=DEFAULT_UPSAMPLE):
+    """Import face_recognition once per worker and warm the detector"""
+    import face_recognition
+
+    _worker["face_recognition"] = face_recognition
+    _worker["model"] = model
+    _worker["max_side"] = max_side
+    _worker["upsample"] = upsample
+    face_recognition.face_locations(np.zeros((64, 64, 3), dtype=np.uint8), model=model)
+
+def _detect_and_encode(rgb_frame, num_jitters=1, max_faces=0):
+    """Return (locations, encodings); encoding is skipped when more than max_faces are found
+
+    Detection runs on a downscaled copy (see face_detection); locations are
+    full-resolution and the encodings come from the full-resolution frame.
+    """
+    face_recognition = _worker["face_recognition"]
+    locations = detect_faces(face_recognition, rgb_frame, _worker["max_side"], _worker["upsample"], _worker["model"])
+    if max_faces and len(locations) > max_faces:
+        return locations, []
+
+    encodings = face_recognition.face_encodings(rgb_frame, locations, num_jitters=num_jitters)
+    return locations, [np.asarray(encoding, dtype=np.float32) for encoding in encodings]
+
+def _encode(items, num_jitters=1):
+    """Encodings for known face locations; items is a list of (rgb_image, locations)"""
+    face_recognition = _worker["face_recognition"]
+    encodings = []
+    for rgb_image, locations in items:
+        encodings.extend(np.asarray(encoding, dtype=np.float32) for encoding in
+                         face_recognition.face_encodings(rgb_image, locations, num_jitters=num_jitters))
+    return encodings
+
+class EncodingPool:
+    """Bounded front-end to a pool of warm detection/encoding processes"""
+
+    def __init__(self, workers=0, max_pending=0, model=DEFAULT_MODEL, max_side=DEFAULT_MAX_SIDE,
+                 upsample=DEFAULT_UPSAMPLE, task_timeout=DEFAULT_TASK_TIMEOUT):
+        self.workers = int(workers) or os.cpu_count() or 1
+        self.max_pending = int(max_pending) or self.workers * 4
+        self.model = model
+        self.max_side = max_side
+        self.upsample = upsample
+        self.task_timeout = task_timeout
+
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._mean_seconds = None
+
+        self._pool = None
+        try:
+            # A worker that cannot import dlib would be respawned forever
+            if importlib.util.find_spec("face_recognition") is None:
+                raise ImportError("face_recognition is not installed")
+            # spawn: the backend is multi-threaded by the time frames arrive, so
+            # never fork it; each worker starts clean and loads the models once
+            context = multiprocessing.get_context("spawn")
+            self._pool = context.Pool(self.workers, initializer=_init_worker,
+                                      initargs=(model, max_side, upsample))
+            print(f"⚙️  Started {self.workers} encoding worker(s), up to {self.max_pending} frames in flight")
+        except Exception as e:
+            print(f"⚠️  Encoding workers unavailable, encoding in-process: {e}")
+            self.workers = 1
+
+    @classmethod
+    def from_config(cls, config):
+        max_side, upsample = load_policy(config)
+        return cls(
+            workers=config.getint("ENCODING", "workers"),
+            max_pending=config.getint("ENCODING", "max_pending"),
+            model=config.get("ENCODING", "model"),
+            max_side=max_side,
+            upsample=upsample
+        )
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up (at least 1)"""
+        with self._stats_lock:
+            mean_seconds = self._mean_seconds or 1.0
+        return max(1, math.ceil(mean_seconds * self.max_pending / self.workers))
+
+    def detect_and_encode(self, rgb_frame, num_jitters=1, max_faces=0, block=False, timeout=None):
+        """Detect and encode every face in an RGB frame on a worker
+
+        With block=False a saturated pool raises PoolSaturated immediately;
+        background callers (registration jobs) pass block=True to wait up to
+        `timeout` seconds for a slot. Once running, the frame itself is bounded
+        by task_timeout.
+        """
+        return self._call(_detect_and_encode, (rgb_frame, num_jitters, max_faces), block, timeout)
+
+    def encode(self, items, num_jitters=1, block=False, timeout=None):
+        """Encode faces at known locations, skipping detection
+
+        items is a list of (rgb_image, [(top, right, bottom, left), ...]); one
+        encoding is returned per location, in order. Same slot rules as
+        detect_and_encode().
+        """
+        return self._call(_encode, (items, num_jitters), block, timeout)
+
+    def _call(self, function, args, block, slot_timeout):
+        """Run function(*args) on a worker (or in-process) while holding a slot"""
+        if not self._slots.acquire(blocking=block, timeout=slot_timeout if block else None):
+            with self._stats_lock:
+                self._rejected += 1
+            raise PoolSaturated(self.retry_after())
+
+        started = time.monotonic()
+        with self._stats_lock:
+            self._in_flight += 1
+
+        released = []
+
+        def done(_result=None, timed_out=False):
+            # Exactly once per task: from the worker's callback, or from a caller that gave up
+            seconds = time.monotonic() - started
+            with self._stats_lock:
+                if released:
+                    return
+                released.append(True)
+                self._in_flight -= 1
+                if timed_out:
+                    self._timed_out += 1
+                else:
+                    self._completed += 1
+                    self._mean_seconds = seconds if self._mean_seconds is None else 0.9 * self._mean_seconds + 0.1 * seconds
+            self._slots.release()
+
+        if self._pool is None:
+            try:
+                with _init_lock:
+                    if not _worker:
+                        _init_worker(self.model, self.max_side, self.upsample)
+                return function(*args)
+            finally:
+                done()
+
+        result = self._pool.apply_async(function, args, callback=done, error_callback=done)
+        try:
+            # Bounded wait: a worker that keeps dying must not pin request threads forever.
+            # Independent of the slot wait, which is often much shorter than a frame.
+            return result.get(self.task_timeout)
+        except multiprocessing.TimeoutError:
+            # A worker that died (segfault, OOM kill) never calls back: reclaim its slot here,
+            # or max_pending such deaths would shed every request until a restart
+            done(timed_out=True)
+            raise
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "mean_ms": round((self._mean_seconds or 0.0) * 1000.0, 1),
+                "in_process": self._pool is None
+            }
+
+    def close(self):
+        if self._pool is not None:
+            with self._stats_lock:
+                abandoned = self._timed_out
+            if abandoned:
+                # A task lost with its worker never completes, so a graceful join() would wait forever
+                self._pool.terminate()
+            else:
+                self._pool.close()
+            self._pool.join()
+            self._pool = None
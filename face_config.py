@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Configuration Module - Reads config.ini (created by install.py) with safe defaults
+"""
+
+import os
+import configparser
+
+CONFIG_FILE = "config.ini"
+
+# Only sections/keys the code actually reads are listed here; a missing
+# config.ini (or a missing key) falls back to these values.
+DEFAULTS = {
+    "GALLERY": {
+        # resident copy used for scanning: float32 (exact), float16 or int8
+        "precision": "float32",
+        # candidates per query re-ranked with exact float32 distances
+        "rerank": "32",
+    },
+    "REGISTRY": {
+        # rewrite registered_users.xlsx every N registrations (0 = only on demand)
+        "excel_export_every": "0",
+        # backend writer thread: pending registrations before 503, group commit size/window
+        "queue_size": "256",
+        "max_batch": "64",
+        "batch_window_ms": "20",
+        # background registration jobs: worker threads, pending jobs before 503, seconds results are kept
+        "job_workers": "2",
+        "job_queue_size": "128",
+        "job_ttl": "3600",
+    },
+    "BULK_ENROLL": {
+        # bulk_enroll.py: encoding processes (0 = one per CPU core)
+        "workers": "0",
+        # images deduplicated and committed together
+        "batch_size": "1024",
+        # encoding re-samples per face, as in interactive registration (1 is several times faster)
+        "num_jitters": "10",
+        # a face this close to a different person is not enrolled
+        "duplicate_tolerance": "0.4",
+    },
+    "VERIFY": {
+        # gallery_verify.py: encoding processes (0 = one per CPU core), rows per checkpoint
+        "workers": "0",
+        "batch_size": "256",
+        # re-encoding settings; change them and use --rebuild to re-encode the gallery
+        "num_jitters": "10",
+        # landmark model for encoding: small (5 points) or large (68 points)
+        "landmarks": "small",
+        # stored vs re-computed encoding distance reported as drift
+        "drift_threshold": "0.15",
+    },
+    "ENCODING": {
+        # backend detection/encoding worker processes (0 = one per CPU core)
+        "workers": "0",
+        # frames queued or running before requests get 503 (0 = 4 per worker)
+        "max_pending": "0",
+        # face detector: hog (CPU) or cnn (needs a CUDA build of dlib)
+        "model": "hog",
+    },
+    "DETECTION": {
+        # faces are detected on a copy scaled down to this longest side (0 = full frame)
+        "max_side": "640",
+        # CLI realtime loop: same, kept at the old half-scale of a 640x480 webcam frame
+        "cli_max_side": "320",
+        # extra HOG pyramid levels for small faces (number_of_times_to_upsample)
+        "upsample": "1",
+    },
+    "TRACKING": {
+        # CLI realtime loop: follow faces across frames and only re-encode when needed
+        "enabled": "true",
+        # minimum box overlap for a detection to continue a track
+        "iou_threshold": "0.3",
+        # analysed frames a track survives without a matching detection
+        "max_missed": "5",
+        # re-encode identified faces every N analysed frames, unknown ones every M
+        "refresh_frames": "30",
+        "retry_frames": "5",
+        # run HOG every N analysed frames, moving boxes with an OpenCV tracker in between
+        "detect_every": "1",
+        # none, kcf, csrt or mil (kcf/csrt need opencv-contrib-python)
+        "cv_tracker": "none",
+    },
+    "PIPELINE": {
+        # CLI realtime loop: capture, analysis and display on separate threads
+        "enabled": "true",
+        # cap on analysed frames per second (0 = as fast as analysis allows)
+        "analysis_fps": "0",
+    },
+    "MOTION": {
+        # skip face detection on frames that barely differ from the last analysed one
+        "enabled": "true",
+        # frames are compared as blurred grayscale thumbnails this many pixels wide
+        "width": "64",
+        # a thumbnail pixel "moved" when it changed by more than this many grey levels
+        "pixel_threshold": "25",
+        # fraction of moved pixels that makes a frame worth analysing
+        "min_changed": "0.01",
+        # analyse at least this often (seconds) even if nothing moved
+        "max_idle_seconds": "5",
+    },
+    "SESSIONS": {
+        # backend per-client recognition state (motion gate, last result, recent people)
+        "ttl": "300",
+        "max_sessions": "1000",
+        # people a session compares new faces with before searching the whole gallery (0 = off)
+        "recent_identities": "8",
+        # seconds a recognized person stays in that list
+        "recent_ttl": "60",
+        # accept a recent person without the full search when closer than this (capped at the tolerance)
+        "early_accept": "0.35",
+    },
+    "CACHE": {
+        # backend: reuse /api/recognize results for repeated uploads (LRU, dropped on gallery change)
+        "enabled": "true",
+        "max_entries": "256",
+        # seconds a cached result stays valid
+        "ttl": "30",
+        # also match re-encoded/near-identical frames by a 64-bit difference hash
+        "perceptual": "false",
+    },
+    "STREAMING": {
+        # persistent WebSocket / Server-Sent Events recognition streams
+        "max_streams": "64",
+        # per-stream cap on analysed frames per second (0 = as fast as workers allow)
+        "max_fps": "0",
+        # seconds without frames before a stream is closed
+        "idle_timeout": "30",
+    },
+    "BATCH_RECOGNITION": {
+        # /api/recognize/batch: images decoded and detected at once (0 = twice the encoding workers)
+        "threads": "0",
+        # consecutive images whose faces are matched in one gallery query
+        "chunk_images": "64",
+        # archive entries larger than this are reported as errors instead of being read
+        "max_image_mb": "32",
+        # encoding re-samples per face (1 is about 5x faster than the interactive 5)
+        "num_jitters": "5",
+    },
+    "BATCHING": {
+        # match faces from concurrent /api/recognize requests in one gallery query
+        "enabled": "true",
+        # faces per batch, and how long (ms) the first request waits for company
+        "max_batch_faces": "256",
+        "max_wait_ms": "5",
+    },
+    "IDENTITIES": {
+        # recognition picks the nearest row, or the nearest person over all their encodings
+        "match_by": "row",
+        # person distance: min (closest encoding), mean, or centroid
+        "aggregate": "min",
+        # people compared per step of the centroid-pruned search
+        "probe": "32",
+    },
+    "INDEX": {
+        # brute = exact linear scan, ivf = inverted file over k-means centroids
+        "backend": "brute",
+        # number of k-means lists (0 = about 4 * sqrt(gallery size))
+        "nlist": "0",
+        # lists scanned per query (higher = better recall, slower)
+        "nprobe": "8",
+        # where a built IVF index is cached between runs
+        "index_file": os.path.join("face_store", "index.npz"),
+    },
+}
+
+def load_config(path=CONFIG_FILE):
+    """Return a ConfigParser pre-filled with DEFAULTS and overridden by config.ini"""
+    config = configparser.ConfigParser()
+    config.read_dict(DEFAULTS)
+
+    if os.path.exists(path):
+        try:
+            config.read(path, encoding="utf-8")
+        except configparser.Error as e:
+            print(f"⚠️  Could not parse {path}, using defaults: {e}")
+
+    return config
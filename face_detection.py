@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Face Detection Module - Detection-resolution policy shared by backend and CLI
+
+HOG cost grows with pixel count, so faces are detected on a copy of the
+frame scaled down until its longest side is at most `max_side` pixels, with
+`upsample` extra pyramid levels for small faces. The boxes are then mapped
+back to full-resolution coordinates so encodings are computed from the
+full-resolution face crops.
+"""
+
+import cv2
+
+DEFAULT_MAX_SIDE = 640
+DEFAULT_UPSAMPLE = 1
+
+def detection_scale(shape, max_side=DEFAULT_MAX_SIDE):
+    """Factor (<= 1) that brings the longest side of a frame down to max_side"""
+    longest = max(shape[0], shape[1])
+    if not max_side or longest <= max_side:
+        return 1.0
+    return max_side / float(longest)
+
+def to_full_resolution(locations, scale, shape):
+    """Map (top, right, bottom, left) boxes found at `scale` back onto the full frame"""
+    if scale == 1.0:
+        return list(locations)
+
+    height, width = shape[0], shape[1]
+    return [(
+        max(0, int(round(top / scale))),
+        min(width, int(round(right / scale))),
+        min(height, int(round(bottom / scale))),
+        max(0, int(round(left / scale)))
+    ) for top, right, bottom, left in locations]
+
+def detect_faces(face_recognition, rgb_frame, max_side=DEFAULT_MAX_SIDE, upsample=DEFAULT_UPSAMPLE, model="hog"):
+    """Face boxes in full-resolution coordinates, detected on a downscaled copy"""
+    scale = detection_scale(rgb_frame.shape, max_side)
+    small_frame = rgb_frame
+    if scale < 1.0:
+        small_frame = cv2.resize(rgb_frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    locations = face_recognition.face_locations(small_frame, number_of_times_to_upsample=upsample, model=model)
+    return to_full_resolution(locations, scale, rgb_frame.shape)
+
+def load_policy(config, cli=False):
+    """(max_side, upsample) from the [DETECTION] section; cli=True for the realtime CLI loop"""
+    max_side = config.getint("DETECTION", "cli_max_side" if cli else "max_side")
+    return max_side, config.getint("DETECTION", "upsample")
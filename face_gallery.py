@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Face Gallery Module - Contiguous float32 storage for known face encodings
+
+A gallery can optionally keep a quantized copy of the encodings resident
+(precision "float16" or per-dimension-scaled "int8"). Searches then scan the
+quantized copy for a coarse shortlist and re-rank the best `rerank`
+candidates per query against the exact float32 rows, which may stay on disk
+in the memory-mapped face store.
+
+Concurrent readers never touch the gallery a writer appends to. A LiveGallery
+publishes an immutable GallerySnapshot (frozen gallery view + index copy)
+after every change, and readers grab that one reference per request.
+"""
+
+import threading
+
+import numpy as np
+
+ENCODING_DIM = 128
+DEFAULT_CAPACITY = 1024
+PRECISIONS = ("float32", "float16", "int8")
+DEFAULT_RERANK = 32
+
+# Rows converted to float32 at a time when scanning a quantized copy
+SCAN_CHUNK = 16384
+
+# int8 range kept above the largest value seen per dimension, so later faces rarely need a re-quantize
+INT8_HEADROOM = 1.5
+
+class FaceGallery:
+    """Growable N x 128 float32 encoding matrix with parallel name/id arrays"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, precision="float32", rerank=DEFAULT_RERANK):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown gallery precision '{precision}', expected one of {PRECISIONS}")
+
+        self.precision = precision
+        self.rerank = max(1, int(rerank))
+        self._capacity = max(1, int(capacity))
+        self._count = 0
+        self._encodings = np.zeros((self._capacity, ENCODING_DIM), dtype=np.float32)
+        self._exact_source = None
+        self._sq_norms = np.zeros(self._capacity, dtype=np.float32)
+        self._names = np.empty(self._capacity, dtype=object)
+        self._ids = np.empty(self._capacity, dtype=object)
+        self._metadata = []
+        self._frozen = False
+
+        self._codes = None
+        self._code_norms = None
+        self._scale = None
+        if precision != "float32":
+            self._codes = np.zeros((self._capacity, ENCODING_DIM), dtype=np.dtype(precision))
+            self._code_norms = np.zeros(self._capacity, dtype=np.float32)
+            if precision == "int8":
+                # Typical dlib encodings stay well inside +/-0.5
+                self._scale = np.full(ENCODING_DIM, 0.5 / 127.0, dtype=np.float32)
+
+    @classmethod
+    def from_arrays(cls, encodings, names, metadata, precision="float32", rerank=DEFAULT_RERANK,
+                    exact_source=None):
+        """Wrap an existing N x 128 float32 matrix (e.g. a memmap) without copying it
+
+        In float32 mode the matrix is only copied into RAM once the first append
+        needs more room. In quantized modes only the quantized copy is made
+        resident; if `exact_source(rows)` is given it is called after each
+        append (once per batch) to re-map the exact matrix (e.g. EncodingStore.load_vectors), so
+        the float32 rows never have to be copied at all.
+        """
+        gallery = cls(capacity=1, precision=precision, rerank=rerank)
+        count = len(names)
+
+        gallery._encodings = np.asanyarray(encodings, dtype=np.float32)[:count]
+        gallery._exact_source = exact_source if precision != "float32" else None
+        gallery._capacity = count
+        gallery._count = count
+        gallery._sq_norms = _row_sq_norms(gallery._encodings)
+        gallery._names = np.empty(count, dtype=object)
+        gallery._names[:] = list(names)
+        gallery._ids = np.empty(count, dtype=object)
+        gallery._ids[:] = [entry.get("id") for entry in metadata]
+        gallery._metadata = list(metadata)
+
+        if precision != "float32":
+            gallery._requantize(count)
+
+        return gallery
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def encodings(self):
+        """View of the filled rows of the exact encoding matrix"""
+        return self._encodings[:self._count]
+
+    @property
+    def sq_norms(self):
+        """Precomputed squared L2 norm of every filled row"""
+        return self._sq_norms[:self._count]
+
+    @property
+    def names(self):
+        return self._names[:self._count]
+
+    @property
+    def ids(self):
+        return self._ids[:self._count]
+
+    @property
+    def metadata(self):
+        return self._metadata[:self._count]
+
+    def snapshot(self):
+        """Frozen view of the rows filled so far, sharing (not copying) the buffers
+
+        Appends only ever write rows past the view's count and growth allocates
+        new buffers, so nothing a snapshot can see is modified afterwards.
+        """
+        view = object.__new__(FaceGallery)
+        view.__dict__.update(self.__dict__)
+        view._capacity = self._count
+        view._frozen = True
+        return view
+
+    def _requantize(self, capacity):
+        """Rebuild the quantized copy (and the int8 scale) from the exact rows into new buffers
+
+        Snapshots keep the old codes and scale, which stay valid for their rows.
+        """
+        count = self._count
+        encodings = self._encodings[:count]
+        if self.precision == "int8" and count:
+            peak = np.zeros(ENCODING_DIM, dtype=np.float32)
+            for start in range(0, count, SCAN_CHUNK):
+                np.maximum(peak, np.abs(encodings[start:start + SCAN_CHUNK]).max(axis=0), out=peak)
+            self._scale = np.maximum(peak * INT8_HEADROOM, 1e-6) / 127.0
+
+        codes = np.zeros((capacity, ENCODING_DIM), dtype=np.dtype(self.precision))
+        for start in range(0, count, SCAN_CHUNK):
+            block = encodings[start:start + SCAN_CHUNK]
+            codes[start:start + len(block)] = self._quantize(block)
+        code_norms = np.zeros(capacity, dtype=np.float32)
+        code_norms[:count] = _row_sq_norms(codes[:count], self._scale)
+        self._codes, self._code_norms = codes, code_norms
+
+    def _quantize(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.precision == "float16":
+            return vectors.astype(np.float16)
+        return np.clip(np.rint(vectors / self._scale), -127, 127).astype(np.int8)
+
+    def _grow(self, min_capacity):
+        """Reallocate the backing arrays, at least doubling capacity"""
+        new_capacity = max(min_capacity, self._capacity * 2, DEFAULT_CAPACITY)
+
+        def grown(array, shape_tail=()):
+            new_array = np.zeros((new_capacity,) + shape_tail, dtype=array.dtype)
+            new_array[:self._count] = array[:self._count]
+            return new_array
+
+        if self._exact_source is None:
+            self._encodings = grown(self._encodings, (ENCODING_DIM,))
+        self._sq_norms = grown(self._sq_norms)
+        self._names = grown(self._names)
+        self._ids = grown(self._ids)
+        if self._codes is not None:
+            self._codes = grown(self._codes, (ENCODING_DIM,))
+            self._code_norms = grown(self._code_norms)
+        self._capacity = new_capacity
+
+    def append(self, name, encoding, metadata=None):
+        """Append one face in place and return its row index"""
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(-1)
+        if encoding.shape != (ENCODING_DIM,):
+            raise ValueError(f"Expected a {ENCODING_DIM}-d encoding, got shape {encoding.shape}")
+        return self.append_many([name], encoding[None, :], [metadata])[0]
+
+    def append_many(self, names, encodings, metadata):
+        """Append a batch of faces in place and return their row indices
+
+        With an `exact_source` the exact matrix is re-mapped once, after the
+        last row, rather than once per face.
+        """
+        if not len(names):
+            return []
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(len(names), -1)
+        if encodings.shape[1:] != (ENCODING_DIM,):
+            raise ValueError(f"Expected {ENCODING_DIM}-d encodings, got shape {encodings.shape}")
+
+        if self._frozen:
+            raise RuntimeError("Gallery snapshots are read-only")
+
+        start, end = self._count, self._count + len(names)
+        if end > self._capacity:
+            self._grow(end)
+
+        if self._exact_source is None:
+            self._encodings[start:end] = encodings
+        self._sq_norms[start:end] = np.einsum("ij,ij->i", encodings, encodings)
+        for row, name, entry in zip(range(start, end), names, metadata):
+            entry = entry if entry is not None else {}
+            self._names[row] = name
+            self._ids[row] = entry.get("id")
+            self._metadata.append(entry)
+        self._count = end
+
+        if self._exact_source is not None:
+            # The exact rows are already on disk; just widen the mapping
+            self._encodings = self._exact_source(end)
+
+        if self._codes is not None:
+            if self._scale is not None and (np.abs(encodings) > 127.0 * self._scale).any():
+                # Past the int8 range: clipping would skew every later coarse scan
+                self._requantize(self._capacity)
+            else:
+                self._codes[start:end] = self._quantize(encodings)
+                self._code_norms[start:end] = _row_sq_norms(self._codes[start:end], self._scale)
+
+        return list(range(start, end))
+
+    def clear(self):
+        """Drop all rows, starting over with fresh buffers of the same capacity
+
+        Snapshots share the old buffers, so they are left to them rather than
+        reused: later appends must never overwrite a row a snapshot can see.
+        """
+        if self._frozen:
+            raise RuntimeError("Gallery snapshots are read-only")
+        capacity = self._capacity if self._encodings.flags.writeable and self._exact_source is None \
+            else DEFAULT_CAPACITY
+        self.__init__(capacity=capacity, precision=self.precision, rerank=self.rerank)
+
+    def exact_distances(self, queries, rows=None):
+        """Exact float32 Euclidean distances (K x M) via one matrix product
+
+        Uses ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b and the precomputed row norms.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+
+        if rows is None:
+            encodings, sq_norms = self.encodings, self.sq_norms
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            encodings, sq_norms = self._encodings[rows], self._sq_norms[rows]
+
+        if encodings.shape[0] == 0:
+            return np.empty((queries.shape[0], 0), dtype=np.float32)
+
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        sq_distances = sq_norms[None, :] + query_norms[:, None] - 2.0 * (queries @ encodings.T)
+        np.maximum(sq_distances, 0.0, out=sq_distances)
+
+        return np.sqrt(sq_distances, out=sq_distances)
+
+    def coarse_distances(self, queries, rows=None):
+        """Approximate distances (K x M) scanned from the quantized copy"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+
+        if rows is None:
+            codes, code_norms = self._codes[:self._count], self._code_norms[:self._count]
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            codes, code_norms = self._codes[rows], self._code_norms[rows]
+
+        # x ~= scale * code, so q.x == (q * scale).code
+        scaled = queries * self._scale if self._scale is not None else queries
+        dots = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK):
+            block = codes[start:start + SCAN_CHUNK].astype(np.float32)
+            dots[:, start:start + len(block)] = scaled @ block.T
+
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+        sq_distances = code_norms[None, :] + query_norms[:, None] - 2.0 * dots
+        np.maximum(sq_distances, 0.0, out=sq_distances)
+
+        return np.sqrt(sq_distances, out=sq_distances)
+
+    def distances(self, queries, rows=None):
+        """Euclidean distances from K query encodings to every (or selected) known face
+
+        In float32 mode every value is exact. In quantized modes the matrix is
+        computed from the quantized copy and then the `rerank` closest columns
+        of each query are replaced by their exact float32 distances.
+        """
+        if self._codes is None:
+            return self.exact_distances(queries, rows)
+
+        distances = self.coarse_distances(queries, rows)
+        if distances.shape[1] == 0:
+            return distances
+
+        shortlist_size = min(self.rerank, distances.shape[1])
+        if shortlist_size < distances.shape[1]:
+            shortlist = np.argpartition(distances, shortlist_size - 1, axis=1)[:, :shortlist_size]
+        else:
+            shortlist = np.tile(np.arange(distances.shape[1]), (len(distances), 1))
+
+        columns = np.unique(shortlist)
+        exact_rows = columns if rows is None else np.asarray(rows, dtype=np.int64)[columns]
+        distances[:, columns] = self.exact_distances(queries, exact_rows)
+
+        return distances
+
+    def face_distance(self, face_encoding):
+        """Euclidean distance from one encoding to every known face"""
+        return self.distances(face_encoding)[0]
+
+class GallerySnapshot:
+    """Immutable (gallery, index, identities) triple; `version` grows with every publish"""
+
+    __slots__ = ("gallery", "index", "identities", "version")
+
+    def __init__(self, gallery, index, version, identities=None):
+        self.gallery = gallery
+        self.index = index
+        self.identities = identities
+        self.version = version
+
+    def __len__(self):
+        return len(self.gallery)
+
+class LiveGallery:
+    """Single-writer gallery that publishes snapshots for lock-free readers
+
+    Writers serialize on `write_lock` (re-entrant, so callers can hold it
+    around a store write plus append to keep store rows and gallery rows in
+    step). Readers just read `snapshot`: publishing is one reference swap, so
+    they never block and never see a half-built gallery or a name array that
+    disagrees with the encoding matrix or the index.
+    """
+
+    def __init__(self, gallery=None, index=None):
+        from face_index import BruteForceIndex, IdentityIndex
+        if index is None:
+            index = BruteForceIndex()
+
+        self.write_lock = threading.RLock()
+        self._gallery = gallery if gallery is not None else FaceGallery()
+        self._index = index
+        # Per-person centroids, kept in step with the gallery for identity search
+        self._identities = IdentityIndex()
+        self._identities.build(self._gallery)
+        self._version = 0
+        self._snapshot = None
+        if len(self._gallery) and index.count != len(self._gallery):
+            index.build(self._gallery)
+        self._publish()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def _publish(self):
+        self._version += 1
+        self._snapshot = GallerySnapshot(self._gallery.snapshot(), self._index.snapshot(), self._version,
+                                         self._identities.snapshot())
+
+    def append(self, name, encoding, metadata=None):
+        """Append one face, update the index and publish; returns the new row"""
+        with self.write_lock:
+            row = self._gallery.append(name, encoding, metadata)
+            self._index.add(self._gallery, [row])
+            self._identities.add(self._gallery, [row])
+            self._publish()
+        return row
+
+    def extend(self, names, encodings, metadata):
+        """Append a batch of faces with one index update and one publish; returns the rows"""
+        with self.write_lock:
+            rows = self._gallery.append_many(names, encodings, metadata)
+            if rows:
+                self._index.add(self._gallery, rows)
+                self._identities.add(self._gallery, rows)
+                self._publish()
+        return rows
+
+    def replace(self, gallery, index):
+        """Publish a gallery/index pair that was built off to the side"""
+        from face_index import IdentityIndex
+        identities = IdentityIndex()
+        identities.build(gallery)
+        with self.write_lock:
+            self._gallery = gallery
+            self._index = index
+            self._identities = identities
+            self._publish()
+
+    def rebuild(self, build):
+        """Call build() -> (gallery, index) under the writer lock and publish the result
+
+        Readers keep using the previous snapshot until the swap; holding the
+        lock only stops appends from landing in a gallery about to be replaced.
+        """
+        with self.write_lock:
+            gallery, index = build()
+            self.replace(gallery, index)
+        return self._snapshot
+
+def _row_sq_norms(matrix, scale=None):
+    """Squared L2 norm of every row, optionally of scale * row, in float32 chunks"""
+    norms = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), SCAN_CHUNK):
+        block = np.asarray(matrix[start:start + SCAN_CHUNK], dtype=np.float32)
+        if scale is not None:
+            block = block * scale
+        norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+    return norms
@@ -0,0 +1,664 @@
+#!/usr/bin/env python3
+"""
+Face Index Module - Pluggable nearest-neighbour search over a FaceGallery
+
+Backends (selected with [INDEX] backend in config.ini):
+    brute  exact linear scan, one matrix product per query block
+    ivf    inverted file: k-means centroids + per-list row ids, scans nprobe lists
+
+Indexes only hold row ids; the vectors themselves stay in the gallery, so an
+index never duplicates the (possibly memory-mapped) encoding matrix.
+
+An IdentityIndex groups rows by person (name) and keeps one centroid and
+radius per person, so search_identities() can rank people rather than rows
+and skip every person whose centroid bound rules them out.
+"""
+
+import os
+import sys
+import copy
+import time
+
+import numpy as np
+
+from face_config import load_config
+
+class BruteForceIndex:
+    """Exact search: every query is compared with every gallery row"""
+
+    kind = "brute"
+
+    def __init__(self):
+        self.count = 0
+
+    def build(self, gallery):
+        self.count = len(gallery)
+
+    def add(self, gallery, rows):
+        self.count = len(gallery)
+
+    def snapshot(self):
+        return copy.copy(self)
+
+    def search(self, gallery, queries, k=1):
+        """Return (distances, rows), both K x k, nearest first"""
+        distances = gallery.distances(queries)
+        return _top_k(distances, np.arange(distances.shape[1]), k)
+
+    def save(self, path):
+        np.savez(path, kind=self.kind, count=self.count)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        index = cls()
+        index.count = int(data["count"])
+        return index
+
+class IVFIndex:
+    """Approximate search over an inverted file of k-means centroids"""
+
+    kind = "ivf"
+
+    def __init__(self, nlist=0, nprobe=8, train_iters=10, train_size=50000, seed=0):
+        self.nlist = int(nlist)
+        self.nprobe = int(nprobe)
+        self.train_iters = int(train_iters)
+        self.train_size = int(train_size)
+        self.seed = int(seed)
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.lists = []
+        self.count = 0
+
+    def build(self, gallery):
+        """Train centroids on (a sample of) the gallery and assign every row"""
+        vectors = gallery.encodings
+        self.count = len(gallery)
+
+        if self.count == 0:
+            self.centroids = np.empty((0, vectors.shape[1]), dtype=np.float32)
+            self.lists = []
+            return
+
+        nlist = self.nlist or int(4 * np.sqrt(self.count))
+        nlist = max(1, min(nlist, self.count))
+
+        rng = np.random.default_rng(self.seed)
+        if self.count > self.train_size:
+            sample = np.sort(rng.choice(self.count, self.train_size, replace=False))
+            training = np.asarray(vectors[sample], dtype=np.float32)
+        else:
+            training = np.asarray(vectors, dtype=np.float32)
+
+        self.centroids = _kmeans(training, nlist, self.train_iters, rng)
+
+        assignments = _nearest_centroids(vectors, self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(nlist)]
+
+    def add(self, gallery, rows):
+        """Assign newly appended gallery rows to their nearest list"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(self.centroids) == 0:
+            self.build(gallery)
+            return
+
+        assignments = _nearest_centroids(gallery.encodings[rows], self.centroids)
+        for list_no in np.unique(assignments):
+            # Replace (not mutate) the list so concurrent readers keep a valid array
+            self.lists[list_no] = np.concatenate([self.lists[list_no], rows[assignments == list_no]])
+        self.count = len(gallery)
+
+    def snapshot(self):
+        """Copy that later add() calls leave untouched (list arrays are shared)"""
+        index = copy.copy(self)
+        index.lists = list(self.lists)
+        return index
+
+    def search(self, gallery, queries, k=1):
+        """Return (distances, rows), both K x k, nearest first; -1 rows pad short results"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        out_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+
+        if len(self.centroids) == 0:
+            return out_distances, out_rows
+
+        nprobe = max(1, min(self.nprobe, len(self.centroids)))
+        probes = np.argsort(_sq_distances(queries, self.centroids), axis=1)[:, :nprobe]
+
+        # Group the block by probed list: one matrix product per list, covering only
+        # the queries that probe it, so work stays K x nprobe lists (never K x union)
+        query_of = np.repeat(np.arange(len(queries)), nprobe)
+        list_of = probes.ravel()
+        order = np.argsort(list_of, kind="stable")
+        list_nos, starts = np.unique(list_of[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        for list_no, start, end in zip(list_nos, starts, ends):
+            rows = self.lists[list_no]
+            if len(rows) == 0:
+                continue
+            members = query_of[order[start:end]]
+            list_distances, list_rows = _top_k(gallery.distances(queries[members], rows), rows, k)
+
+            # Merge with the best found so far in other lists
+            merged_distances = np.concatenate([out_distances[members], list_distances], axis=1)
+            merged_rows = np.concatenate([out_rows[members], list_rows], axis=1)
+            keep = np.argsort(merged_distances, axis=1, kind="stable")[:, :k]
+            out_distances[members] = np.take_along_axis(merged_distances, keep, axis=1)
+            out_rows[members] = np.take_along_axis(merged_rows, keep, axis=1)
+
+        return out_distances, out_rows
+
+    def save(self, path):
+        sizes = np.array([len(ids) for ids in self.lists], dtype=np.int64)
+        ids = np.concatenate(self.lists) if self.lists else np.empty(0, dtype=np.int64)
+        np.savez(path, kind=self.kind, count=self.count, nlist=self.nlist, nprobe=self.nprobe,
+                 centroids=self.centroids, list_sizes=sizes, list_ids=ids)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        index = cls(nlist=int(data["nlist"]), nprobe=int(data["nprobe"]))
+        index.centroids = data["centroids"].astype(np.float32)
+        index.count = int(data["count"])
+        bounds = np.concatenate([[0], np.cumsum(data["list_sizes"])])
+        ids = data["list_ids"].astype(np.int64)
+        index.lists = [ids[bounds[i]:bounds[i + 1]] for i in range(len(data["list_sizes"]))]
+        return index
+
+INDEX_BACKENDS = {
+    BruteForceIndex.kind: BruteForceIndex,
+    IVFIndex.kind: IVFIndex,
+}
+
+# How the encodings of one person combine into that person's distance
+IDENTITY_AGGREGATES = ("min", "mean", "centroid")
+IDENTITY_CHUNK = 65536  # rows per step when building centroids
+RETIRED_NEVER = np.iinfo(np.int64).max  # retired_by of a slot nobody replaced
+MIN_RETIRED_BEFORE_COMPACT = 1024  # retired slots always tolerated before add() rebuilds
+
+class IdentityIndex:
+    """Rows grouped by name, with a centroid and radius (farthest member) per identity
+
+    Identity numbers are slots in over-allocated arrays, and a snapshot()
+    sees only the first n slots, so writes beyond n never disturb it.
+    Published slots are never rewritten: re-enrolling a person writes the
+    grown entry to a new slot and marks the old one retired by that slot
+    number, which snapshots taken before the new slot existed still treat as
+    live. The name -> slot lookup is copied on write, so each snapshot keeps
+    the one that was current when it was taken. Retired slots are compacted
+    away by a rebuild once they outnumber the live ones.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._identities = 0
+        self._people = 0
+        self._lookup = {}
+        self._names = np.empty(0, dtype=object)
+        self._members = np.empty(0, dtype=object)
+        self._centroids = np.empty((0, 0), dtype=np.float32)
+        self._radii = np.empty(0, dtype=np.float32)
+        self._retired_by = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        """Number of people (live identities)"""
+        return self._people
+
+    @property
+    def slots(self):
+        """Identity numbers in use, retired ones included"""
+        return self._identities
+
+    @property
+    def names(self):
+        return self._names[:self._identities]
+
+    @property
+    def members(self):
+        return self._members[:self._identities]
+
+    @property
+    def centroids(self):
+        return self._centroids[:self._identities]
+
+    @property
+    def radii(self):
+        return self._radii[:self._identities]
+
+    @property
+    def live(self):
+        """Mask of the identities that are current in this snapshot"""
+        return self._retired_by[:self._identities] >= self._identities
+
+    def build(self, gallery):
+        """Group every gallery row by name and compute centroids and radii"""
+        lookup = {}
+        identity_of_row = np.fromiter((lookup.setdefault(name, len(lookup)) for name in gallery.names),
+                                      dtype=np.int64, count=len(gallery))
+        identities = len(lookup)
+        vectors = gallery.encodings
+
+        order = np.argsort(identity_of_row, kind="stable")
+        bounds = np.searchsorted(identity_of_row[order], np.arange(identities + 1))
+        members = np.empty(identities, dtype=object)
+        members[:] = [order[bounds[i]:bounds[i + 1]] for i in range(identities)]
+
+        sums = np.zeros((identities, vectors.shape[1]), dtype=np.float64)
+        for start in range(0, len(gallery), IDENTITY_CHUNK):
+            np.add.at(sums, identity_of_row[start:start + IDENTITY_CHUNK],
+                      np.asarray(vectors[start:start + IDENTITY_CHUNK], dtype=np.float64))
+        centroids = (sums / np.maximum(np.diff(bounds), 1)[:, None]).astype(np.float32)
+
+        radii = np.zeros(identities, dtype=np.float32)
+        for start in range(0, len(gallery), IDENTITY_CHUNK):
+            owners = identity_of_row[start:start + IDENTITY_CHUNK]
+            offsets = np.asarray(vectors[start:start + IDENTITY_CHUNK], dtype=np.float32) - centroids[owners]
+            np.maximum.at(radii, owners, np.sqrt(np.einsum("ij,ij->i", offsets, offsets)))
+
+        self._lookup = lookup
+        self._names = np.empty(identities, dtype=object)
+        self._names[:] = list(lookup)
+        self._members, self._centroids, self._radii = members, centroids, radii
+        self._retired_by = np.full(identities, RETIRED_NEVER, dtype=np.int64)
+        self._identities = self._people = identities
+        self.count = len(gallery)
+
+    def add(self, gallery, rows):
+        """Fold newly appended rows into their identities (new names become new identities)"""
+        if self._identities == 0:
+            self.build(gallery)
+            return
+
+        added = {}
+        for row in rows:
+            added.setdefault(gallery.names[row], []).append(row)
+
+        # Every touched person takes a fresh slot; compact once retired slots dominate
+        slots = self._identities + len(added)
+        people = self._people + sum(name not in self._lookup for name in added)
+        if slots - people > max(people, MIN_RETIRED_BEFORE_COMPACT):
+            self.build(gallery)
+            return
+        self._reserve(slots)
+
+        # Earlier snapshots keep reading the old lookup; only this writer's copy changes
+        lookup = dict(self._lookup)
+        slot = self._identities
+        for name, new_rows in added.items():
+            previous = lookup.get(name, -1)
+            if previous < 0:
+                members = np.asarray(new_rows, dtype=np.int64)
+            else:
+                members = np.concatenate([self._members[previous], np.asarray(new_rows, dtype=np.int64)])
+                # Older snapshots stop short of `slot`, so they still see `previous` as live
+                self._retired_by[previous] = slot
+            vectors = np.asarray(gallery.encodings[members], dtype=np.float32)
+            centroid = vectors.mean(axis=0)
+            offsets = vectors - centroid
+            self._names[slot] = name
+            self._members[slot] = members
+            self._centroids[slot] = centroid
+            self._radii[slot] = np.sqrt(np.einsum("ij,ij->i", offsets, offsets)).max()
+            self._retired_by[slot] = RETIRED_NEVER
+            lookup[name] = slot
+            slot += 1
+
+        self._lookup = lookup
+        self._identities = slots
+        self._people = people
+        self.count = len(gallery)
+
+    def snapshot(self):
+        """Copy that later add() calls leave untouched"""
+        return copy.copy(self)
+
+    def find(self, name):
+        """Identity number of a name, or None if this snapshot does not know it"""
+        return self._lookup.get(name)
+
+    def _reserve(self, identities):
+        """Grow the backing arrays (by doubling) to hold at least this many identities"""
+        if identities <= len(self._names):
+            return
+        capacity = max(identities, 2 * len(self._names), 16)
+
+        def grown(array, shape_tail=()):
+            bigger = np.zeros((capacity,) + shape_tail, dtype=array.dtype) if array.dtype != object \
+                else np.empty((capacity,) + shape_tail, dtype=object)
+            bigger[:len(array)] = array
+            return bigger
+
+        self._names = grown(self._names)
+        self._members = grown(self._members)
+        self._centroids = grown(self._centroids, self._centroids.shape[1:])
+        self._radii = grown(self._radii)
+        self._retired_by = grown(self._retired_by)
+
+def _sq_distances(queries, vectors):
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    query_norms = np.einsum("ij,ij->i", queries, queries)
+    return norms[None, :] + query_norms[:, None] - 2.0 * (queries @ vectors.T)
+
+def _nearest_centroids(vectors, centroids, chunk_size=65536):
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        assignments[start:start + len(chunk)] = np.argmin(_sq_distances(chunk, centroids), axis=1)
+    return assignments
+
+def _kmeans(vectors, k, iters, rng):
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points"""
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+
+    for _ in range(iters):
+        assignments = _nearest_centroids(vectors, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.stack([np.bincount(assignments, weights=vectors[:, d], minlength=k)
+                         for d in range(vectors.shape[1])], axis=1).astype(np.float32)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+
+    return centroids
+
+def _top_k(distances, rows, k):
+    """Pick the k smallest columns of a K x M distance matrix, sorted ascending"""
+    k = min(k, distances.shape[1])
+    if k == 0:
+        return np.empty((len(distances), 0), dtype=np.float32), np.empty((len(distances), 0), dtype=np.int64)
+
+    if k < distances.shape[1]:
+        part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(distances.shape[1]), (len(distances), 1))
+
+    part_distances = np.take_along_axis(distances, part, axis=1)
+    order = np.argsort(part_distances, axis=1)
+    columns = np.take_along_axis(part, order, axis=1)
+
+    return np.take_along_axis(distances, columns, axis=1), np.asarray(rows)[columns]
+
+def match_batch(index, gallery, queries):
+    """Best match for every row of a K x 128 query block in one index query
+
+    Returns (rows, distances, confidences) arrays of length K; rows are -1
+    where nothing could be matched (empty gallery).
+    """
+    rows, distances, confidences = match_top_k(index, gallery, queries, k=1)
+    return rows[:, 0], distances[:, 0], confidences[:, 0]
+
+def match_top_k(index, gallery, queries, k=1):
+    """k nearest gallery rows for every row of a K x 128 query block, nearest first
+
+    Returns (rows, distances, confidences), each K x k; missing candidates
+    (gallery smaller than k, empty IVF lists) have row -1, distance 1.0 and
+    confidence 0.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    k = max(1, int(k))
+    rows = np.full((len(queries), k), -1, dtype=np.int64)
+    distances = np.ones((len(queries), k), dtype=np.float32)
+
+    if len(queries) and len(gallery):
+        found_distances, found_rows = index.search(gallery, queries, k=k)
+        found = found_rows.shape[1]
+        rows[:, :found] = found_rows
+        distances[:, :found] = np.where(found_rows < 0, 1.0, found_distances)
+
+    confidences = np.maximum(0.0, (1.0 - distances) * 100.0)
+    return rows, distances, confidences
+
+def search_identities(identities, gallery, queries, k=1, aggregate="min", probe=32):
+    """k nearest identities for every row of a K x 128 query block, nearest first
+
+    aggregate: min (closest encoding of the person), mean (average over the
+    person's encodings) or centroid (distance to the person's centroid).
+    For min/mean, people are visited in chunks (`probe` first, then doubling)
+    in order of a lower bound from their centroid (centroid distance minus radius for min, the
+    centroid distance itself for mean, by convexity) and the scan stops once
+    the bound exceeds the k-th best distance, so results are exact while
+    only nearby people's encodings are compared.
+
+    Returns one list per query of (identity, distance, row) tuples, where row
+    is that person's closest encoding (None for centroid).
+    """
+    if aggregate not in IDENTITY_AGGREGATES:
+        raise ValueError(f"Unknown identity aggregate '{aggregate}', expected one of {IDENTITY_AGGREGATES}")
+
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    if len(queries) == 0 or len(identities) == 0:
+        return [[] for _ in range(len(queries))]
+
+    k = max(1, min(int(k), len(identities)))
+    probe = max(1, int(probe))
+    members_of, radii = identities.members, identities.radii
+    centroid_distances = np.sqrt(_sq_distances(queries, identities.centroids).clip(min=0.0))
+    # Retired slots (people re-enrolled since) sort last and are never visited
+    centroid_distances[:, ~identities.live] = np.inf
+
+    results = []
+    for query, distances_to_centroids in zip(queries, centroid_distances):
+        if aggregate == "centroid":
+            nearest = np.argsort(distances_to_centroids, kind="stable")[:k]
+            results.append([(int(i), float(distances_to_centroids[i]), None) for i in nearest])
+            continue
+
+        bounds = distances_to_centroids - radii if aggregate == "min" else distances_to_centroids
+        order = np.argsort(bounds, kind="stable")[:len(identities)]
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+
+        # Visit people in bound order, in chunks that double so far-away tails cost few steps
+        start, size = 0, probe
+        while start < len(order):
+            chunk = order[start:start + size]
+            start, size = start + size, size * 2
+            # float32 rounding slack so the bound never prunes an exact tie
+            if len(best_ids) == k and bounds[chunk[0]] > best_scores[-1] + 1e-4:
+                break
+
+            members = [members_of[i] for i in chunk]
+            sizes = np.array([len(m) for m in members])
+            offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            rows = np.concatenate(members)
+            distances = gallery.distances(query, rows)[0]
+
+            nearest = np.minimum.reduceat(distances, offsets)
+            scores = nearest if aggregate == "min" else np.add.reduceat(distances, offsets) / sizes
+            # Closest encoding of each person: first position equal to its segment minimum
+            hits = np.flatnonzero(distances == np.repeat(nearest, sizes))
+            closest = rows[hits[np.searchsorted(hits, offsets)]]
+
+            best_ids = np.concatenate([best_ids, chunk])
+            best_scores = np.concatenate([best_scores, scores.astype(np.float32)])
+            best_rows = np.concatenate([best_rows, closest])
+            keep = np.argsort(best_scores, kind="stable")[:k]
+            best_ids, best_scores, best_rows = best_ids[keep], best_scores[keep], best_rows[keep]
+
+        results.append([(int(i), float(score), int(row)) for i, score, row in zip(best_ids, best_scores, best_rows)])
+
+    return results
+
+def match_identities(identities, gallery, queries, aggregate="min", probe=32):
+    """Like match_batch, but ranks people: (rows, distances, confidences), rows -1 if unmatched
+
+    The row is the matched person's closest encoding (their first one for
+    the centroid aggregate), so callers can keep reading names/ids by row.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    rows = np.full(len(queries), -1, dtype=np.int64)
+    distances = np.ones(len(queries), dtype=np.float32)
+
+    for q, best in enumerate(search_identities(identities, gallery, queries, 1, aggregate, probe)):
+        if best:
+            identity, distance, row = best[0]
+            rows[q] = row if row is not None else identities.members[identity][0]
+            distances[q] = distance
+
+    confidences = np.maximum(0.0, (1.0 - distances) * 100.0)
+    return rows, distances, confidences
+
+def match_candidates(identities, gallery, queries, candidates, aggregate="min"):
+    """Like match_identities, but only over the given identity numbers (e.g. recently seen people)
+
+    Compares each query with the candidates' encodings only, so the cost
+    depends on how many encodings those few people have, not on the gallery.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    rows = np.full(len(queries), -1, dtype=np.int64)
+    distances = np.ones(len(queries), dtype=np.float32)
+    candidates = np.asarray(candidates, dtype=np.int64)
+
+    if len(queries) and len(candidates):
+        if aggregate == "centroid":
+            centroid_distances = np.sqrt(_sq_distances(queries, identities.centroids[candidates]).clip(min=0.0))
+            nearest = centroid_distances.argmin(axis=1)
+            rows = np.array([identities.members[candidates[i]][0] for i in nearest], dtype=np.int64)
+            distances = centroid_distances[np.arange(len(queries)), nearest].astype(np.float32)
+        else:
+            members = [identities.members[i] for i in candidates]
+            sizes = np.array([len(m) for m in members])
+            offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            member_rows = np.concatenate(members)
+            all_distances = gallery.distances(queries, member_rows)
+
+            for q, query_distances in enumerate(all_distances):
+                nearest = np.minimum.reduceat(query_distances, offsets)
+                scores = nearest if aggregate == "min" else np.add.reduceat(query_distances, offsets) / sizes
+                best = int(scores.argmin())
+                segment = query_distances[offsets[best]:offsets[best] + sizes[best]]
+                rows[q] = member_rows[offsets[best] + int(segment.argmin())]
+                distances[q] = scores[best]
+
+    confidences = np.maximum(0.0, (1.0 - distances) * 100.0)
+    return rows, distances, confidences
+
+def load_identity_policy(config=None):
+    """(match_by, aggregate, probe) from the [IDENTITIES] section"""
+    config = config or load_config()
+    match_by = config.get("IDENTITIES", "match_by").strip().lower()
+    aggregate = config.get("IDENTITIES", "aggregate").strip().lower()
+    if aggregate not in IDENTITY_AGGREGATES:
+        print(f"⚠️  Unknown identity aggregate '{aggregate}', using min")
+        aggregate = "min"
+    return match_by, aggregate, config.getint("IDENTITIES", "probe")
+
+def create_index(config=None):
+    """Instantiate the backend named in [INDEX] backend"""
+    config = config or load_config()
+    kind = config.get("INDEX", "backend").strip().lower()
+
+    if kind == IVFIndex.kind:
+        return IVFIndex(nlist=config.getint("INDEX", "nlist"), nprobe=config.getint("INDEX", "nprobe"))
+    if kind != BruteForceIndex.kind:
+        print(f"⚠️  Unknown index backend '{kind}', falling back to brute force")
+    return BruteForceIndex()
+
+def load_or_build_index(gallery, config=None):
+    """Reuse a cached index when it matches the configured backend, else build and cache one"""
+    config = config or load_config()
+    index = create_index(config)
+    index_file = config.get("INDEX", "index_file")
+
+    if index.kind == BruteForceIndex.kind:
+        index.build(gallery)
+        return index
+
+    if os.path.exists(index_file):
+        try:
+            with np.load(index_file, allow_pickle=False) as data:
+                cached_kind = str(data["kind"])
+            cached = INDEX_BACKENDS[cached_kind].load(index_file) if cached_kind == index.kind else None
+            if cached is not None and 0 < cached.count <= len(gallery):
+                cached.nprobe = index.nprobe
+                if cached.count < len(gallery):
+                    cached.add(gallery, np.arange(cached.count, len(gallery)))
+                print(f"📇 Loaded {index.kind} index from {index_file} ({cached.count} faces)")
+                return cached
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable index cache {index_file}: {e}")
+
+    started = time.perf_counter()
+    index.build(gallery)
+    print(f"📇 Built {index.kind} index over {len(gallery)} faces in {time.perf_counter() - started:.2f}s")
+
+    if len(gallery) > 0:
+        try:
+            os.makedirs(os.path.dirname(index_file) or ".", exist_ok=True)
+            index.save(index_file)
+        except Exception as e:
+            print(f"⚠️  Could not cache index to {index_file}: {e}")
+
+    return index
+
+def evaluate_index(index, gallery, queries=None, k=1, sample_size=200, noise=0.02, seed=0):
+    """Report recall@k against brute force and per-query latency for an index"""
+    rng = np.random.default_rng(seed)
+
+    if queries is None:
+        # Perturbed copies of stored faces stand in for fresh captures
+        rows = rng.choice(len(gallery), min(sample_size, len(gallery)), replace=False)
+        queries = gallery.encodings[rows] + rng.normal(0, noise, (len(rows), gallery.encodings.shape[1]))
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+
+    exact = BruteForceIndex()
+    exact.build(gallery)
+
+    def timed(idx):
+        latencies = []
+        results = []
+        for query in queries:
+            started = time.perf_counter()
+            results.append(idx.search(gallery, query, k)[1][0])
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        return np.array(results), np.array(latencies)
+
+    truth, exact_ms = timed(exact)
+    found, index_ms = timed(index)
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+
+    return {
+        "backend": index.kind,
+        "faces": len(gallery),
+        "queries": len(queries),
+        "k": k,
+        "recall": hits / float(truth.size) if truth.size else 1.0,
+        "mean_ms": float(index_ms.mean()) if len(index_ms) else 0.0,
+        "p95_ms": float(np.percentile(index_ms, 95)) if len(index_ms) else 0.0,
+        "brute_mean_ms": float(exact_ms.mean()) if len(exact_ms) else 0.0,
+    }
+
+def print_report(report):
+    print(f"📊 {report['backend']} index - {report['faces']} faces, {report['queries']} queries")
+    print(f"   Recall@{report['k']}: {report['recall'] * 100:.1f}%")
+    print(f"   Latency: {report['mean_ms']:.3f} ms mean, {report['p95_ms']:.3f} ms p95")
+    print(f"   Brute force: {report['brute_mean_ms']:.3f} ms mean")
+
+if __name__ == "__main__":
+    # python face_index.py --benchmark [synthetic_size]
+    from face_gallery import FaceGallery
+    from face_store import open_store
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--benchmark":
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(0, 0.1, (int(sys.argv[2]), 128)).astype(np.float32)
+        gallery = FaceGallery.from_arrays(vectors, [f"face_{i}" for i in range(len(vectors))], [{}] * len(vectors))
+    else:
+        vectors, metadata = open_store().load()
+        gallery = FaceGallery.from_arrays(vectors, [entry["name"] for entry in metadata], metadata)
+
+    if len(gallery) == 0:
+        print("❌ Gallery is empty - nothing to benchmark")
+        sys.exit(1)
+
+    config = load_config()
+    index = create_index(config)
+    index.build(gallery)
+    print_report(evaluate_index(index, gallery))
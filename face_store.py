@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Face Store Module - Append-only memory-mapped encoding store
+
+Layout of a store directory:
+    encodings.f32   raw little-endian float32 rows, 128 values per face
+    metadata.jsonl  one JSON object per row (row, name, id, image_path, timestamp, quality)
+
+Both files are only ever appended to, so a registration costs the same no
+matter how large the gallery is, and readers memory-map the vectors instead
+of unpickling every entry.
+"""
+
+import os
+import re
+import sys
+import json
+import uuid
+import pickle
+import threading
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STORE_DIR = "face_store"
+ENCODINGS_FILE = "face_encodings.pkl"
+VECTORS_FILE = "encodings.f32"
+METADATA_FILE = "metadata.jsonl"
+LOCK_FILE = ".lock"
+LEASE_FILE = ".readers"
+
+ENCODING_DIM = 128
+VECTOR_DTYPE = np.dtype("<f4")
+ROW_BYTES = ENCODING_DIM * VECTOR_DTYPE.itemsize
+
+class _StoreLock:
+    """Exclusive lock shared by threads and processes writing the same store"""
+
+    _thread_locks = {}
+    _thread_locks_guard = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        with self._thread_locks_guard:
+            self._thread_lock = self._thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        except Exception:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._thread_lock.release()
+
+class EncodingStore:
+    """Append-only float32 vector file plus JSONL metadata sidecar"""
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.vectors_path = os.path.join(store_dir, VECTORS_FILE)
+        self.metadata_path = os.path.join(store_dir, METADATA_FILE)
+        self.lock_path = os.path.join(store_dir, LOCK_FILE)
+        self.lease_path = os.path.join(store_dir, LEASE_FILE)
+
+    def exists(self):
+        return os.path.exists(self.vectors_path) and os.path.exists(self.metadata_path)
+
+    def count(self):
+        """Number of vector rows on disk (cheap, no parsing)"""
+        if not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // ROW_BYTES
+
+    def __len__(self):
+        return self.count()
+
+    def _lock(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        return _StoreLock(self.lock_path)
+
+    def hold(self):
+        """Take a shared lease for as long as this process serves the store (keep the returned fd)
+
+        Long-running readers (backend, realtime CLI) memory-map the vectors, so
+        tools that replace the store check in_use() first. None where leases
+        are not supported (no fcntl).
+        """
+        if fcntl is None:
+            return None
+        os.makedirs(self.store_dir, exist_ok=True)
+        fd = os.open(self.lease_path, os.O_RDWR | os.O_CREAT)
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        return fd
+
+    def in_use(self):
+        """True while some process holds a lease on the store; None if this cannot be told"""
+        if fcntl is None:
+            return None
+        if not os.path.exists(self.lease_path):
+            return False
+        fd = os.open(self.lease_path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+
+    def _repair(self):
+        """Drop a torn tail left by a writer that died between the two files"""
+        metadata_rows = self._metadata_rows()
+        vector_rows = self.count()
+
+        if vector_rows > metadata_rows:
+            print(f"⚠️  Face store: dropping {vector_rows - metadata_rows} unpaired vector row(s)")
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != metadata_rows * ROW_BYTES:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(min(vector_rows, metadata_rows) * ROW_BYTES)
+
+    def _metadata_rows(self, chunk_size=8192):
+        """Row count from the last complete metadata line, trimming any partial line"""
+        if not os.path.exists(self.metadata_path):
+            return 0
+
+        with open(self.metadata_path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            start = end
+            data = b""
+            while start > 0 and data.count(b"\n") < 2:
+                start = max(0, start - chunk_size)
+                f.seek(start)
+                data = f.read(end - start)
+
+            last_newline = data.rfind(b"\n")
+            if last_newline + 1 != len(data):
+                f.truncate(start + last_newline + 1)
+            if last_newline < 0:
+                return 0
+
+            last_line = data[:last_newline].rsplit(b"\n", 1)[-1]
+            return json.loads(last_line)["row"] + 1
+
+    @staticmethod
+    def make_record(name, image_path, unique_id, timestamp=None, quality="high"):
+        return {
+            "name": name,
+            "image_path": image_path,
+            "id": unique_id,
+            "timestamp": timestamp or datetime.now().isoformat(),
+            "quality": quality
+        }
+
+    def append(self, name, encoding, image_path, unique_id, timestamp=None, quality="high"):
+        """Append one face and return its metadata record"""
+        record = self.make_record(name, image_path, unique_id, timestamp, quality)
+        self.append_many([encoding], [record])
+        return record
+
+    def append_many(self, encodings, records):
+        """Durably append several faces with a single pair of writes"""
+        if len(encodings) != len(records):
+            raise ValueError("encodings and records must have the same length")
+        if not records:
+            return 0
+
+        vectors = np.asarray(encodings, dtype=VECTOR_DTYPE).reshape(len(records), -1)
+        if vectors.shape[1] != ENCODING_DIM:
+            raise ValueError(f"Expected {ENCODING_DIM}-d encodings, got {vectors.shape[1]}")
+
+        with self._lock():
+            self._repair()
+
+            first_row = self.count()
+            for offset, record in enumerate(records):
+                record["row"] = first_row + offset
+            lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+            # Vectors first: a crash before the metadata write leaves an
+            # unpaired row that _repair() drops on the next append
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(self.metadata_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+        return len(records)
+
+    def load_vectors(self, count=None):
+        """Memory-map the vector file read-only (zero-copy)"""
+        rows = self.count() if count is None else count
+        if rows == 0:
+            return np.empty((0, ENCODING_DIM), dtype=VECTOR_DTYPE)
+        return np.memmap(self.vectors_path, dtype=VECTOR_DTYPE, mode="r", shape=(rows, ENCODING_DIM))
+
+    def load_metadata(self):
+        """Read every metadata record in row order"""
+        records = []
+        if not os.path.exists(self.metadata_path):
+            return records
+
+        with open(self.metadata_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # torn tail from an interrupted writer
+                records.append(json.loads(line))
+        return records
+
+    def read_metadata_from(self, offset=0):
+        """Read complete metadata records appended after byte `offset`
+
+        Returns (records, next_offset) so callers can follow the sidecar
+        incrementally instead of re-reading it from the start.
+        """
+        if not os.path.exists(self.metadata_path):
+            return [], 0
+
+        records = []
+        with open(self.metadata_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn tail from an interrupted writer
+                records.append(json.loads(line))
+                offset += len(line)
+        return records, offset
+
+    def load(self):
+        """Return (vectors, metadata) trimmed to the rows present in both files"""
+        metadata = self.load_metadata()
+        rows = min(len(metadata), self.count())
+        return self.load_vectors(rows), metadata[:rows]
+
+    def tail_metadata(self, count=1, chunk_size=8192):
+        """Read the last few metadata records without scanning the whole file"""
+        if not os.path.exists(self.metadata_path):
+            return []
+
+        with open(self.metadata_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            start = end
+            data = b""
+            while start > 0 and data.count(b"\n") <= count:
+                start = max(0, start - chunk_size)
+                f.seek(start)
+                data = f.read(end - start)
+
+        lines = [line for line in data.split(b"\n") if line.strip()]
+        if start > 0:
+            lines = lines[1:]  # first line may be partial
+        return [json.loads(line) for line in lines[-count:]]
+
+def _legacy_id(entry):
+    """Recover the short id from a legacy image name like 'Jenny_a441b66f.jpg'"""
+    image_name = re.split(r"[\\/]", entry.get("image_path") or "")[-1]
+    match = re.search(r"_([0-9a-f]{8})(?:_\d{8}_\d{6})?\.\w+$", image_name)
+    return match.group(1) if match else str(uuid.uuid4())[:8]
+
+def _legacy_timestamp(entry, pickle_path):
+    """When an entry without a timestamp was registered, at the latest: its image's
+    modification time, else the pickle's (never the migration time)"""
+    for path in (entry.get("image_path"), pickle_path):
+        if path and os.path.exists(path):
+            return datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+    return None
+
+def migrate_pickle(pickle_path=ENCODINGS_FILE, store=None):
+    """One-shot migration of a legacy face_encodings.pkl into an EncodingStore"""
+    store = store if store is not None else EncodingStore()
+
+    if store.count() > 0:
+        print(f"⚠️  Face store {store.store_dir} already holds {store.count()} faces - skipping migration")
+        return 0
+
+    with open(pickle_path, "rb") as f:
+        legacy_data = pickle.load(f)
+
+    encodings = []
+    records = []
+    for i, entry in enumerate(legacy_data):
+        if not isinstance(entry, dict) or "encoding" not in entry or "name" not in entry:
+            print(f"   ❌ Skipping invalid entry {i}")
+            continue
+
+        encoding = np.asarray(entry["encoding"])
+        if encoding.shape != (ENCODING_DIM,):
+            print(f"   ❌ Skipping invalid encoding for {entry['name']}")
+            continue
+
+        encodings.append(encoding)
+        records.append(store.make_record(
+            entry["name"],
+            entry.get("image_path", ""),
+            entry.get("id") or _legacy_id(entry),
+            entry.get("timestamp") or _legacy_timestamp(entry, pickle_path),
+            entry.get("quality", "legacy")
+        ))
+
+    store.append_many(encodings, records)
+    print(f"✅ Migrated {len(records)} faces from {pickle_path} to {store.store_dir}")
+    return len(records)
+
+def open_store(store_dir=STORE_DIR, legacy_pickle=ENCODINGS_FILE):
+    """Open a store, migrating the legacy pickle the first time it is needed"""
+    store = EncodingStore(store_dir)
+    if store.count() == 0 and legacy_pickle and os.path.exists(legacy_pickle):
+        print(f"📦 Migrating {legacy_pickle} to the append-only face store...")
+        try:
+            migrate_pickle(legacy_pickle, store)
+        except Exception as e:
+            print(f"❌ Migration failed: {e}")
+    return store
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--migrate":
+        pickle_path = sys.argv[2] if len(sys.argv) > 2 else ENCODINGS_FILE
+        store_dir = sys.argv[3] if len(sys.argv) > 3 else STORE_DIR
+        migrate_pickle(pickle_path, EncodingStore(store_dir))
+    else:
+        store = EncodingStore()
+        print(f"📂 {store.store_dir}: {store.count()} faces")
+        print("💡 Usage: python face_store.py --migrate [pickle_path] [store_dir]")
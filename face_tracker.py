@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Face Tracker Module - Keep identities attached to faces across frames
+
+Detected boxes are associated with existing tracks by IoU. A track keeps the
+name it was matched to, so a face only needs a new encoding when:
+    - the track is new,
+    - its last match was Unknown / below min_confidence (retried every
+      `retry_frames` analysed frames), or
+    - `refresh_frames` analysed frames have passed since its last encoding.
+
+Optionally (detect_every > 1 and an OpenCV tracker such as KCF or CSRT is
+available) boxes are moved by correlation trackers between detections, so
+HOG detection does not have to run on every analysed frame either.
+"""
+
+import cv2
+
+class Track:
+    """One face followed across frames"""
+
+    def __init__(self, track_id, box, frame_no):
+        self.track_id = track_id
+        self.box = box  # (top, right, bottom, left)
+        self.name = "Unknown"
+        self.confidence = 0.0
+        self.distance = 1.0
+        self.created = frame_no
+        self.last_encoded = None
+        self.missed = 0
+        self.cv_tracker = None
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    intersection = max(0, bottom - top) * max(0, right - left)
+    if intersection == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return intersection / float(area_a + area_b - intersection)
+
+def create_cv_tracker(kind):
+    """OpenCV tracker factory by name (kcf, csrt, mil); None if this build lacks it"""
+    if not kind or kind == "none":
+        return None
+    factory_name = f"Tracker{kind.upper()}_create"
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        factory = getattr(module, factory_name, None) if module is not None else None
+        if factory is not None:
+            return factory
+    return None
+
+class FaceTracker:
+    """IoU association of detections to tracks, deciding which faces need encoding"""
+
+    def __init__(self, iou_threshold=0.3, max_missed=5, refresh_frames=30, retry_frames=5,
+                 min_confidence=60.0, detect_every=1, cv_tracker="none"):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.refresh_frames = refresh_frames
+        self.retry_frames = retry_frames
+        self.min_confidence = min_confidence
+        self.detect_every = max(1, int(detect_every))
+        self.tracks = []
+        self._next_id = 1
+        self._frames = 0
+
+        self._cv_factory = create_cv_tracker(cv_tracker) if self.detect_every > 1 else None
+        if self.detect_every > 1 and self._cv_factory is None:
+            print(f"⚠️  OpenCV '{cv_tracker}' tracker unavailable - detecting on every analysed frame")
+            self.detect_every = 1
+
+        # face observations vs encodings actually computed
+        self.observations = 0
+        self.encodings = 0
+
+    @classmethod
+    def from_config(cls, config, min_confidence=60.0):
+        return cls(
+            iou_threshold=config.getfloat("TRACKING", "iou_threshold"),
+            max_missed=config.getint("TRACKING", "max_missed"),
+            refresh_frames=config.getint("TRACKING", "refresh_frames"),
+            retry_frames=config.getint("TRACKING", "retry_frames"),
+            min_confidence=min_confidence,
+            detect_every=config.getint("TRACKING", "detect_every"),
+            cv_tracker=config.get("TRACKING", "cv_tracker").strip().lower()
+        )
+
+    def needs_detection(self):
+        """True when this analysed frame must run the face detector"""
+        return self._cv_factory is None or self._frames % self.detect_every == 0 or not self.tracks
+
+    def update(self, boxes, frame=None):
+        """Associate detected boxes with tracks; returns the tracks that need a fresh encoding"""
+        self._frames += 1
+
+        pairs = sorted(((box_iou(track.box, box), t, b)
+                        for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+                       reverse=True)
+        matched_tracks, matched_boxes = set(), set()
+        for iou, t, b in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            self.tracks[t].box = boxes[b]
+            self.tracks[t].missed = 0
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            survivors.append(track)
+        self.tracks = survivors
+
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                self.tracks.append(Track(self._next_id, box, self._frames))
+                self._next_id += 1
+
+        if frame is not None and self._cv_factory is not None:
+            for track in self.tracks:
+                if track.missed == 0:
+                    self._start_cv_tracker(track, frame)
+
+        visible = [track for track in self.tracks if track.missed == 0]
+        self.observations += len(visible)
+        return [track for track in visible if self._needs_encoding(track)]
+
+    def follow(self, frame):
+        """Move tracks with their correlation trackers on a frame without detection"""
+        self._frames += 1
+        for track in self.tracks:
+            if track.cv_tracker is None:
+                track.missed += 1
+                continue
+            found, (x, y, w, h) = track.cv_tracker.update(frame)
+            if found:
+                track.box = (int(y), int(x + w), int(y + h), int(x))
+                track.missed = 0
+            else:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        self.observations += len(self.visible())
+
+    def assign(self, track, name, confidence, distance):
+        """Attach a match result to a track"""
+        track.name = name
+        track.confidence = confidence
+        track.distance = distance
+        track.last_encoded = self._frames
+        self.encodings += 1
+
+    def visible(self):
+        return [track for track in self.tracks if track.missed == 0]
+
+    def stats(self):
+        return {
+            "tracks": len(self.tracks),
+            "observations": self.observations,
+            "encodings": self.encodings,
+            "encodings_saved": self.observations - self.encodings
+        }
+
+    def _needs_encoding(self, track):
+        if track.last_encoded is None:
+            return True
+        age = self._frames - track.last_encoded
+        if track.name == "Unknown" or track.confidence < self.min_confidence:
+            return age >= self.retry_frames
+        return age >= self.refresh_frames
+
+    def _start_cv_tracker(self, track, frame):
+        top, right, bottom, left = track.box
+        try:
+            track.cv_tracker = self._cv_factory()
+            track.cv_tracker.init(frame, (left, top, right - left, bottom - top))
+        except Exception:
+            track.cv_tracker = None
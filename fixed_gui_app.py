@@ -8,8 +8,7 @@ from tkinter import messagebox, ttk
 import cv2
 from PIL import Image, ImageTk
 import threading
-import os
-from fixed_register_face import register_user_fixed, list_registered_users
+from fixed_register_face import register_user_fixed, list_registered_users, get_registry
 from fixed_recognize_face import recognize_faces, debug_face_database
 
 class FixedFaceApp:
@@ -210,19 +209,18 @@ class FixedFaceApp:
     def check_database_status(self):
         """Check and display database status"""
         try:
-            if os.path.exists("face_encodings.pkl"):
-                import pickle
-                with open("face_encodings.pkl", "rb") as f:
-                    data = pickle.load(f)
-                count = len(data)
+            # Metadata-only: count and first names come straight from the registry
+            registry = get_registry()
+            count = registry.count()
+            if count > 0:
                 self.update_status(f"📊 Database Status: {count} faces registered")
                 
                 # Show registered names
-                names = [entry.get("name", "Unknown") for entry in data if isinstance(entry, dict)]
+                names = [user["name"] for user in registry.list_users(limit=5)]
                 if names:
-                    self.update_status(f"👥 Registered users: {', '.join(names[:5])}")
-                    if len(names) > 5:
-                        self.update_status(f"    ... and {len(names)-5} more")
+                    self.update_status(f"👥 Registered users: {', '.join(names)}")
+                    if count > 5:
+                        self.update_status(f"    ... and {count-5} more")
             else:
                 self.update_status("📊 Database Status: No faces registered yet")
         except Exception as e:
@@ -4,69 +4,78 @@ Fixed Face Recognition Module - Proper name retrieval from database
 """
 
 import cv2
+import threading
 import face_recognition
-import pickle
-import os
-import numpy as np
 from datetime import datetime
+from face_gallery import FaceGallery
+from face_store import open_store
+from face_config import load_config
+from face_index import (create_index, load_or_build_index, match_batch,
+                        IdentityIndex, match_identities, load_identity_policy)
+from face_detection import detect_faces, load_policy
+from face_tracker import FaceTracker
+from realtime_pipeline import FrameGrabber, AnalysisWorker, RateMeter
+from motion_gate import MotionGate
 
-ENCODINGS_FILE = "face_encodings.pkl"
+ENCODINGS_FILE = "face_encodings.pkl"  # legacy format, migrated into STORE_DIR
+STORE_DIR = "face_store"
+WINDOW_TITLE = "Fixed Face Recognition - Press 'Q' to Quit, 'R' to Reload"
 
 class FixedFaceRecognizer:
     def __init__(self):
-        self.known_encodings = []
-        self.known_names = []
-        self.known_metadata = []
+        self.config = load_config()
+        self.gallery = FaceGallery()
+        self.index = create_index(self.config)
+        self.identities = IdentityIndex()
+        # Match by nearest row or by nearest person ([IDENTITIES])
+        self.match_by, self.identity_aggregate, self.identity_probe = load_identity_policy(self.config)
+        # Held while running: gallery_verify.py --swap refuses to replace a store in use
+        self.store_lease = open_store(STORE_DIR, ENCODINGS_FILE).hold()
         self.load_known_faces()
+        
+        # Use stricter matching criteria for accuracy
+        self.tolerance = 0.45  # Stricter tolerance
+        self.min_confidence = 60.0  # Minimum confidence
+        
+        # Detection resolution: CLI longest side and HOG upsampling from [DETECTION]
+        self.detect_max_side, self.detect_upsample = load_policy(self.config, cli=True)
     
     def load_known_faces(self):
         """Load known faces with proper name association - FIXED VERSION"""
-        if not os.path.exists(ENCODINGS_FILE):
+        store = open_store(STORE_DIR, ENCODINGS_FILE)
+        if not store.exists():
             print("❌ No registered faces found!")
             print("💡 Please register faces first using fixed_register_face.py")
             return False
         
         try:
-            with open(ENCODINGS_FILE, "rb") as f:
-                known_data = pickle.load(f)
+            # Zero-copy open: vectors are memory-mapped, not unpickled
+            vectors, metadata = store.load()
             
-            if not known_data:
+            if not metadata:
                 print("❌ No face data found in encodings file!")
                 return False
             
-            # Clear existing data
-            self.known_encodings = []
-            self.known_names = []
-            self.known_metadata = []
+            print(f"📂 Loading {len(metadata)} face records...")
             
-            print(f"📂 Loading {len(known_data)} face records...")
+            names = [entry["name"] for entry in metadata]
+            self.gallery = FaceGallery.from_arrays(
+                vectors, names, metadata,
+                precision=self.config.get("GALLERY", "precision"),
+                rerank=self.config.getint("GALLERY", "rerank"),
+                exact_source=store.load_vectors
+            )
+            self.index = load_or_build_index(self.gallery, self.config)
+            self.identities = IdentityIndex()
+            self.identities.build(self.gallery)
             
-            # Load face data with proper validation
-            for i, entry in enumerate(known_data):
-                if isinstance(entry, dict):
-                    # Check for required fields
-                    if "encoding" in entry and "name" in entry:
-                        name = entry["name"]
-                        encoding = entry["encoding"]
-                        
-                        # Validate encoding format
-                        if isinstance(encoding, np.ndarray) and encoding.shape == (128,):
-                            self.known_encodings.append(encoding)
-                            self.known_names.append(name)
-                            self.known_metadata.append(entry)
-                            print(f"   ✅ Loaded: {name} (ID: {entry.get('id', 'unknown')})")
-                        else:
-                            print(f"   ❌ Invalid encoding for {name}")
-                    else:
-                        print(f"   ❌ Missing name or encoding in entry {i}")
-                else:
-                    print(f"   ❌ Invalid entry format at index {i}")
-            
-            print(f"✅ Successfully loaded {len(self.known_names)} known faces:")
-            for i, name in enumerate(self.known_names):
+            print(f"✅ Successfully loaded {len(self.gallery)} known faces:")
+            for i, name in enumerate(self.gallery.names[:20]):
                 print(f"   {i+1}. {name}")
+            if len(self.gallery) > 20:
+                print(f"   ... and {len(self.gallery) - 20} more")
             
-            return len(self.known_names) > 0
+            return len(self.gallery) > 0
             
         except Exception as e:
             print(f"❌ Error loading known faces: {e}")
@@ -74,54 +83,132 @@ class FixedFaceRecognizer:
             traceback.print_exc()
             return False
     
-    def recognize_face_with_correct_name(self, face_encoding):
-        """Fixed face recognition that returns the correct registered name"""
-        if not self.known_encodings:
-            return "Unknown", 0.0, 1.0
+    def recognize_faces_with_correct_names(self, face_encodings):
+        """Match a K x 128 block of faces with one batched gallery query"""
+        if len(face_encodings) == 0:
+            return []
+        
+        if len(self.gallery) == 0:
+            return [("Unknown", 0.0, 1.0)] * len(face_encodings)
         
         try:
-            # Calculate distances to all known faces
-            face_distances = face_recognition.face_distance(self.known_encodings, face_encoding)
-            
-            # Find the best match
-            best_match_index = np.argmin(face_distances)
-            best_distance = face_distances[best_match_index]
+            # One index query (one matrix product for brute force) for all K faces
+            if self.match_by == "identity":
+                rows, distances, confidences = match_identities(
+                    self.identities, self.gallery, face_encodings, self.identity_aggregate, self.identity_probe
+                )
+            else:
+                rows, distances, confidences = match_batch(self.index, self.gallery, face_encodings)
             
-            # Calculate confidence percentage
-            confidence = max(0, (1 - best_distance) * 100)
+            results = []
+            for best_match_index, best_distance, confidence in zip(rows, distances, confidences):
+                best_distance, confidence = float(best_distance), float(confidence)
+                
+                if best_match_index < 0:
+                    results.append(("Unknown", 0.0, 1.0))
+                # Check if the match is good enough
+                elif best_distance <= self.tolerance and confidence >= self.min_confidence:
+                    # Get the correct name from our loaded data
+                    recognized_name = self.gallery.names[best_match_index]
+                    
+                    print(f"✅ RECOGNIZED: {recognized_name}")
+                    print(f"   Confidence: {confidence:.1f}%")
+                    print(f"   Distance: {best_distance:.3f}")
+                    print(f"   Match Index: {best_match_index}")
+                    
+                    results.append((recognized_name, confidence, best_distance))
+                else:
+                    print(f"❓ No confident match found")
+                    print(f"   Best candidate: {self.gallery.names[best_match_index]}")
+                    print(f"   Confidence: {confidence:.1f}%")
+                    print(f"   Distance: {best_distance:.3f}")
+                    
+                    results.append(("Unknown", confidence, best_distance))
             
-            # Use stricter matching criteria for accuracy
-            tolerance = 0.45  # Stricter tolerance
-            min_confidence = 60.0  # Minimum confidence
+            return results
             
-            # Check if the match is good enough
-            if best_distance <= tolerance and confidence >= min_confidence:
-                # Get the correct name from our loaded data
-                recognized_name = self.known_names[best_match_index]
-                
-                print(f"✅ RECOGNIZED: {recognized_name}")
-                print(f"   Confidence: {confidence:.1f}%")
-                print(f"   Distance: {best_distance:.3f}")
-                print(f"   Match Index: {best_match_index}")
-                
-                return recognized_name, confidence, best_distance
-            else:
-                print(f"❓ No confident match found")
-                print(f"   Best candidate: {self.known_names[best_match_index] if self.known_names else 'None'}")
-                print(f"   Confidence: {confidence:.1f}%")
-                print(f"   Distance: {best_distance:.3f}")
-                
-                return "Unknown", confidence, best_distance
-                
         except Exception as e:
             print(f"❌ Recognition error: {e}")
             import traceback
             traceback.print_exc()
-            return "Unknown", 0.0, 1.0
+            return [("Unknown", 0.0, 1.0)] * len(face_encodings)
+    
+    def recognize_face_with_correct_name(self, face_encoding):
+        """Fixed face recognition that returns the correct registered name"""
+        return self.recognize_faces_with_correct_names([face_encoding])[0]
+    
+    def analyze_tracked_frame(self, frame, tracker):
+        """Detect (or follow) faces and encode only tracks that need a fresh identity"""
+        if tracker.needs_detection():
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            boxes = detect_faces(face_recognition, rgb_frame, self.detect_max_side, self.detect_upsample)
+            stale_tracks = tracker.update(boxes, frame)
+            
+            if stale_tracks:
+                face_encodings = face_recognition.face_encodings(
+                    rgb_frame, [track.box for track in stale_tracks], num_jitters=1
+                )
+                matches = self.recognize_faces_with_correct_names(face_encodings)
+                for track, (name, confidence, distance) in zip(stale_tracks, matches):
+                    tracker.assign(track, name, confidence, distance)
+        else:
+            tracker.follow(frame)
+        
+        visible = tracker.visible()
+        return ([track.box for track in visible],
+                [track.name for track in visible],
+                [track.confidence for track in visible])
+    
+    def analyze_frame(self, frame, tracker=None):
+        """Return (face_locations, face_names, face_confidences) for one BGR frame"""
+        if tracker is not None:
+            return self.analyze_tracked_frame(frame, tracker)
+        
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        
+        # Detect on a downscaled copy, encode from the full-resolution frame
+        face_locations = detect_faces(face_recognition, rgb_frame, self.detect_max_side, self.detect_upsample)
+        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations, num_jitters=1)
+        
+        # Match all faces in the frame with one batched query
+        matches = self.recognize_faces_with_correct_names(face_encodings)
+        face_names = [name for name, confidence, distance in matches]
+        face_confidences = [confidence for name, confidence, distance in matches]
+        return face_locations, face_names, face_confidences
+    
+    def draw_results(self, frame, results, status):
+        """Draw face boxes, labels and a status line onto a frame"""
+        face_locations, face_names, face_confidences = results
+        
+        for (top, right, bottom, left), name, confidence in zip(face_locations, face_names, face_confidences):
+            # Choose color based on recognition
+            if name == "Unknown":
+                color = (0, 0, 255)  # Red for unknown
+                label_color = (255, 255, 255)
+                label = "Unknown"
+            else:
+                color = (0, 255, 0)  # Green for recognized
+                label_color = (0, 0, 0)
+                label = f"{name} ({confidence:.1f}%)"
+            
+            # Draw rectangle around face
+            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+            
+            # Draw label background
+            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_DUPLEX, 0.6, 1)[0]
+            cv2.rectangle(frame, (left, bottom - 35), (left + label_size[0], bottom), color, cv2.FILLED)
+            
+            # Draw label text
+            cv2.putText(frame, label, (left + 6, bottom - 6), 
+                       cv2.FONT_HERSHEY_DUPLEX, 0.6, label_color, 1)
+        
+        # Add status information
+        cv2.putText(frame, status, (10, 30), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
     
     def recognize_faces_realtime(self):
         """Real-time face recognition with correct name display"""
-        if not self.known_encodings:
+        if len(self.gallery) == 0:
             print("❌ No known faces loaded! Please register faces first.")
             return False
         
@@ -140,14 +227,52 @@ class FixedFaceRecognizer:
         print("🎯 FIXED FACE RECOGNITION - CORRECT NAMES")
         print("="*50)
         print("📹 Camera started - Press 'Q' to quit, 'R' to reload faces")
-        print(f"🔍 Ready to recognize {len(self.known_names)} registered faces:")
-        for i, name in enumerate(self.known_names):
+        print(f"🔍 Ready to recognize {len(self.gallery)} registered faces:")
+        for i, name in enumerate(self.gallery.names[:20]):
             print(f"   {i+1}. {name}")
         print("-" * 50)
         
-        # Performance optimization
+        # Tracks keep their identity, so only new/unsure faces are re-encoded
+        tracker = None
+        if self.config.getboolean("TRACKING", "enabled"):
+            tracker = FaceTracker.from_config(self.config, self.min_confidence)
+        
+        # Frames where nothing moved reuse the previous result instead of running HOG
+        gate = MotionGate.from_config(self.config)
+        
+        try:
+            if self.config.getboolean("PIPELINE", "enabled"):
+                frame_count = self._run_pipelined(cap, tracker, gate)
+            else:
+                frame_count = self._run_serial(cap, tracker, gate)
+        finally:
+            cap.release()
+            cv2.destroyAllWindows()
+        
+        print(f"\n📊 Session completed after {frame_count} frames")
+        if tracker is not None:
+            stats = tracker.stats()
+            print(f"🎯 Encoded {stats['encodings']} of {stats['observations']} tracked face observations")
+        if gate is not None:
+            stats = gate.stats()
+            print(f"🌙 Motion gate skipped detection on {stats['skipped']} of {stats['checked']} frames")
+        print("✅ Face recognition stopped.")
+        return True
+    
+    def _handle_key(self):
+        """Returns 'quit', 'reload' or None for the last key pressed in the window"""
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q') or key == ord('Q'):
+            return "quit"
+        if key == ord('r') or key == ord('R'):
+            return "reload"
+        return None
+    
+    def _run_serial(self, cap, tracker, gate=None):
+        """Capture, analyse and display one frame at a time (analysis on every other frame)"""
         process_this_frame = True
         frame_count = 0
+        results = ([], [], [])
         
         while True:
             ret, frame = cap.read()
@@ -160,81 +285,96 @@ class FixedFaceRecognizer:
             frame_count += 1
             
             # Process every other frame for better performance
-            if process_this_frame:
-                # Resize for faster processing
-                small_frame = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                
-                # Find faces and encodings
-                face_locations = face_recognition.face_locations(rgb_small_frame, model="hog")
-                face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations, num_jitters=1)
-                
-                face_names = []
-                face_confidences = []
-                
-                for face_encoding in face_encodings:
-                    # Use fixed recognition method
-                    name, confidence, distance = self.recognize_face_with_correct_name(face_encoding)
-                    face_names.append(name)
-                    face_confidences.append(confidence)
-            
+            if process_this_frame and (gate is None or gate.changed(frame)):
+                results = self.analyze_frame(frame, tracker)
             process_this_frame = not process_this_frame
             
             # Display results
-            for (top, right, bottom, left), name, confidence in zip(face_locations, face_names, face_confidences):
-                # Scale back up face locations
-                top *= 2
-                right *= 2
-                bottom *= 2
-                left *= 2
-                
-                # Choose color based on recognition
-                if name == "Unknown":
-                    color = (0, 0, 255)  # Red for unknown
-                    label_color = (255, 255, 255)
-                    label = "Unknown"
-                else:
-                    color = (0, 255, 0)  # Green for recognized
-                    label_color = (0, 0, 0)
-                    label = f"{name} ({confidence:.1f}%)"
-                
-                # Draw rectangle around face
-                cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-                
-                # Draw label background
-                label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_DUPLEX, 0.6, 1)[0]
-                cv2.rectangle(frame, (left, bottom - 35), (left + label_size[0], bottom), color, cv2.FILLED)
-                
-                # Draw label text
-                cv2.putText(frame, label, (left + 6, bottom - 6), 
-                           cv2.FONT_HERSHEY_DUPLEX, 0.6, label_color, 1)
-            
-            # Add status information
-            status = f"Registered: {len(self.known_names)} | Detected: {len(face_locations)}"
-            cv2.putText(frame, status, (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            
-            # Show frame
-            cv2.imshow("Fixed Face Recognition - Press 'Q' to Quit, 'R' to Reload", frame)
+            self.draw_results(frame, results, f"Registered: {len(self.gallery)} | Detected: {len(results[0])}")
+            cv2.imshow(WINDOW_TITLE, frame)
             
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q') or key == ord('Q'):
+            action = self._handle_key()
+            if action == "quit":
                 break
-            elif key == ord('r') or key == ord('R'):
+            elif action == "reload":
                 print("🔄 Reloading known faces...")
                 self.load_known_faces()
+                if gate is not None:
+                    gate.reset()
         
-        cap.release()
-        cv2.destroyAllWindows()
+        return frame_count
+    
+    def _run_pipelined(self, cap, tracker, gate=None):
+        """Capture and analysis on their own threads; this loop only renders the newest results"""
+        reload_requested = threading.Event()
         
-        print(f"\n📊 Session completed after {frame_count} frames")
-        print("✅ Face recognition stopped.")
-        return True
+        def analyze(frame):
+            # Reload between analyses so the gallery never changes under a match
+            if reload_requested.is_set():
+                reload_requested.clear()
+                print("🔄 Reloading known faces...")
+                self.load_known_faces()
+                if gate is not None:
+                    gate.reset()
+            
+            latest = analyzer.latest()
+            if latest is not None and gate is not None and not gate.changed(frame):
+                return latest[1]
+            return self.analyze_frame(frame, tracker)
+        
+        grabber = FrameGrabber(cap, transform=lambda frame: cv2.flip(frame, 1)).start()
+        analyzer = AnalysisWorker(analyze, max_fps=self.config.getfloat("PIPELINE", "analysis_fps")).start()
+        display_rate = RateMeter()
+        analysis_rate = RateMeter()
+        last_analysed = None
+        frame_count = 0
+        
+        try:
+            while True:
+                item = grabber.frames.take(timeout=1.0)
+                if item is None:
+                    if grabber.failed.is_set():
+                        print("❌ Camera error!")
+                        break
+                    continue
+                
+                frame_no, frame = item
+                frame_count += 1
+                analyzer.submit(frame_no, frame)
+                
+                latest = analyzer.latest()
+                results = latest[1] if latest is not None else ([], [], [])
+                if latest is not None and latest[0] != last_analysed:
+                    last_analysed = latest[0]
+                    analysis_rate.tick()
+                display_rate.tick()
+                
+                # Draw on a copy: the analysis thread may still be reading this frame
+                display = frame.copy()
+                status = (f"Registered: {len(self.gallery)} | Detected: {len(results[0])} | "
+                          f"{display_rate.rate():.0f} fps / analysis {analysis_rate.rate():.1f} Hz")
+                self.draw_results(display, results, status)
+                cv2.imshow(WINDOW_TITLE, display)
+                
+                action = self._handle_key()
+                if action == "quit":
+                    break
+                elif action == "reload":
+                    reload_requested.set()
+        finally:
+            grabber.stop()
+            analyzer.stop()
+        
+        capture, analysis = grabber.stats(), analyzer.stats()
+        print(f"📹 Capture: {capture['captured']} frames, {capture['dropped']} dropped before display")
+        print(f"🧠 Analysis: {analysis['analysed']} frames ({analysis['mean_ms']:.0f} ms each), "
+              f"{analysis['dropped']} skipped while busy, {analysis['errors']} errors")
+        return frame_count
 
 def recognize_faces():
     """Main function for fixed face recognition"""
     recognizer = FixedFaceRecognizer()
-    if recognizer.known_encodings:
+    if len(recognizer.gallery) > 0:
         return recognizer.recognize_faces_realtime()
     else:
         print("❌ No faces registered. Please register faces first using fixed_register_face.py")
@@ -245,32 +385,26 @@ def debug_face_database():
     print("\n🔍 DEBUGGING FACE DATABASE")
     print("=" * 40)
     
-    if not os.path.exists(ENCODINGS_FILE):
+    store = open_store(STORE_DIR, ENCODINGS_FILE)
+    if not store.exists():
         print("❌ No encodings file found!")
         return
     
     try:
-        with open(ENCODINGS_FILE, "rb") as f:
-            data = pickle.load(f)
+        # Metadata sidecar only - the encoding vectors are never loaded
+        data = store.load_metadata()
+        vector_rows = store.count()
         
         print(f"📊 Total entries in database: {len(data)}")
+        print(f"📁 Store: {store.store_dir} ({vector_rows} vector rows)")
         print("\n📋 Database contents:")
         
         for i, entry in enumerate(data):
             print(f"\nEntry {i+1}:")
-            if isinstance(entry, dict):
-                print(f"   Name: {entry.get('name', 'MISSING')}")
-                print(f"   ID: {entry.get('id', 'MISSING')}")
-                print(f"   Timestamp: {entry.get('timestamp', 'MISSING')}")
-                print(f"   Has encoding: {'Yes' if 'encoding' in entry else 'NO'}")
-                if 'encoding' in entry:
-                    enc = entry['encoding']
-                    if isinstance(enc, np.ndarray):
-                        print(f"   Encoding shape: {enc.shape}")
-                    else:
-                        print(f"   Encoding type: {type(enc)}")
-            else:
-                print(f"   Invalid entry type: {type(entry)}")
+            print(f"   Name: {entry.get('name', 'MISSING')}")
+            print(f"   ID: {entry.get('id', 'MISSING')}")
+            print(f"   Timestamp: {entry.get('timestamp', 'MISSING')}")
+            print(f"   Has encoding: {'Yes' if entry.get('row', vector_rows) < vector_rows else 'NO'}")
         
     except Exception as e:
         print(f"❌ Error reading database: {e}")
@@ -6,15 +6,20 @@ Fixed Face Registration Module - Proper name handling
 import cv2
 import face_recognition
 import os
-import pandas as pd
 import uuid
+import threading
 from datetime import datetime
-import pickle
 import numpy as np
+from face_gallery import FaceGallery
+from face_store import open_store
+from face_config import load_config
+from user_registry import open_registry
 
 REGISTER_DIR = "registered_faces"
-EXCEL_FILE = "registered_users.xlsx"
-ENCODINGS_FILE = "face_encodings.pkl"
+EXCEL_FILE = "registered_users.xlsx"  # export of REGISTRY_FILE
+REGISTRY_FILE = "registered_users.db"
+ENCODINGS_FILE = "face_encodings.pkl"  # legacy format, migrated into STORE_DIR
+STORE_DIR = "face_store"
 
 # Create directories if they don't exist
 os.makedirs(REGISTER_DIR, exist_ok=True)
@@ -39,17 +44,15 @@ def register_user_fixed(name=None):
         print("❌ Name must be at least 2 characters long!")
         return False
     
-    # Check if name already exists
-    if os.path.exists(EXCEL_FILE):
-        try:
-            df = pd.read_excel(EXCEL_FILE)
-            if name.lower() in df['Name'].str.lower().values:
-                print(f"⚠️  Name '{name}' already exists!")
-                choice = input("Do you want to register anyway? (y/N): ").strip().lower()
-                if choice != 'y':
-                    return False
-        except Exception as e:
-            print(f"⚠️  Warning: Could not check existing names: {e}")
+    # Check if name already exists (indexed registry lookup)
+    try:
+        if get_registry().name_exists(name):
+            print(f"⚠️  Name '{name}' already exists!")
+            choice = input("Do you want to register anyway? (y/N): ").strip().lower()
+            if choice != 'y':
+                return False
+    except Exception as e:
+        print(f"⚠️  Warning: Could not check existing names: {e}")
     
     cap = cv2.VideoCapture(0)
     
@@ -133,24 +136,21 @@ def register_user_fixed(name=None):
                 encoding = face_encodings[0]
                 print("✅ Face encoded successfully!")
                 
-                # Check for duplicates
-                if os.path.exists(ENCODINGS_FILE):
+                # Check for duplicates against the memory-mapped store
+                store = open_store(STORE_DIR, ENCODINGS_FILE)
+                if store.count() > 0:
                     try:
-                        with open(ENCODINGS_FILE, "rb") as f:
-                            existing_data = pickle.load(f)
-                        
-                        existing_encodings = [entry["encoding"] for entry in existing_data if "encoding" in entry]
+                        existing_encodings, existing_data = store.load()
+                        gallery = FaceGallery.from_arrays(existing_encodings, [entry["name"] for entry in existing_data], existing_data)
+                        face_distances = gallery.face_distance(encoding)
                         
-                        if existing_encodings:
-                            matches = face_recognition.compare_faces(existing_encodings, encoding, tolerance=0.4)
-                            
-                            if True in matches:
-                                match_index = matches.index(True)
-                                existing_name = existing_data[match_index]["name"]
-                                print(f"⚠️  This face appears to be already registered as '{existing_name}'")
-                                choice = input("Continue with registration anyway? (y/N): ").strip().lower()
-                                if choice != 'y':
-                                    continue
+                        if len(face_distances) > 0 and np.min(face_distances) <= 0.4:
+                            match_index = int(np.argmin(face_distances))
+                            existing_name = gallery.names[match_index]
+                            print(f"⚠️  This face appears to be already registered as '{existing_name}'")
+                            choice = input("Continue with registration anyway? (y/N): ").strip().lower()
+                            if choice != 'y':
+                                continue
                     except Exception as e:
                         print(f"⚠️  Warning: Could not check existing faces: {e}")
                 
@@ -167,10 +167,10 @@ def register_user_fixed(name=None):
                     print("❌ Failed to save image!")
                     continue
                 
-                # Save to Excel with proper name association
-                success = save_to_excel(name, unique_id, image_path)
+                # Save to the registry with proper name association
+                success = save_to_registry(name, unique_id, image_path)
                 if not success:
-                    print("⚠️  Excel save failed, but continuing...")
+                    print("⚠️  Registry save failed, but continuing...")
                 
                 # Save face encoding with proper name association
                 success = save_face_encoding(name, encoding, image_path, unique_id)
@@ -201,57 +201,38 @@ def register_user_fixed(name=None):
     
     return face_captured
 
-def save_to_excel(name, unique_id, image_path):
-    """Save registration data to Excel with proper name association"""
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """The SQLite user registry, opened (and seeded/synced) once per process"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            config = load_config()
+            _registry = open_registry(
+                REGISTRY_FILE, EXCEL_FILE, open_store(STORE_DIR, ENCODINGS_FILE),
+                excel_export_every=config.getint("REGISTRY", "excel_export_every")
+            )
+        return _registry
+
+def save_to_registry(name, unique_id, image_path):
+    """Save registration data to the user registry with proper name association"""
     try:
-        log_data = {
-            "Name": name,
-            "ID": unique_id,
-            "Image": image_path,
-            "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "Status": "Active"
-        }
-        
-        if os.path.exists(EXCEL_FILE):
-            df = pd.read_excel(EXCEL_FILE)
-            df = pd.concat([df, pd.DataFrame([log_data])], ignore_index=True)
-        else:
-            df = pd.DataFrame([log_data])
-        
-        df.to_excel(EXCEL_FILE, index=False)
-        print("📊 Excel file updated successfully!")
+        get_registry().add_user(name, unique_id, image_path)
+        print("📇 User registry updated successfully!")
         return True
         
     except Exception as e:
-        print(f"⚠️  Excel update failed: {e}")
+        print(f"⚠️  Registry update failed: {e}")
         return False
 
 def save_face_encoding(name, encoding, image_path, unique_id):
     """Save face encoding with proper name association"""
     try:
-        # Load existing data
-        if os.path.exists(ENCODINGS_FILE):
-            with open(ENCODINGS_FILE, "rb") as f:
-                data = pickle.load(f)
-        else:
-            data = []
-        
-        # Create new entry with proper name association
-        encoding_data = {
-            "name": name,  # This is the key fix - ensure name is properly stored
-            "encoding": encoding,
-            "image_path": image_path,
-            "id": unique_id,
-            "timestamp": datetime.now().isoformat(),
-            "quality": "high"
-        }
-        
-        # Add to data
-        data.append(encoding_data)
-        
-        # Save with error checking
-        with open(ENCODINGS_FILE, "wb") as f:
-            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Append-only write: no load/rewrite of the existing gallery
+        store = open_store(STORE_DIR, ENCODINGS_FILE)
+        store.append(name, encoding, image_path, unique_id)
         
         print("🔐 Face encoding saved successfully with name association!")
         
@@ -267,14 +248,14 @@ def save_face_encoding(name, encoding, image_path, unique_id):
 def verify_save(name, unique_id):
     """Verify that the face data was saved correctly"""
     try:
-        with open(ENCODINGS_FILE, "rb") as f:
-            data = pickle.load(f)
+        store = open_store(STORE_DIR, ENCODINGS_FILE)
         
-        # Look for our entry
-        for entry in data:
+        # Only the tail of the sidecar needs checking - our entry was just appended
+        for entry in reversed(store.tail_metadata(count=16)):
             if entry.get("id") == unique_id and entry.get("name") == name:
-                print(f"✅ Verification successful: {name} data properly saved!")
-                return True
+                if entry.get("row", -1) < store.count():
+                    print(f"✅ Verification successful: {name} data properly saved!")
+                    return True
         
         print(f"⚠️  Verification warning: Could not find saved data for {name}")
         return False
@@ -285,13 +266,12 @@ def verify_save(name, unique_id):
 
 def list_registered_users():
     """List all registered users with proper name display"""
-    if not os.path.exists(ENCODINGS_FILE):
-        print("📝 No registered users found.")
-        return
-    
     try:
-        with open(ENCODINGS_FILE, "rb") as f:
-            data = pickle.load(f)
+        data = get_registry().list_users()
+        
+        if not data:
+            print("📝 No registered users found.")
+            return
         
         print(f"\n👥 Registered Users ({len(data)} total):")
         print("-" * 60)
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Gallery Verify Module - Re-encode every stored image and check it against the face store
+
+Each store row names the image it was encoded from. This job re-detects and
+re-encodes every such image on a process pool and reports:
+    drift       distance between the stored and the re-computed encoding
+    missing     rows whose image file no longer exists
+    unreadable  image files that cannot be decoded, or show no face
+    orphaned    images in registered_faces that no row refers to
+With --rebuild the re-computed encodings (optionally with other `num_jitters`
+or landmark `model` settings) are written to a new store next to the current
+one, together with a fresh [INDEX] cache built over the new encodings, and
+--swap puts both in place once every row has been processed.
+
+Progress lives in a work directory: results.jsonl and encodings.f32 get one
+entry per row, in row order, appended and fsynced every `batch_size` rows, so
+an interrupted run continues from the last complete batch.
+
+Usage:
+    python gallery_verify.py
+    python gallery_verify.py --num-jitters 20 --landmarks large --rebuild --swap
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from face_config import load_config
+from face_detection import detect_faces, load_policy
+from face_gallery import FaceGallery
+from face_index import BruteForceIndex, create_index
+from face_store import EncodingStore, open_store, ENCODING_DIM, VECTOR_DTYPE, ROW_BYTES
+
+STORE_DIR = "face_store"
+ENCODINGS_FILE = "face_encodings.pkl"  # legacy format, migrated into STORE_DIR
+REGISTER_DIR = "registered_faces"
+WORK_DIR = "gallery_verify"
+RESULTS_FILE = "results.jsonl"
+VECTORS_FILE = "encodings.f32"
+SETTINGS_FILE = "settings.json"
+STORE_FILE = "store.json"
+REPORT_FILE = "report.json"
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+LANDMARK_MODELS = ("small", "large")
+REPORT_WORST = 20  # most drifted rows listed in the report
+FINGERPRINT_CHUNK = 65536  # store rows hashed at a time
+
+# Per-process state set up by _init_worker()
+_worker = {}
+
+def resolve_image_path(image_path):
+    """Stored image path on this machine (records may carry Windows separators)"""
+    return os.path.normpath(image_path.replace("\\", "/")) if image_path else ""
+
+def _init_worker(model, max_side, upsample, num_jitters, landmarks):
+    """Import face_recognition once per worker"""
+    import face_recognition
+
+    _worker["face_recognition"] = face_recognition
+    _worker["model"] = model
+    _worker["max_side"] = max_side
+    _worker["upsample"] = upsample
+    _worker["num_jitters"] = num_jitters
+    _worker["landmarks"] = landmarks
+
+def _reencode(task):
+    """(row, status, encoding, drift, faces) for one (row, image_path, stored_encoding)"""
+    row, image_path, stored = task
+    path = resolve_image_path(image_path)
+    if not path:
+        return row, "no_image", None, None, 0
+    if not os.path.exists(path):
+        return row, "missing", None, None, 0
+
+    try:
+        frame = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except OSError:
+        frame = None
+    if frame is None:
+        return row, "unreadable", None, None, 0
+
+    face_recognition = _worker["face_recognition"]
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    locations = detect_faces(face_recognition, rgb_frame, _worker["max_side"], _worker["upsample"], _worker["model"])
+    if len(locations) == 0:
+        return row, "no_face", None, None, 0
+
+    encodings = np.asarray(face_recognition.face_encodings(
+        rgb_frame, locations, num_jitters=_worker["num_jitters"], model=_worker["landmarks"]
+    ), dtype=np.float32)
+    if len(encodings) == 0:
+        return row, "no_face", None, None, len(locations)
+
+    # Several faces in the picture: the registered one is the closest to the stored encoding
+    distances = np.linalg.norm(encodings - stored, axis=1)
+    best = int(distances.argmin())
+    return row, "ok", encodings[best], float(distances[best]), len(locations)
+
+class VerifyProgress:
+    """results.jsonl + encodings.f32 in a work directory, kept the same length"""
+
+    def __init__(self, work_dir=WORK_DIR):
+        self.work_dir = work_dir
+        self.results_path = os.path.join(work_dir, RESULTS_FILE)
+        self.vectors_path = os.path.join(work_dir, VECTORS_FILE)
+        self.settings_path = os.path.join(work_dir, SETTINGS_FILE)
+        self.store_path = os.path.join(work_dir, STORE_FILE)
+
+    def check_settings(self, settings):
+        """Remember the encoding settings; refuse to resume a run made with different ones"""
+        os.makedirs(self.work_dir, exist_ok=True)
+        if os.path.exists(self.settings_path):
+            with open(self.settings_path, encoding="utf-8") as f:
+                previous = json.load(f)
+            if previous != settings:
+                raise ValueError(f"{self.work_dir} holds a run with settings {previous}; "
+                                 f"use another --work-dir (or remove it) for {settings}")
+            return
+        with open(self.settings_path, "w", encoding="utf-8") as f:
+            json.dump(settings, f)
+
+    def check_store(self, vectors):
+        """Refuse to resume against another store; rows registered since the last run are fine"""
+        os.makedirs(self.work_dir, exist_ok=True)
+        if os.path.exists(self.store_path):
+            with open(self.store_path, encoding="utf-8") as f:
+                previous = json.load(f)
+            rows = previous["rows"]
+            if rows > len(vectors) or store_fingerprint(vectors[:rows]) != previous["fingerprint"]:
+                raise ValueError(f"{self.work_dir} holds a run over another face store (rebuilt or replaced); "
+                                 f"use another --work-dir (or remove it)")
+        with open(self.store_path, "w", encoding="utf-8") as f:
+            json.dump({"rows": len(vectors), "fingerprint": store_fingerprint(vectors)}, f)
+
+    def resume(self):
+        """Number of rows already done, after trimming a batch torn by a crash"""
+        lines = []
+        if os.path.exists(self.results_path):
+            with open(self.results_path, "rb") as f:
+                lines = f.read().split(b"\n")[:-1]  # a missing final newline means a torn line
+        vector_rows = os.path.getsize(self.vectors_path) // ROW_BYTES if os.path.exists(self.vectors_path) else 0
+        done = min(len(lines), vector_rows)
+
+        with open(self.results_path, "ab") as f:
+            f.truncate(sum(len(line) + 1 for line in lines[:done]))
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(done * ROW_BYTES)
+        return done
+
+    def append(self, vectors, results):
+        """Durably append one batch (vectors first, like the face store)"""
+        for path, data in ((self.vectors_path, np.asarray(vectors, dtype=VECTOR_DTYPE).tobytes()),
+                           (self.results_path, "".join(json.dumps(r) + "\n" for r in results).encode("utf-8"))):
+            with open(path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load_results(self):
+        with open(self.results_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def load_vectors(self, rows):
+        if rows == 0:
+            return np.empty((0, ENCODING_DIM), dtype=VECTOR_DTYPE)
+        return np.memmap(self.vectors_path, dtype=VECTOR_DTYPE, mode="r", shape=(rows, ENCODING_DIM))
+
+def store_fingerprint(vectors):
+    """Hash of the row count and every stored vector"""
+    digest = hashlib.sha1(str(len(vectors)).encode())
+    for start in range(0, len(vectors), FINGERPRINT_CHUNK):
+        digest.update(np.ascontiguousarray(vectors[start:start + FINGERPRINT_CHUNK], dtype=VECTOR_DTYPE).tobytes())
+    return digest.hexdigest()
+
+def find_orphans(metadata, register_dir=REGISTER_DIR):
+    """Image files in register_dir that no store row refers to"""
+    if not os.path.isdir(register_dir):
+        return []
+    referenced = {os.path.abspath(resolve_image_path(record.get("image_path"))) for record in metadata}
+    return sorted(
+        os.path.join(register_dir, filename) for filename in os.listdir(register_dir)
+        if filename.lower().endswith(IMAGE_EXTENSIONS)
+        and os.path.abspath(os.path.join(register_dir, filename)) not in referenced
+    )
+
+def build_report(results, metadata, drift_threshold, register_dir=REGISTER_DIR):
+    """Counts by status, drift statistics, the most drifted rows and orphaned images"""
+    statuses = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+
+    drifts = np.array([result["drift"] for result in results if result["drift"] is not None], dtype=np.float64)
+    worst = sorted((result for result in results if result["drift"] is not None),
+                   key=lambda result: result["drift"], reverse=True)[:REPORT_WORST]
+    problems = [result for result in results if result["status"] != "ok"]
+
+    def describe(result):
+        record = metadata[result["row"]]
+        return {"row": result["row"], "name": record.get("name"), "id": record.get("id"),
+                "image_path": record.get("image_path"), "status": result["status"], "drift": result["drift"]}
+
+    return {
+        "rows": len(results),
+        "statuses": statuses,
+        "drift": {
+            "mean": round(float(drifts.mean()), 4) if len(drifts) else None,
+            "p95": round(float(np.percentile(drifts, 95)), 4) if len(drifts) else None,
+            "max": round(float(drifts.max()), 4) if len(drifts) else None,
+            "threshold": drift_threshold,
+            "over_threshold": int((drifts > drift_threshold).sum())
+        },
+        "multiple_faces": sum(1 for result in results if result["faces"] > 1),
+        "most_drifted": [describe(result) for result in worst if result["drift"] > drift_threshold],
+        "problems": [describe(result) for result in problems],
+        "orphaned_images": find_orphans(metadata, register_dir)
+    }
+
+def verify(config=None, store_dir=STORE_DIR, work_dir=WORK_DIR, workers=0, num_jitters=None, landmarks=None):
+    """Re-encode every store row (resuming a previous run); returns (report, metadata, progress)"""
+    config = config or load_config()
+    num_jitters = num_jitters or config.getint("VERIFY", "num_jitters")
+    landmarks = landmarks or config.get("VERIFY", "landmarks").strip().lower()
+    if landmarks not in LANDMARK_MODELS:
+        raise ValueError(f"Unknown landmark model '{landmarks}', expected one of {LANDMARK_MODELS}")
+
+    store = open_store(store_dir, ENCODINGS_FILE)
+    vectors, metadata = store.load()
+    max_side, upsample = load_policy(config)
+    model = config.get("ENCODING", "model")
+
+    progress = VerifyProgress(work_dir)
+    progress.check_settings({"num_jitters": num_jitters, "landmarks": landmarks, "model": model,
+                             "max_side": max_side, "upsample": upsample})
+    # Rows are only comparable within one store: a rebuilt (swapped) store never matches
+    progress.check_store(vectors)
+    start_row = progress.resume()
+    if start_row:
+        print(f"⏩ Resuming at row {start_row} of {len(metadata)}")
+
+    workers = int(workers) or config.getint("VERIFY", "workers") or os.cpu_count() or 1
+    batch_size = max(1, config.getint("VERIFY", "batch_size"))
+    tasks = ((row, metadata[row].get("image_path"), np.asarray(vectors[row], dtype=np.float32))
+             for row in range(start_row, len(metadata)))
+
+    started = time.monotonic()
+    processed = 0
+    if start_row < len(metadata):
+        print(f"⚙️  Re-encoding {len(metadata) - start_row} images on {workers} worker(s) "
+              f"(num_jitters={num_jitters}, landmarks={landmarks})")
+        # spawn: workers start clean and load the dlib models once each
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(model, max_side, upsample, num_jitters, landmarks)) as pool:
+            batch_vectors, batch_results = [], []
+            for row, status, encoding, drift, faces in pool.imap(_reencode, tasks, chunksize=4):
+                # Rows that could not be re-encoded keep their stored encoding
+                batch_vectors.append(encoding if encoding is not None else vectors[row])
+                batch_results.append({"row": row, "status": status, "drift": drift, "faces": faces})
+                if len(batch_results) >= batch_size:
+                    progress.append(batch_vectors, batch_results)
+                    processed += len(batch_results)
+                    batch_vectors, batch_results = [], []
+                    rate = processed / (time.monotonic() - started)
+                    print(f"🔁 {start_row + processed}/{len(metadata)} rows ({rate:.1f} images/s)")
+            progress.append(batch_vectors, batch_results)
+            processed += len(batch_results)
+
+    seconds = time.monotonic() - started
+    report = build_report(progress.load_results(), metadata, config.getfloat("VERIFY", "drift_threshold"))
+    report.update(settings={"num_jitters": num_jitters, "landmarks": landmarks, "model": model},
+                  processed_this_run=processed, seconds=round(seconds, 1),
+                  images_per_second=round(processed / seconds, 1) if processed and seconds > 0 else 0.0)
+    with open(os.path.join(work_dir, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return report, metadata, progress
+
+def rebuild_store(metadata, progress, rebuilt_dir, chunk_size=8192):
+    """Write a new store from the re-computed encodings, with the same records in the same order"""
+    rows = len(progress.load_results())
+    if rows != len(metadata):
+        raise ValueError(f"Only {rows} of {len(metadata)} rows were re-encoded; finish the run first")
+    if os.path.exists(rebuilt_dir):
+        raise ValueError(f"{rebuilt_dir} already exists")
+
+    rebuilt = EncodingStore(rebuilt_dir)
+    vectors = progress.load_vectors(rows)
+    for start in range(0, rows, chunk_size):
+        records = [{key: value for key, value in record.items() if key != "row"}
+                   for record in metadata[start:start + chunk_size]]
+        rebuilt.append_many(np.asarray(vectors[start:start + chunk_size]), records)
+    return rebuilt
+
+def _relative_to(store_dir, path):
+    """path relative to store_dir, or None if it lies outside it"""
+    relative = os.path.relpath(os.path.abspath(path), os.path.abspath(store_dir))
+    outside = relative in (os.curdir, os.pardir) or relative.startswith(os.pardir + os.sep)
+    return None if outside else relative
+
+def rebuilt_index_path(store_dir, rebuilt_dir, index_file):
+    """Where the rebuilt store's index is written: an index_file inside store_dir gets the same
+    place in rebuilt_dir (and moves with it), any other one is staged next to itself"""
+    relative = _relative_to(store_dir, index_file)
+    if relative is not None:
+        return os.path.join(rebuilt_dir, relative)
+    root, extension = os.path.splitext(index_file)
+    return f"{root}.rebuilt{extension or '.npz'}"
+
+def rebuild_index(rebuilt, index_path, config):
+    """Build the configured [INDEX] over the rebuilt store; returns index_path, or None for brute force"""
+    index = create_index(config)
+    if index.kind == BruteForceIndex.kind:
+        return None
+
+    vectors, metadata = rebuilt.load()
+    gallery = FaceGallery.from_arrays(vectors, [entry["name"] for entry in metadata], metadata)
+    started = time.monotonic()
+    index.build(gallery)
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    index.save(index_path)
+    print(f"📇 Built {index.kind} index over {len(gallery)} faces in {time.monotonic() - started:.1f}s")
+    return index_path
+
+def swap_store(store_dir, rebuilt_dir, expected_rows, index_file=None, rebuilt_index=None, force=False):
+    """Move the rebuilt store (and its index) into place, keeping the old store as a backup
+
+    Refused while a backend or realtime recognizer holds the store (it would
+    keep serving the old, memory-mapped rows) unless `force` is set. The row
+    check and both renames run under the store's write lock, so a
+    registration either lands before the check (and fails it) or waits and
+    goes into the new store. The old index only fits the old encodings: one
+    inside store_dir leaves with the backup, one elsewhere is replaced by
+    `rebuilt_index` or removed.
+    """
+    store = EncodingStore(store_dir)
+    in_use = store.in_use()
+    if in_use and not force:
+        raise ValueError(f"{store_dir} is in use by a running backend or recognizer; stop it first "
+                         f"(or pass --force and restart it right after the swap)")
+    if in_use is None and not force:
+        raise ValueError(f"Cannot tell whether {store_dir} is in use on this platform; "
+                         f"stop the backend and recognizer, then pass --force")
+
+    with store._lock():
+        current = store.count()
+        if current != expected_rows:
+            raise ValueError(f"{store_dir} changed during the rebuild ({expected_rows} -> {current} rows); "
+                             f"run again to pick up the new rows")
+        backup_dir = f"{store_dir}.bak-{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        os.rename(store_dir, backup_dir)
+        os.rename(rebuilt_dir, store_dir)
+
+    if index_file and _relative_to(store_dir, index_file) is None:
+        if rebuilt_index is not None:
+            os.replace(rebuilt_index, index_file)
+        elif os.path.exists(index_file):
+            os.remove(index_file)
+    return backup_dir
+
+def print_report(report):
+    drift = report["drift"]
+    print(f"📊 Gallery verification - {report['rows']} rows, {report['images_per_second']} images/s this run")
+    print(f"   Status: {json.dumps(report['statuses'])}")
+    if drift["mean"] is not None:
+        print(f"   Drift: {drift['mean']} mean, {drift['p95']} p95, {drift['max']} max; "
+              f"{drift['over_threshold']} row(s) over {drift['threshold']}")
+    if report["multiple_faces"]:
+        print(f"   {report['multiple_faces']} image(s) show more than one face")
+    for problem in report["problems"][:REPORT_WORST]:
+        print(f"   ❌ Row {problem['row']} ({problem['name']}): {problem['status']} - {problem['image_path']}")
+    if report["orphaned_images"]:
+        print(f"   ⚠️  {len(report['orphaned_images'])} orphaned image(s), e.g. {report['orphaned_images'][0]}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-encode stored face images and check them against the face store")
+    parser.add_argument("--workers", type=int, default=0, help="encoding processes (default: [VERIFY] workers)")
+    parser.add_argument("--num-jitters", type=int, default=None, help="encoding re-samples (default: [VERIFY] num_jitters)")
+    parser.add_argument("--landmarks", choices=LANDMARK_MODELS, default=None, help="landmark model (default: [VERIFY] landmarks)")
+    parser.add_argument("--store", default=STORE_DIR, help="face store directory")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="progress/report directory used to resume")
+    parser.add_argument("--rebuild", action="store_true", help="write a store with the re-computed encodings")
+    parser.add_argument("--swap", action="store_true", help="put the rebuilt store in place (keeps a backup)")
+    parser.add_argument("--force", action="store_true", help="swap even while a backend/recognizer holds the store")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    try:
+        report, metadata, progress = verify(config, store_dir=args.store, work_dir=args.work_dir, workers=args.workers,
+                                            num_jitters=args.num_jitters, landmarks=args.landmarks)
+        print_report(report)
+
+        if args.rebuild or args.swap:
+            rebuilt_dir = f"{args.store}.rebuilt"
+            rebuilt = rebuild_store(metadata, progress, rebuilt_dir)
+            index_file = config.get("INDEX", "index_file")
+            rebuilt_index = rebuild_index(rebuilt, rebuilt_index_path(args.store, rebuilt_dir, index_file), config)
+            print(f"💾 Rebuilt store written to {rebuilt_dir}")
+            if args.swap:
+                backup_dir = swap_store(args.store, rebuilt_dir, len(metadata), index_file, rebuilt_index, args.force)
+                print(f"✅ {args.store} replaced (previous store kept in {backup_dir})")
+                if args.force:
+                    print("⚠️  Restart any running backend or recognizer now: it still serves the old store")
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -158,12 +158,181 @@ num_jitters = 10
 # Directory for storing registered face images
 register_dir = registered_faces
 
-# Excel file for user registration log
+# Excel export of the user registry
 excel_file = registered_users.xlsx
 
 # Pickle file for face encodings
 encodings_file = face_encodings.pkl
 
+[GALLERY]
+# Resident copy of the encodings used for searching: float32 (exact), float16 or int8.
+# float16/int8 cut gallery memory 2-4x; the best candidates are re-ranked exactly.
+precision = float32
+
+# float16/int8: candidates per query re-ranked against the exact float32 vectors
+rerank = 32
+
+[REGISTRY]
+# Users live in registered_users.db (SQLite). Rewrite registered_users.xlsx every N
+# registrations, or set 0 and export on demand: python user_registry.py --export-excel
+excel_export_every = 0
+
+# Backend registrations go through one writer thread that commits them in groups.
+# Pending registrations allowed before new ones are turned away with 503
+queue_size = 256
+
+# Most registrations committed together, and how long (ms) to wait for more
+max_batch = 64
+batch_window_ms = 20
+
+# /api/register returns a job id; this many workers detect and encode the faces,
+# at most job_queue_size jobs wait, and finished results are kept for job_ttl seconds
+job_workers = 2
+job_queue_size = 128
+job_ttl = 3600
+
+[BULK_ENROLL]
+# python bulk_enroll.py <directory> | --csv manifest.csv: encoding processes (0 = one per core),
+# images deduplicated and committed per batch, encoding re-samples, and how close a face may be
+# to a different registered person before it is refused
+workers = 0
+batch_size = 1024
+num_jitters = 10
+duplicate_tolerance = 0.4
+
+[VERIFY]
+# python gallery_verify.py re-encodes every stored image and reports drift, missing, unreadable
+# and orphaned images; --rebuild [--swap] writes a store with these num_jitters/landmarks settings
+workers = 0
+batch_size = 256
+num_jitters = 10
+landmarks = small
+drift_threshold = 0.15
+
+[ENCODING]
+# Backend face detection/encoding worker processes (0 = one per CPU core)
+workers = 0
+
+# Frames queued or running before /api/recognize answers 503 + Retry-After (0 = 4 per worker)
+max_pending = 0
+
+# Face detector: hog (CPU) or cnn (needs a CUDA build of dlib)
+model = hog
+
+[DETECTION]
+# Detect faces on a copy scaled down to this longest side (0 = full frame); boxes are
+# mapped back and faces are encoded from the full-resolution frame
+max_side = 640
+
+# The same for the CLI realtime loop (320 = the old half-scale of a 640x480 webcam frame)
+cli_max_side = 320
+
+# Extra HOG pyramid levels for small faces (number_of_times_to_upsample)
+upsample = 1
+
+[TRACKING]
+# CLI realtime recognition follows faces across frames and only re-encodes new faces,
+# unknown faces (every retry_frames) and known faces (every refresh_frames analysed frames)
+enabled = true
+iou_threshold = 0.3
+max_missed = 5
+refresh_frames = 30
+retry_frames = 5
+
+# Run detection every N analysed frames and move boxes with an OpenCV tracker in between
+# (cv_tracker = kcf or csrt needs opencv-contrib-python; mil works with opencv-python)
+detect_every = 1
+cv_tracker = none
+
+[PIPELINE]
+# CLI realtime recognition runs capture, analysis and display on separate threads, so the
+# window keeps the camera frame rate while analysis runs as fast as it can (or analysis_fps)
+enabled = true
+analysis_fps = 0
+
+[MOTION]
+# Skip face detection on frames that barely differ from the last analysed one and reuse its
+# result (CLI loop, and backend clients that send a session id)
+enabled = true
+
+# Frames are compared as blurred grayscale thumbnails this many pixels wide
+width = 64
+
+# A frame is analysed when more than min_changed of its thumbnail pixels changed by more
+# than pixel_threshold grey levels, or max_idle_seconds passed since the last analysis
+pixel_threshold = 25
+min_changed = 0.01
+max_idle_seconds = 5
+
+[SESSIONS]
+# Backend per-client recognition state: seconds an idle session is kept, and how many are kept
+ttl = 300
+max_sessions = 1000
+# Faces are first compared with the last recent_identities people this session recognized
+# (within recent_ttl seconds); a distance under early_accept skips the full gallery search
+recent_identities = 8
+recent_ttl = 60
+early_accept = 0.35
+
+[CACHE]
+# Backend reuses /api/recognize results for uploads it has seen in the last ttl seconds
+# (keyed by a hash of the bytes); results are dropped whenever the gallery changes
+enabled = true
+max_entries = 256
+ttl = 30
+
+# Also match re-encoded or near-identical frames by a perceptual hash of a tiny thumbnail;
+# only safe for a fixed kiosk view where a different person means a different image
+perceptual = false
+
+[STREAMING]
+# Browsers stream frames over one WebSocket (pip install flask-sock) or Server-Sent Events
+# connection; each stream only keeps its newest frame, so slow analysis never queues frames
+max_streams = 64
+max_fps = 0
+idle_timeout = 30
+
+[BATCH_RECOGNITION]
+# /api/recognize/batch decodes and detects `threads` images at once (0 = twice the encoding
+# workers) and matches the faces of every chunk_images images in one gallery query
+threads = 0
+chunk_images = 64
+max_image_mb = 32
+# Lower to 1 for faster bulk runs (interactive recognition uses 5)
+num_jitters = 5
+
+[BATCHING]
+# Match the faces of concurrent /api/recognize requests together in one gallery query
+enabled = true
+
+# Faces per batch, and the longest (ms) a request waits for others to join it
+max_batch_faces = 256
+max_wait_ms = 5
+
+[IDENTITIES]
+# row = recognition returns the nearest stored encoding; identity = the nearest person, combining
+# all encodings registered under the same name (re-enrolments no longer slow matching per person)
+match_by = row
+
+# How one person's encodings combine: min (closest one), mean, or centroid (fastest)
+aggregate = min
+
+# People compared per step of the centroid-pruned search
+probe = 32
+
+[INDEX]
+# Nearest-neighbour search backend: brute (exact) or ivf (approximate, for large galleries)
+backend = brute
+
+# IVF: number of k-means lists (0 = about 4 * sqrt(number of faces))
+nlist = 0
+
+# IVF: lists scanned per query (higher = better recall, slower)
+nprobe = 8
+
+# IVF: cached index file, rebuilt automatically when missing or stale
+index_file = face_store/index.npz
+
 [SERVER]
 # Flask server settings
 host = 0.0.0.0
@@ -81,20 +81,26 @@ def check_system_files():
     
     # Check data files
     data_files = {
-        'face_encodings.pkl': 'Face encodings database',
-        'registered_users.xlsx': 'User registration log',
+        'face_store/': 'Face encoding store',
+        'registered_users.db': 'User registry',
+        'registered_users.xlsx': 'User registration log (Excel export)',
         'registered_faces/': 'Face images directory'
     }
     
     print(Fore.CYAN + "\n📊 Data Files Status:")
     for filename, description in data_files.items():
         if os.path.exists(filename):
-            if filename.endswith('/'):
+            if filename == 'face_store/':
+                from face_store import EncodingStore
+                print(Fore.GREEN + f"   ✅ {filename} - {description} ({EncodingStore(filename).count()} faces)")
+            elif filename.endswith('/'):
                 # Directory
                 count = len([f for f in os.listdir(filename) if f.endswith(('.jpg', '.png', '.jpeg'))])
                 print(Fore.GREEN + f"   ✅ {filename} - {description} ({count} images)")
             else:
                 print(Fore.GREEN + f"   ✅ {filename} - {description}")
+        elif filename == 'face_store/' and os.path.exists('face_encodings.pkl'):
+            print(Fore.YELLOW + f"   ⚠️  {filename} - {description} (face_encodings.pkl is migrated on first use)")
         else:
             print(Fore.YELLOW + f"   ⚠️  {filename} - {description} (Not created yet)")
     
@@ -108,14 +114,12 @@ def get_system_stats():
     
     # Count registered faces
     registered_count = 0
-    if os.path.exists('face_encodings.pkl'):
-        try:
-            import pickle
-            with open('face_encodings.pkl', 'rb') as f:
-                data = pickle.load(f)
-            registered_count = len(data)
-        except:
-            registered_count = 0
+    try:
+        # Read-only: a legacy pickle is left for the recognizer/backend to migrate
+        from face_store import EncodingStore
+        registered_count = EncodingStore().count()
+    except:
+        registered_count = 0
     
     # Count image files
     image_count = 0
@@ -124,25 +128,26 @@ def get_system_stats():
                       if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
         image_count = len(image_files)
     
-    # Count Excel entries
-    excel_count = 0
-    if os.path.exists('registered_users.xlsx'):
+    # Count registry entries
+    registry_count = 0
+    if os.path.exists('registered_users.db'):
         try:
-            import pandas as pd
-            df = pd.read_excel('registered_users.xlsx')
-            excel_count = len(df)
+            from user_registry import UserRegistry
+            registry_count = UserRegistry('registered_users.db').count()
         except:
-            excel_count = 0
+            registry_count = 0
     
     print(Fore.GREEN + f"👤 Registered Faces: {registered_count}")
     print(Fore.BLUE + f"📸 Stored Images: {image_count}")
-    print(Fore.YELLOW + f"📊 Excel Entries: {excel_count}")
+    print(Fore.YELLOW + f"📇 Registry Entries: {registry_count}")
     
     # Check data consistency
-    if registered_count == image_count == excel_count:
+    if registered_count == image_count == registry_count:
         print(Fore.GREEN + "✅ Data consistency: GOOD")
     else:
         print(Fore.YELLOW + "⚠️  Data consistency: CHECK NEEDED")
+    # Counts only: gallery_verify.py checks every image against its stored encoding
+    print(Fore.CYAN + "💡 Run 'python gallery_verify.py' for a full image/encoding audit")
     
     print(Style.RESET_ALL)
 
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Micro Batcher Module - Coalesce work from concurrent requests into one call
+
+Each caller submits an item and gets a Future. A single batching thread
+takes the first waiting item, keeps collecting for at most `max_wait`
+seconds or until `max_batch` units (as counted by `size(item)`) are queued,
+calls `process(items)` once and hands each caller its own result.
+
+The backend uses it to match the faces of many concurrent /api/recognize
+requests with one gallery query instead of one small query per request.
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_WAIT = 0.005
+
+class MicroBatcher:
+    """process(items) -> list of results, one per item, in the same order"""
+
+    def __init__(self, process, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, size=len, name="micro-batcher"):
+        self.process = process
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait))
+        self.size = size
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._units = 0
+        self._largest = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit one item and wait for its result"""
+        return self.submit(item).result(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "mean_items": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "mean_units": round(self._units / self._batches, 2) if self._batches else 0.0,
+                "largest_batch": self._largest,
+                "queued": self._queue.qsize()
+            }
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            units = self.size(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while units < self.max_batch:
+                try:
+                    entry = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(entry)
+                units += self.size(entry[0])
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.process(items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._units += units
+                self._largest = max(self._largest, units)
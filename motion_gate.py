@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Motion Gate Module - Skip face detection on frames where nothing changed
+
+Each frame is reduced to a tiny blurred grayscale thumbnail (`width` pixels
+wide) and compared with the thumbnail of the last frame that was analysed.
+When fewer than `min_changed` of its pixels moved by more than
+`pixel_threshold` grey levels, the frame is reported as unchanged and the
+caller reuses its previous result. Comparing against the last analysed
+frame (not the previous one) means slow drift still adds up to a change,
+and a frame is always analysed again after `max_idle` seconds.
+"""
+
+import time
+import cv2
+import numpy as np
+
+DEFAULT_WIDTH = 64
+DEFAULT_PIXEL_THRESHOLD = 25
+DEFAULT_MIN_CHANGED = 0.01
+DEFAULT_MAX_IDLE = 5.0
+
+class MotionGate:
+    """changed(frame) -> True when the frame needs a full detection pass"""
+
+    def __init__(self, width=DEFAULT_WIDTH, pixel_threshold=DEFAULT_PIXEL_THRESHOLD,
+                 min_changed=DEFAULT_MIN_CHANGED, max_idle=DEFAULT_MAX_IDLE):
+        self.width = max(8, int(width))
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.max_idle = max_idle
+        self._reference = None
+        self._analysed_at = 0.0
+        self.checked = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """MotionGate from the [MOTION] section, or None when gating is disabled"""
+        if not config.getboolean("MOTION", "enabled"):
+            return None
+        return cls(
+            width=config.getint("MOTION", "width"),
+            pixel_threshold=config.getint("MOTION", "pixel_threshold"),
+            min_changed=config.getfloat("MOTION", "min_changed"),
+            max_idle=config.getfloat("MOTION", "max_idle_seconds")
+        )
+
+    def changed(self, frame):
+        """Compare with the last analysed frame; a changed frame becomes the new reference"""
+        thumbnail = self._thumbnail(frame)
+        now = time.monotonic()
+        self.checked += 1
+
+        reference = self._reference
+        if reference is None or reference.shape != thumbnail.shape or now - self._analysed_at >= self.max_idle:
+            changed = True
+        else:
+            moved = cv2.absdiff(thumbnail, reference) > self.pixel_threshold
+            changed = bool(np.count_nonzero(moved) >= self.min_changed * moved.size)
+
+        if changed:
+            self._reference = thumbnail
+            self._analysed_at = now
+        else:
+            self.skipped += 1
+        return changed
+
+    def reset(self):
+        """Force the next frame to be analysed (e.g. after a gallery reload or failed analysis)"""
+        self._reference = None
+
+    def stats(self):
+        return {
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.checked, 3) if self.checked else 0.0
+        }
+
+    def _thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height, width = gray.shape[:2]
+        size = (self.width, max(1, int(round(height * self.width / float(width)))))
+        small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        # Blur away sensor noise so it does not count as motion
+        return cv2.GaussianBlur(small, (5, 5), 0)
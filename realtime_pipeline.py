@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Realtime Pipeline Module - Capture, analysis and render as separate stages
+
+    capture thread   reads the camera as fast as it delivers and keeps only
+                     the latest frame
+    analysis thread  takes the newest frame whenever it is free and
+                     publishes (frame_no, result) when done
+    render loop      (caller's thread, for cv2.imshow) draws the latest
+                     frame with the latest analysis result
+
+Stages hand over through one-slot mailboxes: a newer item replaces an
+unconsumed one and counts as a drop, so a slow analysis stage never stalls
+capture or display. Each stage reports its counters via stats().
+"""
+
+import time
+import threading
+from collections import deque
+
+class LatestSlot:
+    """One-item mailbox that keeps only the newest item and counts overwrites"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._fresh = False
+        self.puts = 0
+        self.drops = 0
+
+    def put(self, item):
+        with self._condition:
+            if self._fresh:
+                self.drops += 1
+            self._item = item
+            self._fresh = True
+            self.puts += 1
+            self._condition.notify_all()
+
+    def take(self, timeout=None):
+        """Wait for an item not returned before; None on timeout"""
+        with self._condition:
+            if not self._fresh and not self._condition.wait_for(lambda: self._fresh, timeout):
+                return None
+            self._fresh = False
+            return self._item
+
+    def peek(self):
+        """Latest item, fresh or not (never blocks)"""
+        with self._condition:
+            return self._item
+
+    def depth(self):
+        with self._condition:
+            return 1 if self._fresh else 0
+
+class FrameGrabber:
+    """Capture stage: reads frames on its own thread, latest frame wins"""
+
+    def __init__(self, cap, transform=None):
+        self.cap = cap
+        self.transform = transform
+        self.frames = LatestSlot()
+        self.failed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+    def _run(self):
+        frame_no = 0
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                self.failed.set()
+                break
+            if self.transform is not None:
+                frame = self.transform(frame)
+            frame_no += 1
+            self.frames.put((frame_no, frame))
+
+    def stats(self):
+        return {"captured": self.frames.puts, "dropped": self.frames.drops, "depth": self.frames.depth()}
+
+class AnalysisWorker:
+    """Analysis stage: analyze(frame) runs on its own thread on the newest submitted frame"""
+
+    def __init__(self, analyze, max_fps=0):
+        self.analyze = analyze
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.inbox = LatestSlot()
+        self.results = LatestSlot()
+        self.analysed = 0
+        self.errors = 0
+        self._mean_seconds = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="analysis", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        """Stop after the current analysis; wait=False returns without joining the thread"""
+        self._stop.set()
+        if wait:
+            self._thread.join(timeout=5)
+
+    def submit(self, frame_no, frame):
+        self.inbox.put((frame_no, frame))
+
+    def latest(self):
+        """(frame_no, result) of the most recent finished analysis, or None"""
+        return self.results.peek()
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self.inbox.take(timeout=0.1)
+            if item is None:
+                continue
+
+            frame_no, frame = item
+            started = time.monotonic()
+            try:
+                self.results.put((frame_no, self.analyze(frame)))
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Analysis error: {e}")
+            seconds = time.monotonic() - started
+            self.analysed += 1
+            self._mean_seconds = seconds if self._mean_seconds is None else 0.9 * self._mean_seconds + 0.1 * seconds
+
+            # Optional rate cap, e.g. analyse at 5 Hz while display runs at camera rate
+            if seconds < self.min_interval:
+                self._stop.wait(self.min_interval - seconds)
+
+    def stats(self):
+        return {
+            "submitted": self.inbox.puts,
+            "analysed": self.analysed,
+            "dropped": self.inbox.drops,
+            "depth": self.inbox.depth(),
+            "errors": self.errors,
+            "mean_ms": round((self._mean_seconds or 0.0) * 1000.0, 1)
+        }
+
+class RateMeter:
+    """Frames per second over a sliding window"""
+
+    def __init__(self, window=1.0):
+        self.window = window
+        self._times = deque()
+
+    def tick(self):
+        now = time.monotonic()
+        self._times.append(now)
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+    def rate(self):
+        if len(self._times) < 2:
+            return 0.0
+        return (len(self._times) - 1) / max(self._times[-1] - self._times[0], 1e-6)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Recognition Sessions Module - Per-client state for polling recognition clients
+
+A browser (or any polling client) sends the same `session` id with every
+/api/recognize request. Its session keeps a motion gate and the last
+response, so a frame where nothing moved (and no face was registered in the
+meantime) is answered from that response without running face detection.
+It also remembers the people it recognized recently (at most
+`recent_identities`, each for `recent_ttl` seconds): new faces are compared
+with those few people first, and only faces none of them clearly matches
+are searched in the whole gallery.
+Sessions idle for `ttl` seconds are dropped, and at most `max_sessions` are
+kept (least recently used first out).
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from motion_gate import MotionGate
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_SESSIONS = 1000
+DEFAULT_RECENT_IDENTITIES = 8
+DEFAULT_RECENT_TTL = 60
+
+class RecognitionSession:
+    """Motion gate, last result and recently recognized people of one client"""
+
+    def __init__(self, session_id, gate=None, recent_size=DEFAULT_RECENT_IDENTITIES, recent_ttl=DEFAULT_RECENT_TTL):
+        self.session_id = session_id
+        self.gate = gate
+        self.last_result = None
+        self.last_version = None
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+        self.recent_size = recent_size
+        self.recent_ttl = recent_ttl
+        self._recent = OrderedDict()
+        self.identity_lookups = 0
+        self.identity_hits = 0
+
+    def reuse(self, frame, version=None):
+        """Last result when neither the frame nor the gallery changed since it was computed, else None"""
+        with self.lock:
+            if self.gate is None or self.last_result is None or self.last_version != version:
+                if self.gate is not None:
+                    # Analysed regardless, so it becomes the gate's reference frame
+                    self.gate.reset()
+                    self.gate.changed(frame)
+                return None
+            if self.gate.changed(frame):
+                return None
+            return self.last_result
+
+    def store(self, result, version=None):
+        with self.lock:
+            self.last_result = result
+            self.last_version = version
+
+    def invalidate(self):
+        """Forget the last result so the next frame is analysed (e.g. after a failed analysis)"""
+        with self.lock:
+            self.last_result = None
+
+    def recent_identities(self):
+        """Names recognized within recent_ttl seconds, most recent first"""
+        now = time.monotonic()
+        with self.lock:
+            while self._recent and now - next(iter(self._recent.values())) >= self.recent_ttl:
+                self._recent.popitem(last=False)
+            return list(reversed(self._recent))
+
+    def remember(self, names):
+        """Record recognized names as the most recently seen people"""
+        if self.recent_size <= 0:
+            return
+        now = time.monotonic()
+        with self.lock:
+            for name in names:
+                self._recent.pop(name, None)
+                self._recent[name] = now
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+
+    def count_lookups(self, lookups, hits):
+        """Faces matched via the recent identities (hits) out of those that tried them (lookups)"""
+        with self.lock:
+            self.identity_lookups += lookups
+            self.identity_hits += hits
+
+class RecognitionSessions:
+    """Bounded, expiring map of session id -> RecognitionSession"""
+
+    def __init__(self, gate_factory=None, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS,
+                 recent_identities=DEFAULT_RECENT_IDENTITIES, recent_ttl=DEFAULT_RECENT_TTL):
+        self.gate_factory = gate_factory
+        self.ttl = ttl
+        self.max_sessions = max(1, int(max_sessions))
+        self.recent_identities = max(0, int(recent_identities))
+        self.recent_ttl = recent_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        gate_factory = None
+        if config.getboolean("MOTION", "enabled"):
+            gate_factory = lambda: MotionGate.from_config(config)
+        return cls(
+            gate_factory,
+            ttl=config.getint("SESSIONS", "ttl"),
+            max_sessions=config.getint("SESSIONS", "max_sessions"),
+            recent_identities=config.getint("SESSIONS", "recent_identities"),
+            recent_ttl=config.getfloat("SESSIONS", "recent_ttl")
+        )
+
+    def get(self, session_id):
+        """Session for this id, created on first use"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                gate = self.gate_factory() if self.gate_factory is not None else None
+                session = RecognitionSession(session_id, gate, self.recent_identities, self.recent_ttl)
+            session.last_seen = now
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        gates = [session.gate.stats() for session in sessions if session.gate is not None]
+        checked = sum(gate["checked"] for gate in gates)
+        skipped = sum(gate["skipped"] for gate in gates)
+        lookups = sum(session.identity_lookups for session in sessions)
+        hits = sum(session.identity_hits for session in sessions)
+        return {
+            "active": len(sessions),
+            "frames_checked": checked,
+            "frames_skipped": skipped,
+            "skip_rate": round(skipped / checked, 3) if checked else 0.0,
+            "recent_identity_lookups": lookups,
+            "recent_identity_hits": hits,
+            "recent_identity_hit_rate": round(hits / lookups, 3) if lookups else 0.0
+        }
+
+    def _prune(self, now):
+        """Drop idle sessions (caller holds the lock; oldest are at the front)"""
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.ttl:
+                break
+            self._sessions.popitem(last=False)
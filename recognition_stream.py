@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Recognition Stream Module - Persistent per-client recognition streams
+
+A streaming client (WebSocket, or Server-Sent Events plus frame uploads)
+pushes JPEG frames whenever it likes. Its stream keeps only the newest frame
+not yet analysed (older ones are dropped and counted), analyses it on the
+stream's own worker thread and publishes the result for the connection to
+send back. A slow analysis therefore never builds a queue, and the client's
+recognition session (motion gate, last result) carries over between frames.
+"""
+
+import time
+import threading
+from realtime_pipeline import AnalysisWorker
+
+DEFAULT_MAX_STREAMS = 64
+DEFAULT_IDLE_TIMEOUT = 30
+
+class StreamLimitReached(Exception):
+    """Raised by open() when max_streams streams are already open"""
+
+class RecognitionStream:
+    """One client's stream: newest frame wins, results come out as they are ready"""
+
+    def __init__(self, stream_id, analyze, max_fps=0):
+        self.stream_id = stream_id
+        self.worker = AnalysisWorker(analyze, max_fps=max_fps)
+        self.frames = 0
+        self.closed = False
+        self.last_active = time.monotonic()
+
+    def start(self):
+        self.worker.start()
+        return self
+
+    def submit(self, data):
+        """Hand over an encoded frame; replaces any frame still waiting for analysis"""
+        self.frames += 1
+        self.last_active = time.monotonic()
+        self.worker.submit(self.frames, data)
+        return self.frames
+
+    def next_result(self, timeout=None):
+        """(frame_no, result) of an analysis not returned before, or None on timeout"""
+        return self.worker.results.take(timeout)
+
+    def idle_for(self):
+        return time.monotonic() - self.last_active
+
+    def close(self):
+        self.closed = True
+        # Never wait for an in-flight analysis; its result is simply not sent
+        self.worker.stop(wait=False)
+
+    def stats(self):
+        return self.worker.stats()
+
+class RecognitionStreams:
+    """Open streams by id; a client reconnecting with the same id replaces its old stream"""
+
+    def __init__(self, max_streams=DEFAULT_MAX_STREAMS, max_fps=0, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_streams = max(1, int(max_streams))
+        self.max_fps = max_fps
+        self.idle_timeout = idle_timeout
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_streams=config.getint("STREAMING", "max_streams"),
+            max_fps=config.getfloat("STREAMING", "max_fps"),
+            idle_timeout=config.getfloat("STREAMING", "idle_timeout")
+        )
+
+    def open(self, stream_id, analyze):
+        """Start a stream whose worker runs analyze(frame_bytes); raises StreamLimitReached"""
+        with self._lock:
+            previous = self._streams.pop(stream_id, None)
+            if len(self._streams) >= self.max_streams:
+                if previous is not None:
+                    self._streams[stream_id] = previous
+                raise StreamLimitReached(f"{len(self._streams)} recognition streams already open")
+            stream = RecognitionStream(stream_id, analyze, self.max_fps).start()
+            self._streams[stream_id] = stream
+            self._opened += 1
+
+        if previous is not None:
+            previous.close()
+        return stream
+
+    def get(self, stream_id):
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def close(self, stream):
+        """Close a stream and forget it, unless a reconnect already replaced it"""
+        with self._lock:
+            if self._streams.get(stream.stream_id) is stream:
+                del self._streams[stream.stream_id]
+        stream.close()
+
+    def stats(self):
+        with self._lock:
+            streams = list(self._streams.values())
+        per_stream = [stream.stats() for stream in streams]
+        return {
+            "open": len(streams),
+            "opened": self._opened,
+            "frames": sum(stats["submitted"] for stats in per_stream),
+            "analysed": sum(stats["analysed"] for stats in per_stream),
+            "dropped": sum(stats["dropped"] for stats in per_stream)
+        }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Registration Jobs Module - Background registration jobs with pollable status
+
+/api/register only validates the request and creates a job; a small pool of
+worker threads runs the expensive part (detection, jittered encoding,
+duplicate check, commit) and records progress on the job, which clients poll
+through /api/register/jobs/<id>. Finished jobs are kept for `ttl` seconds.
+"""
+
+import time
+import uuid
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 128
+DEFAULT_TTL = 3600
+
+# status -> progress percentage reported to clients
+JOB_STEPS = {
+    "queued": 0,
+    "decoding": 10,
+    "detecting": 25,  # detection and encoding run as one worker task
+    "checking": 75,
+    "saving": 85,
+    "done": 100,
+    "failed": 100,
+}
+
+class JobQueueFull(Exception):
+    """Raised by submit() when too many registrations are still pending"""
+
+class RegistrationJob:
+    """Progress and outcome of one registration"""
+
+    def __init__(self, name):
+        self.job_id = uuid.uuid4().hex
+        self.name = name
+        self.status = "queued"
+        self.message = "Waiting for a worker"
+        self.success = None
+        self.http_status = 202
+        self.result = {}
+        self.created = datetime.now().isoformat()
+        self.updated = self.created
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def update(self, status, message):
+        self.status = status
+        self.message = message
+        self.updated = datetime.now().isoformat()
+
+    def wait_for(self, pending, interval, message):
+        """Wait for a queued write however long it takes, showing `message` every `interval` seconds
+
+        The writer always finishes what it was given; a job that gave up first
+        would report failure for a registration committed a moment later.
+        """
+        while not pending.wait(interval):
+            self.update(self.status, message)
+
+    def finish(self, success, message, http_status=200, **result):
+        self.success = success
+        self.http_status = http_status
+        self.result = result
+        self.finished_at = time.monotonic()
+        self.update("done" if success else "failed", message)
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "status": self.status,
+            "progress": JOB_STEPS.get(self.status, 0),
+            "finished": self.finished,
+            "success": self.success,
+            "message": self.message,
+            "created": self.created,
+            "updated": self.updated,
+            **self.result
+        }
+
+class RegistrationJobs:
+    """Runs process(job, *args) for each submitted job on a bounded worker pool"""
+
+    def __init__(self, process, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING, ttl=DEFAULT_TTL):
+        self.process = process
+        self.max_pending = max(1, int(max_pending))
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="registration")
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, process):
+        return cls(
+            process,
+            workers=config.getint("REGISTRY", "job_workers"),
+            max_pending=config.getint("REGISTRY", "job_queue_size"),
+            ttl=config.getint("REGISTRY", "job_ttl")
+        )
+
+    def submit(self, name, *args):
+        """Create a job and queue it; raises JobQueueFull instead of queueing without bound"""
+        job = RegistrationJob(name)
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} registrations already pending")
+            self._pending += 1
+            self._jobs[job.job_id] = job
+
+        self._executor.submit(self._run, job, args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job, args):
+        try:
+            self.process(job, *args)
+            if not job.finished:
+                job.finish(False, "Registration ended without a result", 500)
+        except Exception as e:
+            print(f"❌ Registration job {job.job_id} failed: {e}")
+            job.finish(False, f"Registration failed: {str(e)}", 500)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _prune(self):
+        """Forget finished jobs older than the TTL (caller holds the lock)"""
+        cutoff = time.monotonic() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
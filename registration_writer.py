@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Registration Writer Module - Single writer thread with group commit
+
+Request threads only detect and encode faces, then hand the result to
+RegistrationWriter.submit(). One writer thread drains the bounded queue,
+coalescing registrations that arrive within `batch_window` seconds (up to
+`max_batch`) into one durable commit:
+
+    image files   written and fsynced
+    face store    one append_many() (one write + fsync per file)
+    gallery       one LiveGallery.extend() (one index update, one snapshot)
+    registry      one SQLite transaction
+
+and then wakes every waiting request. The cost of a registration is shared
+by its whole batch instead of growing with the size of the data files.
+"""
+
+import os
+import time
+import queue
+import threading
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_MAX_BATCH = 64
+DEFAULT_BATCH_WINDOW = 0.02
+DUPLICATE_TOLERANCE = 0.4
+
+class RegistrationQueueFull(Exception):
+    """Raised by submit() when the writer is too far behind to take more work"""
+
+class PendingRegistration:
+    """One queued registration; wait() until the writer has committed (or rejected) it"""
+
+    def __init__(self, name, encoding, image_path, unique_id, image_bytes=None):
+        self.name = name
+        self.encoding = np.asarray(encoding, dtype=np.float32).reshape(-1)
+        self.image_path = image_path
+        self.unique_id = unique_id
+        self.image_bytes = image_bytes
+        self.timestamp = datetime.now().isoformat()
+        self.submitted_at = time.monotonic()
+
+        self.success = None
+        self.message = None
+        self.record = None
+        self.duplicate_of = None
+        self.batch_size = 0
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until committed or rejected; returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def _finish(self, success, message, record=None, batch_size=0):
+        self.success = success
+        self.message = message
+        self.record = record
+        self.batch_size = batch_size
+        self.image_bytes = None
+        self._done.set()
+
+class RegistrationWriter:
+    """Owns every registration write: store, gallery, registry and image files"""
+
+    def __init__(self, store, registry, live, queue_size=DEFAULT_QUEUE_SIZE, max_batch=DEFAULT_MAX_BATCH,
+                 batch_window=DEFAULT_BATCH_WINDOW, duplicate_tolerance=DUPLICATE_TOLERANCE, reload=None):
+        self.store = store
+        self.registry = registry
+        self.live = live
+        self.max_batch = max(1, int(max_batch))
+        self.batch_window = max(0.0, float(batch_window))
+        self.duplicate_tolerance = duplicate_tolerance
+        # Rebuilds the live gallery from the store (called under the writer lock) when
+        # another process appended to the store or an in-memory update failed
+        self.reload = reload
+
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "registrations": 0, "rejected": 0, "largest_batch": 0}
+
+    @classmethod
+    def from_config(cls, config, store, registry, live, reload=None):
+        return cls(
+            store, registry, live,
+            queue_size=config.getint("REGISTRY", "queue_size"),
+            max_batch=config.getint("REGISTRY", "max_batch"),
+            batch_window=config.getfloat("REGISTRY", "batch_window_ms") / 1000.0,
+            reload=reload
+        )
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="registration-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Commit what is already queued, then stop the writer thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, name, encoding, image_path, unique_id, image_bytes=None):
+        """Queue one registration; raises RegistrationQueueFull instead of blocking"""
+        pending = PendingRegistration(name, encoding, image_path, unique_id, image_bytes)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            raise RegistrationQueueFull(f"{self._queue.qsize()} registrations already pending")
+        return pending
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["mean_batch"] = stats["registrations"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            # Group commit: take whatever else arrives within the window
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                self._commit(batch)
+            except Exception as e:
+                print(f"❌ Registration batch of {len(batch)} failed: {e}")
+                for pending in batch:
+                    if not pending.done:
+                        pending._finish(False, f"Failed to save face data: {e}")
+
+    def _reject_duplicates(self, batch):
+        """Drop faces already in the gallery or registered earlier in the same batch"""
+        snapshot = self.live.snapshot
+        encodings = np.stack([pending.encoding for pending in batch])
+
+        existing = [None] * len(batch)
+        if len(snapshot) > 0:
+            distances, rows = snapshot.index.search(snapshot.gallery, encodings, k=1)
+            for i, (row, distance) in enumerate(zip(rows[:, 0], distances[:, 0])):
+                if row >= 0 and distance < self.duplicate_tolerance:
+                    existing[i] = snapshot.gallery.names[row]
+
+        # Faces racing each other never saw one another in the gallery
+        within = np.linalg.norm(encodings[:, None, :] - encodings[None, :, :], axis=2)
+
+        accepted = []
+        for i, pending in enumerate(batch):
+            duplicate_of = existing[i]
+            if duplicate_of is None:
+                earlier = [j for j in accepted if within[i, j] < self.duplicate_tolerance]
+                duplicate_of = batch[earlier[0]].name if earlier else None
+            if duplicate_of is not None:
+                pending.duplicate_of = duplicate_of
+                pending._finish(False, f'Face already registered as "{duplicate_of}"', batch_size=len(batch))
+            else:
+                accepted.append(i)
+
+        return [batch[i] for i in accepted]
+
+    def _write_images(self, batch):
+        """Durably write the encoded images; a failed image only fails its own registration"""
+        written = []
+        for pending in batch:
+            if pending.image_bytes is None:
+                written.append(pending)
+                continue
+            try:
+                os.makedirs(os.path.dirname(pending.image_path) or ".", exist_ok=True)
+                with open(pending.image_path, "wb") as f:
+                    f.write(pending.image_bytes)
+                    f.flush()
+                    os.fsync(f.fileno())
+                written.append(pending)
+            except Exception as e:
+                pending._finish(False, f"Could not save image: {e}", batch_size=len(batch))
+        return written
+
+    def _commit(self, batch):
+        accepted = self._write_images(self._reject_duplicates(batch))
+        if not accepted:
+            self._count(batch, 0)
+            return
+
+        records = [self.store.make_record(pending.name, pending.image_path, pending.unique_id, pending.timestamp)
+                   for pending in accepted]
+        encodings = [pending.encoding for pending in accepted]
+
+        with self.live.write_lock:
+            try:
+                self.store.append_many(encodings, records)
+            except Exception:
+                # Nothing reached the store, so the images would be orphans
+                self._remove_images(accepted)
+                raise
+
+            # The faces are durable from here on: a gallery that fell behind is
+            # rebuilt from the store, never fixed by deleting committed images
+            try:
+                if records[0]["row"] != len(self.live.snapshot) and self.reload is not None:
+                    # Someone else wrote to the store: rebuild so rows line up again
+                    self.reload()
+                else:
+                    self.live.extend([pending.name for pending in accepted], encodings, records)
+            except Exception as e:
+                print(f"⚠️ Gallery update failed, rebuilding from the face store: {e}")
+                self._resync()
+
+        try:
+            self.registry.add_users(records)
+        except Exception as e:
+            # The store is the source of truth; open_registry() re-syncs missing rows
+            print(f"⚠️ Registry update warning: {e}")
+
+        for pending, record in zip(accepted, records):
+            pending._finish(True, f"Face registered successfully for {pending.name}", record, len(batch))
+
+        self._count(batch, len(accepted))
+        print(f"💾 Committed {len(accepted)} registration(s) in one batch of {len(batch)}")
+
+    def _remove_images(self, batch):
+        for pending in batch:
+            if pending.image_bytes is not None and os.path.exists(pending.image_path):
+                os.remove(pending.image_path)
+
+    def _resync(self):
+        """Rebuild the live gallery from the store after a failed in-memory update"""
+        if self.reload is None:
+            print("⚠️ No reload hook: the gallery catches up with the store on the next load")
+            return
+        try:
+            self.reload()
+        except Exception as e:
+            print(f"⚠️ Gallery rebuild failed, it catches up with the store on the next load: {e}")
+
+    def _count(self, batch, committed):
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["registrations"] += committed
+            self._stats["rejected"] += len(batch) - committed
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Result Cache Module - Reuse /api/recognize results for repeated frames
+
+Results are cached in an LRU map with a TTL under two kinds of keys:
+    content key     SHA-1 of the uploaded bytes, checked before the image
+                    is even decoded (a kiosk re-sending the same JPEG)
+    perceptual key  64-bit difference hash of a 9x8 grayscale thumbnail
+                    (optional), which also matches re-encoded or slightly
+                    noisy copies of the same view
+Every entry remembers the gallery version it was computed against and is
+ignored once a registration or reload published a newer gallery.
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_TTL = 30
+
+def content_key(data):
+    return "sha1:" + hashlib.sha1(data).hexdigest()
+
+def perceptual_key(frame):
+    """Difference hash: one bit per horizontally adjacent pixel pair of a 9x8 thumbnail"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return "dhash:" + bits.tobytes().hex()
+
+class ResultCache:
+    """LRU + TTL map of key -> result, invalidated by gallery version"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, perceptual=False):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.perceptual = perceptual
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """ResultCache from the [CACHE] section, or None when caching is disabled"""
+        if not config.getboolean("CACHE", "enabled"):
+            return None
+        return cls(
+            max_entries=config.getint("CACHE", "max_entries"),
+            ttl=config.getfloat("CACHE", "ttl"),
+            perceptual=config.getboolean("CACHE", "perceptual")
+        )
+
+    def get(self, key, version):
+        """Cached result for key if still fresh and computed on this gallery version, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            result, entry_version, expires = entry
+            if entry_version != version or expires < time.monotonic():
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, keys, result, version):
+        """Store one result under every given key (None keys are skipped)"""
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                self._entries[key] = (result, version, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
@@ -58,6 +58,7 @@ def main():
         ("GET", f"{API_URL}/status", "API status endpoint"),
         ("GET", f"{API_URL}/stats", "Statistics endpoint"),
         ("GET", f"{API_URL}/registered_users", "Registered users endpoint"),
+        ("GET", f"{API_URL}/users?limit=10", "Paginated users endpoint"),
     ]
     
     passed = 0
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Batch recognition test
+Run with: python test_batch_recognition.py (or pytest test_batch_recognition.py)
+
+Uses stand-in analyze/match callbacks (no detector needed). Results come out
+in input order with each image's own matches, even when analyses finish out
+of order; the faces of a chunk share one match() call; a failing image only
+fails its own line. Zip and tar archives are read from seekable and
+non-seekable streams, skipping non-images and flagging oversized entries.
+"""
+
+import io
+import sys
+import time
+import random
+import tarfile
+import zipfile
+
+from batch_recognition import BatchRecognizer, BatchStats, ImageTooLarge, iter_archive
+
+IMAGES = 50
+
+def analyze(data):
+    """Fake analysis: b"<faces>:<tag>" has <faces> faces; random delays reorder completion"""
+    time.sleep(random.uniform(0, 0.01))
+    if data == b"broken":
+        raise ValueError("cannot decode")
+    faces, tag = data.decode().split(":")
+    return [(0, 1, 1, 0)] * int(faces), [f"{tag}/{face}" for face in range(int(faces))]
+
+def test_results_in_input_order():
+    match_calls = []
+
+    def match(encodings):
+        match_calls.append(len(encodings))
+        return [(encoding, 0.9, 0.1) for encoding in encodings]
+
+    images = [(f"img_{i}.jpg", f"{i % 3}:img_{i}".encode()) for i in range(IMAGES)]
+    images[7] = ("img_7.jpg", b"broken")
+    images[11] = ("img_11.jpg", ImageTooLarge("too large"))
+
+    recognizer = BatchRecognizer(analyze, match, threads=4, chunk_images=8)
+    stats = BatchStats()
+    results = list(recognizer.run(images))
+    for _, _, _, matches, error in results:
+        stats.add(matches or [], error)
+
+    assert [index for index, *_ in results] == list(range(IMAGES))
+    for index, name, locations, matches, error in results:
+        assert name == f"img_{index}.jpg"
+        if index in (7, 11):
+            assert error is not None and locations is None and matches is None
+            continue
+        assert error is None
+        assert [encoding for encoding, _, _ in matches] == [f"img_{index}/{face}" for face in range(index % 3)]
+
+    # One gallery query per chunk of 8 images (7 chunks), never one per image
+    assert len(match_calls) == 7, match_calls
+    summary = stats.summary()
+    assert summary["images"] == IMAGES and summary["errors"] == 2
+
+def zip_bytes(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def tar_gz_bytes(entries):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in entries:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+class Upload:
+    """Non-seekable request body"""
+
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+ENTRIES = [("people/alice.jpg", b"a" * 10), ("people/.hidden.jpg", b"x"), ("notes.txt", b"text"),
+           ("__MACOSX/people/._bob.jpg", b"x"), ("people/bob.PNG", b"b" * 10), ("big.jpg", b"c" * 100)]
+
+def test_archives():
+    expected = [("people/alice.jpg", b"a" * 10), ("people/bob.PNG", b"b" * 10)]
+    for data in (zip_bytes(ENTRIES), tar_gz_bytes(ENTRIES)):
+        for stream in (io.BytesIO(data), Upload(data)):
+            entries = list(iter_archive(stream, max_image_bytes=50))
+            assert entries[:2] == expected, entries
+            assert entries[2][0] == "big.jpg" and isinstance(entries[2][1], ImageTooLarge)
+            assert len(entries) == 3
+
+    try:
+        list(iter_archive(io.BytesIO(b"not an archive at all" * 40)))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a non-archive body should be rejected")
+
+def main():
+    print("🚀 Batch Recognition Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_results_in_input_order, test_archives):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Batches come back in order, one gallery query per chunk")
+
+if __name__ == "__main__":
+    main()
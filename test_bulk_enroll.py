@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Bulk enrolment deduplication test
+Run with: python test_bulk_enroll.py (or pytest test_bulk_enroll.py)
+
+Feeds BulkEnroller.commit() already-encoded results (no detector needed) and
+checks that store, registry and checkpoint agree: a photo enrolled twice in
+one batch or across batches gives one row, and a face that looks like a
+different person is refused.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from bulk_enroll import BulkEnroller, Checkpoint, content_id, label_from_path, open_live_gallery
+from face_config import load_config
+from face_store import EncodingStore
+from user_registry import open_registry
+
+def face_encoding(face_no):
+    return np.random.default_rng(face_no).normal(0, 0.1, 128).astype(np.float32)
+
+def open_enroller(work_dir, batch_size=1024):
+    store = EncodingStore(os.path.join(work_dir, "face_store"))
+    registry = open_registry(os.path.join(work_dir, "users.db"), None, store)
+    checkpoint = Checkpoint(os.path.join(work_dir, "checkpoint.jsonl"))
+    enroller = BulkEnroller(store, registry, open_live_gallery(store, load_config()),
+                            batch_size=batch_size, checkpoint=checkpoint)
+    return enroller, store, registry
+
+def result(path, name, photo_no):
+    """(task, encoding, error) as a worker returns it, id taken from the photo's bytes"""
+    return (path, name, content_id(f"photo-{photo_no}".encode())), face_encoding(photo_no), None
+
+def test_same_photo_twice_in_one_batch():
+    with tempfile.TemporaryDirectory() as work_dir:
+        enroller, store, registry = open_enroller(work_dir)
+        enroller.commit([result("Carol/1.jpg", "Carol", 1), result("Carol/4.jpg", "Carol", 1)])
+
+        assert store.count() == 1
+        assert registry.count() == 1
+        assert enroller.counts == {"enrolled": 1, "already_enrolled": 1}
+        assert enroller.checkpoint.done == {"Carol/1.jpg", "Carol/4.jpg"}
+
+def test_same_photo_in_a_later_batch():
+    with tempfile.TemporaryDirectory() as work_dir:
+        enroller, store, _ = open_enroller(work_dir)
+        enroller.commit([result("a/Carol_1.jpg", "Carol", 1)])
+        enroller.commit([result("b/carol.jpg", "Carol", 1), result("b/dave.jpg", "Dave", 2)])
+
+        assert store.count() == 2
+        assert enroller.counts == {"enrolled": 2, "already_enrolled": 1}
+
+        # A fresh run over the same store sees the ids already enrolled
+        enroller, store, _ = open_enroller(work_dir)
+        enroller.commit([result("c/dave.jpg", "Dave", 2)])
+        assert store.count() == 2
+
+def test_conflict_with_a_different_person():
+    with tempfile.TemporaryDirectory() as work_dir:
+        enroller, store, _ = open_enroller(work_dir)
+        same_face = face_encoding(7)
+        enroller.commit([
+            (("erin.jpg", "Erin", "00000001"), same_face, None),
+            (("frank.jpg", "Frank", "00000002"), same_face + 0.001, None),
+            (("erin2.jpg", "Erin", "00000003"), same_face + 0.001, None),
+        ])
+
+        names = [record["name"] for record in store.load_metadata()]
+        assert names == ["Erin", "Erin"]
+        assert enroller.counts == {"enrolled": 2, "conflict": 1}
+
+def test_labels_from_flat_registered_faces():
+    assert label_from_path("faces/Jenny_a441b66f.jpg", "faces") == ("Jenny", "a441b66f")
+    assert label_from_path("faces/Shirsendu Das_e72f4009_20240101_101010.jpg", "faces") == ("Shirsendu Das", "e72f4009")
+    assert label_from_path("faces/bob.png", "faces") == ("bob", None)
+
+def test_labels_from_person_directories():
+    assert label_from_path("ds/Alice/2.jpg", "ds") == ("Alice", None)
+    # Camera/export names that look like <word>_<8 hex> belong to the directory's person
+    assert label_from_path("ds/Alice/IMG_20240101.jpg", "ds") == ("Alice", None)
+    assert label_from_path("ds/Bob/face_deadbeef.png", "ds") == ("Bob", None)
+    assert label_from_path("ds/team/Carol/Carol_a441b66f.jpg", "ds") == ("Carol", "a441b66f")
+
+def main():
+    print("🚀 Bulk Enrolment Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_same_photo_twice_in_one_batch, test_same_photo_in_a_later_batch,
+                 test_conflict_with_a_different_person, test_labels_from_flat_registered_faces,
+                 test_labels_from_person_directories):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Store, registry and checkpoint agree")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for gallery snapshots
+Run with: python test_concurrency.py (or pytest test_concurrency.py)
+
+Reader threads recognize known faces while writer threads register new ones
+and reload the whole gallery. Every snapshot a reader sees must be internally
+consistent: names, encodings and index agree, and each face is matched to the
+name it was registered under.
+"""
+
+import sys
+import time
+import threading
+
+import numpy as np
+
+from face_gallery import FaceGallery, LiveGallery
+from face_index import BruteForceIndex, IVFIndex, match_batch
+
+INITIAL_FACES = 2000
+READERS = 4
+WRITERS = 2
+DURATION = 3.0
+
+def face_encoding(face_no):
+    """Deterministic encoding for face number `face_no`"""
+    return np.random.default_rng(face_no).normal(0, 0.1, 128).astype(np.float32)
+
+def face_name(face_no):
+    return f"person_{face_no}"
+
+def build_gallery(face_count, index_factory):
+    gallery = FaceGallery()
+    for face_no in range(face_count):
+        gallery.append(face_name(face_no), face_encoding(face_no), {"id": str(face_no)})
+    index = index_factory()
+    index.build(gallery)
+    return gallery, index
+
+def run_stress(index_factory, duration=DURATION):
+    """Hammer one LiveGallery from reader and writer threads; return (reads, writes, errors)"""
+    live = LiveGallery(*build_gallery(INITIAL_FACES, index_factory))
+    next_face = [INITIAL_FACES]
+    stop = threading.Event()
+    errors = []
+    counters = {"reads": 0, "writes": 0, "reloads": 0}
+    counter_lock = threading.Lock()
+
+    def check(condition, message):
+        if not condition:
+            errors.append(message)
+
+    def reader(seed):
+        rng = np.random.default_rng(seed)
+        reads = 0
+        while not stop.is_set():
+            snapshot = live.snapshot
+            gallery = snapshot.gallery
+            count = len(gallery)
+
+            check(count >= INITIAL_FACES, f"empty or partial gallery ({count} faces)")
+            check(len(gallery.names) == count and len(gallery.encodings) == count
+                  and len(gallery.metadata) == count, "gallery arrays disagree on length")
+            check(snapshot.index.count == count, f"index covers {snapshot.index.count} of {count} faces")
+
+            rows = rng.integers(0, count, 8)
+            face_numbers = [int(gallery.ids[row]) for row in rows]
+            queries = np.stack([face_encoding(face_no) for face_no in face_numbers])
+            matched, distances, _ = match_batch(snapshot.index, gallery, queries)
+
+            for face_no, row, distance in zip(face_numbers, matched, distances):
+                check(row >= 0 and gallery.names[row] == face_name(face_no) and distance < 0.01,
+                      f"{face_name(face_no)} matched as {gallery.names[row] if row >= 0 else None}")
+            reads += 1
+
+        with counter_lock:
+            counters["reads"] += reads
+
+    def writer():
+        writes = 0
+        while not stop.is_set():
+            # Like save_face_data: number the face and append it under the writer lock
+            with live.write_lock:
+                face_no = next_face[0]
+                next_face[0] += 1
+                live.append(face_name(face_no), face_encoding(face_no), {"id": str(face_no)})
+            writes += 1
+
+        with counter_lock:
+            counters["writes"] += writes
+
+    def reloader():
+        while not stop.is_set():
+            time.sleep(0.2)
+
+            # Same as a store reload: everything registered so far, built off to the side
+            live.rebuild(lambda: build_gallery(next_face[0], index_factory))
+            counters["reloads"] += 1
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(READERS)]
+    threads += [threading.Thread(target=writer) for _ in range(WRITERS)]
+    threads.append(threading.Thread(target=reloader))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    final = live.snapshot
+    check(len(final) == next_face[0], f"final gallery has {len(final)} of {next_face[0]} faces")
+    return counters, errors
+
+def test_brute_force_snapshots():
+    counters, errors = run_stress(BruteForceIndex)
+    assert not errors, errors[:5]
+    assert counters["reads"] > 0 and counters["writes"] > 0
+
+def test_ivf_snapshots():
+    counters, errors = run_stress(lambda: IVFIndex(nlist=32, nprobe=4))
+    assert not errors, errors[:5]
+    assert counters["reads"] > 0 and counters["writes"] > 0
+
+def test_snapshot_is_read_only():
+    gallery, _ = build_gallery(3, BruteForceIndex)
+    view = gallery.snapshot()
+    gallery.append(face_name(3), face_encoding(3), {"id": "3"})
+
+    assert len(view) == 3 and len(view.names) == 3 and len(view.metadata) == 3
+    try:
+        view.append(face_name(4), face_encoding(4))
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("appending to a snapshot should fail")
+
+def test_clear_leaves_snapshots_alone():
+    gallery, _ = build_gallery(3, BruteForceIndex)
+    view = gallery.snapshot()
+    gallery.clear()
+    gallery.append(face_name(7), face_encoding(7), {"id": "7"})
+
+    assert len(gallery) == 1 and list(gallery.names) == [face_name(7)]
+    assert list(view.names) == [face_name(i) for i in range(3)]
+    assert list(view.ids) == ["0", "1", "2"]
+    assert np.array_equal(view.encodings[0], face_encoding(0))
+
+def main():
+    print("🚀 Gallery Snapshot Concurrency Test")
+    print("=" * 50)
+    print(f"👥 {INITIAL_FACES} initial faces, {READERS} readers, {WRITERS} writers, {DURATION:.0f}s per backend")
+
+    failed = 0
+    for description, index_factory in [("brute", BruteForceIndex),
+                                       ("ivf", lambda: IVFIndex(nlist=32, nprobe=4))]:
+        print(f"\n🧪 Testing: {description} index")
+        counters, errors = run_stress(index_factory)
+        print(f"   Recognitions: {counters['reads']}, registrations: {counters['writes']}, reloads: {counters['reloads']}")
+        if errors:
+            failed += 1
+            print(f"   ❌ FAILED ({len(errors)} inconsistencies, first: {errors[0]})")
+        else:
+            print("   ✅ PASSED")
+
+    print("\n" + "=" * 50)
+    if failed:
+        print(f"⚠️ {failed} backend(s) showed torn reads")
+        sys.exit(1)
+    print("🎉 No reader ever saw a torn or empty gallery")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Encoding pool slot accounting test
+Run with: python test_encoding_pool.py (or pytest test_encoding_pool.py)
+
+Runs plain functions on a real process pool in place of the dlib tasks. Every
+slot must come back exactly once: after a normal task, after a worker that
+died without calling back, and after a slow task whose caller gave up.
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+
+from encoding_pool import EncodingPool, PoolSaturated
+
+def die():
+    os._exit(1)
+
+def nap(seconds):
+    time.sleep(seconds)
+    return seconds
+
+def open_pool(max_pending, task_timeout):
+    pool = EncodingPool(workers=1, max_pending=max_pending, task_timeout=task_timeout)
+    pool.workers = 1
+    pool._pool = multiprocessing.get_context("spawn").Pool(1)
+    return pool
+
+def test_saturated_pool_sheds_load():
+    pool = open_pool(max_pending=1, task_timeout=10)
+    try:
+        assert pool._call(nap, (0.0,), False, None) == 0.0
+        assert pool._slots.acquire(blocking=False)
+        try:
+            pool._call(nap, (0.0,), False, None)
+        except PoolSaturated as e:
+            assert e.retry_after >= 1
+        else:
+            raise AssertionError("a full pool should refuse without waiting")
+        pool._slots.release()
+        assert pool.stats()["rejected"] == 1 and pool.stats()["in_flight"] == 0
+    finally:
+        pool.close()
+
+def test_dead_worker_returns_its_slot():
+    pool = open_pool(max_pending=2, task_timeout=1.0)
+    try:
+        for _ in range(3):
+            try:
+                pool._call(die, (), False, None)
+            except multiprocessing.TimeoutError:
+                pass
+            else:
+                raise AssertionError("a dead worker never answers")
+        # Three deaths with two slots: still accepting work, nothing in flight
+        assert pool._call(nap, (0.0,), False, None) == 0.0
+        stats = pool.stats()
+        assert stats["in_flight"] == 0 and stats["timed_out"] == 3 and stats["completed"] == 1
+    finally:
+        pool.close()
+
+def test_late_callback_does_not_release_twice():
+    pool = open_pool(max_pending=1, task_timeout=0.3)
+    try:
+        try:
+            pool._call(nap, (1.0,), False, None)
+        except multiprocessing.TimeoutError:
+            pass
+        time.sleep(1.5)  # the worker finishes and its callback fires after the caller gave up
+
+        stats = pool.stats()
+        assert stats["in_flight"] == 0 and stats["timed_out"] == 1 and stats["completed"] == 0
+        assert pool._call(nap, (0.0,), False, None) == 0.0
+        # BoundedSemaphore: one slot, so a double release would have raised or left two
+        assert pool._slots.acquire(blocking=False) and not pool._slots.acquire(blocking=False)
+        pool._slots.release()
+    finally:
+        pool.close()
+
+def main():
+    print("🚀 Encoding Pool Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_saturated_pool_sheds_load, test_dead_worker_returns_its_slot,
+                 test_late_callback_does_not_release_twice):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Every slot came back exactly once")
+
+if __name__ == "__main__":
+    main()
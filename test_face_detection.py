@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Detection-resolution policy test
+Run with: python test_face_detection.py (or pytest test_face_detection.py)
+
+The CLI realtime loop used to detect on a half-scale copy of each webcam
+frame; its default policy must not detect on more pixels than that. Boxes
+found on the small copy must map back onto the full frame.
+"""
+
+import sys
+
+import numpy as np
+
+from face_config import load_config
+from face_detection import detect_faces, detection_scale, load_policy
+
+class RecordingDetector:
+    """Stands in for the face_recognition module: remembers the frame it was given"""
+    def __init__(self, locations):
+        self.locations = locations
+        self.shape = None
+
+    def face_locations(self, frame, number_of_times_to_upsample=1, model="hog"):
+        self.shape = frame.shape
+        return self.locations
+
+def test_cli_default_matches_old_half_scale():
+    max_side, upsample = load_policy(load_config("does-not-exist.ini"), cli=True)
+    assert detection_scale((480, 640), max_side) == 0.5
+    assert upsample == 1
+
+    detector = RecordingDetector([(50, 100, 100, 50)])
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    boxes = detect_faces(detector, frame, max_side, upsample)
+    assert detector.shape[:2] == (240, 320)
+    assert boxes == [(100, 200, 200, 100)]
+
+def test_backend_default_keeps_its_own_side():
+    max_side, _ = load_policy(load_config("does-not-exist.ini"))
+    assert max_side == 640
+    assert detection_scale((480, 640), max_side) == 1.0
+    assert detection_scale((1080, 1920), 0) == 1.0
+
+def test_boxes_are_clipped_to_the_frame():
+    detector = RecordingDetector([(0, 320, 240, 0)])
+    frame = np.zeros((481, 641, 3), dtype=np.uint8)
+    top, right, bottom, left = detect_faces(detector, frame, 320)[0]
+    assert (top, left) == (0, 0)
+    assert right <= 641 and bottom <= 481
+
+def main():
+    print("🚀 Detection Policy Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_cli_default_matches_old_half_scale, test_backend_default_keeps_its_own_side,
+                 test_boxes_are_clipped_to_the_frame):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Detection stays within the old CLI budget")
+
+if __name__ == "__main__":
+    main()
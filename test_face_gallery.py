@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Quantized gallery test
+Run with: python test_face_gallery.py (or pytest test_face_gallery.py)
+
+A quantized gallery over the memory-mapped face store re-maps the exact rows
+once per appended batch. An int8 gallery keeps its coarse distances close to
+the exact ones even for faces outside the range it was loaded with.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from face_gallery import FaceGallery, LiveGallery
+from face_store import EncodingStore
+
+def face_encoding(face_no):
+    return np.random.default_rng(face_no).normal(0, 0.1, 128).astype(np.float32)
+
+def store_gallery(store_dir, rows, precision):
+    """Gallery over a fresh store, counting how often it re-maps the exact rows"""
+    store = EncodingStore(store_dir)
+    store.append_many([face_encoding(i) for i in range(rows)],
+                      [store.make_record(f"person_{i}", f"person_{i}.jpg", f"{i:08x}") for i in range(rows)])
+    remaps = []
+
+    def exact_source(count):
+        remaps.append(count)
+        return store.load_vectors()
+
+    vectors, metadata = store.load()
+    gallery = FaceGallery.from_arrays(vectors, [m["name"] for m in metadata], metadata,
+                                      precision=precision, exact_source=exact_source)
+    return store, gallery, remaps
+
+def test_extend_remaps_once():
+    with tempfile.TemporaryDirectory() as work_dir:
+        store, gallery, remaps = store_gallery(os.path.join(work_dir, "face_store"), 50, "float16")
+        live = LiveGallery(gallery)
+
+        encodings = [face_encoding(100 + i) for i in range(20)]
+        records = [store.make_record(f"late_{i}", f"late_{i}.jpg", f"{100 + i:08x}") for i in range(20)]
+        store.append_many(encodings, records)
+        rows = live.extend([record["name"] for record in records], encodings, records)
+
+        assert rows == list(range(50, 70))
+        assert remaps == [70], remaps
+        snapshot = live.snapshot.gallery
+        assert len(snapshot) == 70 and snapshot.names[-1] == "late_19"
+        assert np.allclose(snapshot.exact_distances(encodings[-1])[0][-1], 0.0, atol=1e-3)
+
+def test_int8_rescales_for_larger_faces():
+    with tempfile.TemporaryDirectory() as work_dir:
+        store, gallery, _ = store_gallery(os.path.join(work_dir, "face_store"), 100, "int8")
+        live = LiveGallery(gallery)
+        before = live.snapshot.gallery
+
+        # Well past the load-time peak in every dimension
+        outlier = face_encoding(500) * 4.0
+        record = store.make_record("outlier", "outlier.jpg", "000001f4")
+        store.append_many([outlier], [record])
+        live.append("outlier", outlier, record)
+
+        after = live.snapshot.gallery
+        coarse, exact = after.coarse_distances(outlier)[0], after.exact_distances(outlier)[0]
+        assert np.abs(coarse - exact).max() < 0.05, np.abs(coarse - exact).max()
+        assert after.face_distance(outlier).argmin() == 100
+        # The earlier snapshot still scans its own codes with its own scale
+        probe = face_encoding(7)
+        assert np.abs(before.coarse_distances(probe)[0] - before.exact_distances(probe)[0]).max() < 0.05
+
+def main():
+    print("🚀 Quantized Gallery Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_extend_remaps_once, test_int8_rescales_for_larger_faces):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Quantized galleries keep up with the store")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Nearest-neighbour index agreement test
+Run with: python test_face_index.py (or pytest test_face_index.py)
+
+IVF probing every list must give exactly the brute-force answer, and IVF
+with few probes must still find registered faces, for whole query blocks.
+Identity search must agree with a brute-force per-person minimum/mean, also
+after people are re-enrolled, and re-enrolling must leave older snapshots as
+they were.
+"""
+
+import sys
+import threading
+
+import numpy as np
+
+from face_gallery import FaceGallery
+from face_index import (BruteForceIndex, IVFIndex, IdentityIndex, match_batch, match_top_k,
+                        match_candidates, search_identities)
+
+FACES = 3000
+
+def build_gallery(face_count=FACES, people=None, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(0, 0.1, (face_count, 128)).astype(np.float32)
+    names = [f"person_{i % people if people else i}" for i in range(face_count)]
+    return FaceGallery.from_arrays(vectors, names, [{"id": str(i)} for i in range(face_count)])
+
+def noisy_queries(gallery, count, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(gallery), count)
+    return rows, gallery.encodings[rows] + rng.normal(0, 0.005, (count, 128)).astype(np.float32)
+
+def build(index, gallery):
+    index.build(gallery)
+    return index
+
+def test_ivf_probing_everything_is_exact():
+    gallery = build_gallery()
+    _, queries = noisy_queries(gallery, 200)
+    brute = build(BruteForceIndex(), gallery)
+    ivf = build(IVFIndex(nlist=16, nprobe=16), gallery)
+
+    brute_rows, brute_distances, _ = match_top_k(brute, gallery, queries, k=5)
+    ivf_rows, ivf_distances, _ = match_top_k(ivf, gallery, queries, k=5)
+    assert np.array_equal(brute_rows, ivf_rows)
+    assert np.allclose(brute_distances, ivf_distances, atol=1e-5)
+
+def test_ivf_match_batch_finds_registered_faces():
+    gallery = build_gallery()
+    rows, queries = noisy_queries(gallery, 256)
+    brute_rows, _, _ = match_batch(build(BruteForceIndex(), gallery), gallery, queries)
+    ivf_rows, ivf_distances, _ = match_batch(build(IVFIndex(nlist=55, nprobe=8), gallery), gallery, queries)
+
+    assert np.array_equal(brute_rows, rows)
+    assert (ivf_rows == rows).mean() >= 0.95
+    assert np.all(np.diff(match_top_k(build(IVFIndex(nlist=55, nprobe=8), gallery), gallery, queries, 4)[1], axis=1) >= 0)
+
+def test_ivf_pads_short_results():
+    gallery = build_gallery(face_count=40)
+    ivf = build(IVFIndex(nlist=8, nprobe=1), gallery)
+    rows, distances, confidences = match_top_k(ivf, gallery, gallery.encodings[:3], k=40)
+    assert (rows[:, 0] == np.arange(3)).all()
+    assert (rows == -1).any()
+    assert np.all(distances[rows == -1] == 1.0) and np.all(confidences[rows == -1] == 0.0)
+
+def enrol_in_batches(gallery, batch_size):
+    """The same gallery appended batch by batch, with the identity index following along"""
+    grown = FaceGallery()
+    identities = IdentityIndex()
+    for start in range(0, len(gallery), batch_size):
+        rows = [grown.append(name, encoding, entry) for name, encoding, entry in
+                zip(gallery.names[start:start + batch_size], gallery.encodings[start:start + batch_size],
+                    gallery.metadata[start:start + batch_size])]
+        identities.add(grown, rows)
+    return grown, identities
+
+def assert_identities_match_brute_force(gallery, identities, queries):
+    distances = gallery.exact_distances(queries)
+    names = np.array(gallery.names)
+    for aggregate in ("min", "mean", "centroid"):
+        ranked = search_identities(identities, gallery, queries, k=3, aggregate=aggregate, probe=4)
+        for q, best in enumerate(ranked):
+            found = [identities.names[i] for i, _, _ in best]
+            assert len(set(found)) == 3, f"{aggregate}: a person was returned twice"
+            if aggregate == "centroid":
+                continue
+            per_person = {}
+            for name in set(gallery.names):
+                person = distances[q, names == name]
+                per_person[name] = person.min() if aggregate == "min" else person.mean()
+            assert found == sorted(per_person, key=per_person.get)[:3], aggregate
+
+def test_identity_search_matches_brute_force():
+    gallery = build_gallery(face_count=1200, people=300)
+    identities = IdentityIndex()
+    identities.build(gallery)
+    _, queries = noisy_queries(gallery, 50)
+    assert_identities_match_brute_force(gallery, identities, queries)
+
+    # Restricted to a few candidates, the nearest of them is still found
+    candidates = [identities.find(name) for name in ("person_0", "person_1", "person_2")]
+    rows, _, _ = match_candidates(identities, gallery, gallery.encodings[[0, 301, 2]], candidates)
+    assert list(rows) == [0, 301, 2]
+
+def test_identity_search_after_re_enrolment():
+    # Every batch re-enrols people already known, enough times to force a compaction
+    gallery, identities = enrol_in_batches(build_gallery(face_count=3000, people=150), batch_size=20)
+    _, queries = noisy_queries(gallery, 50)
+
+    assert len(identities) == 150
+    assert identities.live.sum() == 150
+    assert identities.slots <= 2 * 150 + 1024 + 20
+    assert_identities_match_brute_force(gallery, identities, queries)
+    assert all(identities.names[identities.find(f"person_{i}")] == f"person_{i}" for i in range(150))
+
+def test_re_enrolment_leaves_snapshots_alone():
+    gallery = FaceGallery()
+    identities = IdentityIndex()
+    identities.add(gallery, [gallery.append(f"person_{i}", encoding, {"id": str(i)})
+                             for i, encoding in enumerate(build_gallery(face_count=40).encodings)])
+    identities.add(gallery, [gallery.append("person_41", build_gallery(face_count=1, seed=9).encodings[0], {})])
+
+    before = identities.snapshot()
+    old_slot = before.find("person_3")
+    old_centroid = before.centroids[old_slot].copy()
+    identities.add(gallery, [gallery.append("person_3", gallery.encodings[5], {"id": "extra"})])
+
+    # The snapshot still sees the old entry, and the arrays were not copied to keep it so
+    assert before.find("person_3") == old_slot
+    assert len(before.members[old_slot]) == 1 and len(before) == 41
+    assert np.array_equal(before.centroids[old_slot], old_centroid)
+    assert np.shares_memory(before.centroids, identities.centroids)
+
+    new_slot = identities.find("person_3")
+    assert new_slot != old_slot and len(identities.members[new_slot]) == 2
+    assert len(identities) == 41 and not identities.live[old_slot]
+
+def test_snapshot_find_after_growth():
+    # Growth replaces the backing arrays; an older snapshot must still resolve names
+    gallery = FaceGallery()
+    identities = IdentityIndex()
+    identities.add(gallery, [gallery.append(f"p{i}", face, {}) for i, face in
+                             enumerate(build_gallery(face_count=16).encodings)])
+    old = identities.snapshot()
+    identities.add(gallery, [gallery.append(f"p{i}", face, {}) for i, face in
+                             zip(range(16, 20), build_gallery(face_count=4, seed=5).encodings)])
+    identities.add(gallery, [gallery.append(f"p{i}", gallery.encodings[i], {}) for i in range(18)])
+
+    assert old.find("p0") == 0 and old.find("p17") is None
+    assert old.live[old.find("p5")]
+    assert identities.names[identities.find("p0")] == "p0" and identities.find("p0") >= 20
+
+def test_snapshots_under_concurrent_add():
+    gallery = FaceGallery()
+    identities = IdentityIndex()
+    identities.add(gallery, [gallery.append(f"person_{i % 50}", face, {}) for i, face in
+                             enumerate(build_gallery(face_count=100).encodings)])
+    published = [identities.snapshot()]
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        rng = np.random.default_rng()
+        while not stop.is_set():
+            snapshot = published[-1]
+            try:
+                for name in (f"person_{i}" for i in rng.integers(0, 80, 8)):
+                    identity = snapshot.find(name)
+                    if identity is not None:
+                        assert identity < snapshot.slots and snapshot.live[identity]
+                        assert snapshot.names[identity] == name
+                        assert (snapshot.members[identity] < snapshot.count).all()
+            except Exception as e:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    extra = build_gallery(face_count=600, seed=7).encodings
+    for start in range(0, len(extra), 6):
+        identities.add(gallery, [gallery.append(f"person_{(start + i) % 80}", face, {})
+                                 for i, face in enumerate(extra[start:start + 6])])
+        published.append(identities.snapshot())
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors[:3]
+    assert len(identities) == 80
+
+def main():
+    print("🚀 Face Index Agreement Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_ivf_probing_everything_is_exact, test_ivf_match_batch_finds_registered_faces,
+                 test_ivf_pads_short_results, test_identity_search_matches_brute_force,
+                 test_identity_search_after_re_enrolment, test_re_enrolment_leaves_snapshots_alone,
+                 test_snapshot_find_after_growth, test_snapshots_under_concurrent_add):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Indexes agree with brute force")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Face store crash-recovery and migration test
+Run with: python test_face_store.py (or pytest test_face_store.py)
+
+A writer that dies between the vector and metadata writes leaves a torn
+tail: unpaired vector rows and/or a partial metadata line. Readers must
+ignore it and the next append must drop it, so rows stay paired. Migrating a
+legacy pickle must keep (or recover) registration times instead of stamping
+the migration time.
+"""
+
+import os
+import sys
+import json
+import pickle
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from face_store import EncodingStore, ROW_BYTES, open_store
+
+def face_encoding(face_no):
+    return np.random.default_rng(face_no).normal(0, 0.1, 128).astype(np.float32)
+
+def fill(store, count):
+    for face_no in range(count):
+        store.append(f"person_{face_no}", face_encoding(face_no), f"person_{face_no}.jpg", f"{face_no:08x}")
+
+def test_torn_tail_is_dropped():
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = EncodingStore(os.path.join(work_dir, "face_store"))
+        fill(store, 3)
+
+        # Crash mid-append: one vector written, its metadata line only half
+        with open(store.vectors_path, "ab") as f:
+            f.write(face_encoding(99).tobytes())
+        with open(store.metadata_path, "a", encoding="utf-8") as f:
+            f.write('{"name": "torn", "ro')
+
+        vectors, metadata = store.load()
+        assert len(vectors) == len(metadata) == 3
+        assert store.count() == 4
+
+        store.append("person_3", face_encoding(3), "person_3.jpg", "00000003")
+        vectors, metadata = store.load()
+        assert store.count() == 4 and os.path.getsize(store.vectors_path) == 4 * ROW_BYTES
+        assert [record["row"] for record in metadata] == [0, 1, 2, 3]
+        assert metadata[3]["name"] == "person_3"
+        assert np.array_equal(vectors[3], face_encoding(3))
+        with open(store.metadata_path, encoding="utf-8") as f:
+            assert all(json.loads(line)["name"] != "torn" for line in f)
+
+def test_unpaired_vectors_are_dropped():
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = EncodingStore(os.path.join(work_dir, "face_store"))
+        fill(store, 2)
+        # Crash after the vector write, before any metadata
+        with open(store.vectors_path, "ab") as f:
+            f.write(face_encoding(98).tobytes() + face_encoding(99).tobytes()[:100])
+
+        assert len(store.load()[0]) == 2
+        store.append("person_2", face_encoding(2), "person_2.jpg", "00000002")
+        vectors, metadata = store.load()
+        assert len(vectors) == len(metadata) == 3
+        assert np.array_equal(vectors[2], face_encoding(2))
+
+def test_migration_keeps_registration_times():
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_path = os.path.join(work_dir, "Jenny_a441b66f.jpg")
+        with open(image_path, "wb") as f:
+            f.write(b"jpeg")
+        os.utime(image_path, (1600000000, 1600000000))
+
+        pickle_path = os.path.join(work_dir, "face_encodings.pkl")
+        with open(pickle_path, "wb") as f:
+            pickle.dump([
+                {"name": "Ann", "encoding": face_encoding(1), "id": "00000001", "timestamp": "2021-05-01T10:00:00"},
+                {"name": "Jenny", "encoding": face_encoding(2), "image_path": image_path},
+                {"name": "Bob", "encoding": face_encoding(3), "id": "00000003"},
+            ], f)
+        os.utime(pickle_path, (1650000000, 1650000000))
+
+        store = open_store(os.path.join(work_dir, "face_store"), pickle_path)
+        ann, jenny, bob = store.load_metadata()
+        assert ann["timestamp"] == "2021-05-01T10:00:00"
+        assert jenny["timestamp"] == datetime.fromtimestamp(1600000000).isoformat()
+        assert jenny["id"] == "a441b66f"
+        assert bob["timestamp"] == datetime.fromtimestamp(1650000000).isoformat()
+
+def main():
+    print("🚀 Face Store Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_torn_tail_is_dropped, test_unpaired_vectors_are_dropped,
+                 test_migration_keeps_registration_times):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Store rows stay paired")
+
+if __name__ == "__main__":
+    main()
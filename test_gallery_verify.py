@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Gallery verification resume and swap test
+Run with: python test_gallery_verify.py (or pytest test_gallery_verify.py)
+
+Fills the verify progress directly (no detector needed). A run may resume
+over a store that only gained rows, never over a different store, and a
+swap must install an index built over the new encodings instead of leaving
+the old one behind. It must not replace a store a running process holds, nor
+slip in between a registration's two files.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from face_config import load_config
+from face_index import IVFIndex, load_or_build_index
+from face_gallery import FaceGallery
+from face_store import EncodingStore
+from gallery_verify import (VerifyProgress, rebuild_index, rebuild_store, rebuilt_index_path,
+                            store_fingerprint, swap_store)
+
+ROWS = 200
+
+def face_encoding(face_no):
+    return np.random.default_rng(face_no).normal(0, 0.1, 128).astype(np.float32)
+
+def make_store(store_dir, rows=ROWS, offset=0):
+    store = EncodingStore(store_dir)
+    store.append_many([face_encoding(offset + i) for i in range(rows)],
+                      [store.make_record(f"person_{i}", f"person_{i}.jpg", f"{i:08x}") for i in range(rows)])
+    return store
+
+def ivf_config(index_file):
+    config = load_config("does-not-exist.ini")
+    config.set("INDEX", "backend", "ivf")
+    config.set("INDEX", "nlist", "8")
+    config.set("INDEX", "index_file", index_file)
+    return config
+
+def verified(store, work_dir):
+    """Progress as a finished run leaves it: every row re-encoded (here: slightly moved)"""
+    vectors, metadata = store.load()
+    progress = VerifyProgress(work_dir)
+    progress.check_store(vectors)
+    progress.append(np.asarray(vectors) + 0.01, [{"row": row, "status": "ok"} for row in range(len(metadata))])
+    return metadata, progress
+
+def test_resume_only_over_the_same_store():
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = make_store(os.path.join(work_dir, "face_store"))
+        progress = VerifyProgress(os.path.join(work_dir, "verify"))
+        progress.check_store(store.load()[0])
+
+        # Rows registered since the last run: resuming is fine
+        store.append("late", face_encoding(999), "late.jpg", "000003e7")
+        progress.check_store(store.load()[0])
+
+        # Same size and same first row, one changed row further in: another store
+        other = make_store(os.path.join(work_dir, "other"), rows=0)
+        vectors = [face_encoding(i) for i in range(ROWS)] + [face_encoding(999)]
+        vectors[ROWS // 2] = face_encoding(12345)
+        other.append_many(vectors, [other.make_record("x", "x.jpg", f"{i:08x}") for i in range(ROWS + 1)])
+        assert store_fingerprint(other.load()[0]) != store_fingerprint(store.load()[0])
+        try:
+            progress.check_store(other.load()[0])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("resuming over a different store should fail")
+
+def test_swap_installs_a_matching_index():
+    with tempfile.TemporaryDirectory() as work_dir:
+        store_dir = os.path.join(work_dir, "face_store")
+        index_file = os.path.join(store_dir, "index.npz")
+        config = ivf_config(index_file)
+        store = make_store(store_dir)
+        vectors, metadata = store.load()
+        load_or_build_index(FaceGallery.from_arrays(vectors, [m["name"] for m in metadata], metadata), config)
+        assert os.path.exists(index_file)
+
+        metadata, progress = verified(store, os.path.join(work_dir, "verify"))
+        rebuilt_dir = store_dir + ".rebuilt"
+        rebuilt = rebuild_store(metadata, progress, rebuilt_dir)
+        rebuilt_index = rebuild_index(rebuilt, rebuilt_index_path(store_dir, rebuilt_dir, index_file), config)
+        assert rebuilt_index == os.path.join(rebuilt_dir, "index.npz")
+        backup_dir = swap_store(store_dir, rebuilt_dir, len(metadata), index_file, rebuilt_index)
+
+        assert os.path.exists(os.path.join(backup_dir, "index.npz"))
+        index = IVFIndex.load(index_file)
+        new_vectors = EncodingStore(store_dir).load_vectors()
+        assert index.count == ROWS
+        # Built over the re-encoded vectors: every row sits in the list of its nearest centroid
+        nearest = np.linalg.norm(np.asarray(new_vectors)[:, None, :] - index.centroids[None, :, :], axis=2).argmin(axis=1)
+        for list_no, rows in enumerate(index.lists):
+            assert (nearest[rows] == list_no).all()
+
+def swap_with_outside_index(backend):
+    """Rebuild and swap with index_file outside the store; returns (index_file, rebuilt index path)"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        store_dir = os.path.join(work_dir, "face_store")
+        index_file = os.path.join(work_dir, "cache", "index.npz")
+        os.makedirs(os.path.dirname(index_file))
+        with open(index_file, "wb") as f:
+            f.write(b"stale")
+
+        config = ivf_config(index_file)
+        config.set("INDEX", "backend", backend)
+        metadata, progress = verified(make_store(store_dir), os.path.join(work_dir, "verify"))
+        rebuilt_dir = store_dir + ".rebuilt"
+        rebuilt = rebuild_store(metadata, progress, rebuilt_dir)
+        rebuilt_index = rebuild_index(rebuilt, rebuilt_index_path(store_dir, rebuilt_dir, index_file), config)
+        swap_store(store_dir, rebuilt_dir, len(metadata), index_file, rebuilt_index)
+
+        installed = IVFIndex.load(index_file).count if os.path.exists(index_file) else None
+        return installed, rebuilt_index and os.path.relpath(rebuilt_index, work_dir), \
+            rebuilt_index is not None and os.path.exists(rebuilt_index)
+
+def test_swap_replaces_or_drops_an_outside_index():
+    installed, staged, left_behind = swap_with_outside_index("ivf")
+    assert installed == ROWS
+    assert staged == os.path.join("cache", "index.rebuilt.npz") and not left_behind
+
+    # Brute force caches nothing: the stale file must not outlive the swap
+    installed, staged, _ = swap_with_outside_index("brute")
+    assert installed is None and staged is None
+
+def test_swap_waits_for_writers_and_respects_leases():
+    with tempfile.TemporaryDirectory() as work_dir:
+        store_dir = os.path.join(work_dir, "face_store")
+        store = make_store(store_dir)
+        metadata, progress = verified(store, os.path.join(work_dir, "verify"))
+        rebuilt_dir = store_dir + ".rebuilt"
+        rebuild_store(metadata, progress, rebuilt_dir)
+
+        # A running backend holds a lease: no swap without --force
+        lease = store.hold()
+        assert store.in_use()
+        try:
+            swap_store(store_dir, rebuilt_dir, len(metadata))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("swapping a store in use should fail")
+        assert os.path.isdir(rebuilt_dir)
+        os.close(lease)
+        assert not store.in_use()
+
+        # A registration mid-write holds the store lock: the swap waits for it
+        swapped = []
+        with store._lock():
+            swapper = threading.Thread(target=lambda: swapped.append(swap_store(store_dir, rebuilt_dir, len(metadata))))
+            swapper.start()
+            time.sleep(0.2)
+            assert not swapped and os.path.isdir(rebuilt_dir)
+        swapper.join(5)
+        assert swapped and os.path.isdir(swapped[0]) and not os.path.exists(rebuilt_dir)
+
+def main():
+    print("🚀 Gallery Verify Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_resume_only_over_the_same_store, test_swap_installs_a_matching_index,
+                 test_swap_replaces_or_drops_an_outside_index, test_swap_waits_for_writers_and_respects_leases):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Rebuilt stores come with a matching index")
+
+if __name__ == "__main__":
+    main()
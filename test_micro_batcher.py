@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Micro batcher test
+Run with: python test_micro_batcher.py (or pytest test_micro_batcher.py)
+
+Concurrent callers share process() calls but each gets back the result of
+its own item; a batch never grows past max_batch units, and a failing batch
+fails only its own callers.
+"""
+
+import sys
+import threading
+
+from micro_batcher import MicroBatcher
+
+CALLERS = 40
+
+def test_concurrent_callers_share_batches():
+    calls = []
+
+    def process(items):
+        calls.append(list(items))
+        return [[value * 2 for value in item] for item in items]
+
+    batcher = MicroBatcher(process, max_batch=16, max_wait=0.05)
+    results = {}
+    start = threading.Barrier(CALLERS)
+
+    def caller(caller_no):
+        start.wait()
+        results[caller_no] = batcher([caller_no, caller_no + 1000], timeout=5)
+
+    threads = [threading.Thread(target=caller, args=(caller_no,)) for caller_no in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert results == {n: [n * 2, (n + 1000) * 2] for n in range(CALLERS)}
+    assert len(calls) < CALLERS, f"{len(calls)} process() calls for {CALLERS} callers"
+    # A batch closes as soon as it reaches max_batch units (two per item here)
+    assert max(sum(len(item) for item in batch) for batch in calls) <= 16
+    stats = batcher.stats()
+    assert stats["items"] == CALLERS and stats["batches"] == len(calls)
+
+def test_failing_batch_fails_only_its_callers():
+    def process(items):
+        if "bad" in items:
+            raise ValueError("bad item")
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(process, max_wait=0.0, size=lambda item: 1)
+    failed = batcher.submit("bad")
+    try:
+        failed.result(5)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("the failing batch should raise in its caller")
+
+    # The batching thread survives and serves later callers
+    assert batcher("good", timeout=5) == "GOOD"
+
+def main():
+    print("🚀 Micro Batcher Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_concurrent_callers_share_batches, test_failing_batch_fails_only_its_callers):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Concurrent callers share gallery queries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Motion gate test
+Run with: python test_motion_gate.py (or pytest test_motion_gate.py)
+
+Still frames and sensor noise are skipped, a moving object is not, slow
+drift adds up against the last analysed frame, and a frame is analysed
+again after max_idle seconds or a reset().
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from face_config import load_config
+from motion_gate import MotionGate
+
+def scene(shift=0, brightness=0):
+    """640x480 BGR frame with a bright square `shift` pixels right of its start"""
+    frame = np.full((480, 640, 3), 60 + brightness, dtype=np.uint8)
+    frame[180:300, 100 + shift:220 + shift] = 220
+    return frame
+
+def test_still_frames_are_skipped():
+    gate = MotionGate()
+    assert gate.changed(scene())
+    noise = np.random.default_rng(0).integers(-4, 5, (480, 640, 3))
+    assert not gate.changed(np.clip(scene().astype(int) + noise, 0, 255).astype(np.uint8))
+    assert not gate.changed(scene())
+    assert gate.changed(scene(shift=120))
+    assert gate.stats() == {"checked": 4, "skipped": 2, "skip_rate": 0.5}
+
+def test_drift_adds_up_against_the_analysed_frame():
+    gate = MotionGate()
+    assert gate.changed(scene())
+    # Each step is too small to notice next to the previous frame, not next to the first
+    steps = [gate.changed(scene(shift=shift)) for shift in range(2, 80, 2)]
+    assert not steps[0] and any(steps)
+
+def test_idle_and_reset_force_analysis():
+    gate = MotionGate(max_idle=0.1)
+    assert gate.changed(scene())
+    assert not gate.changed(scene())
+    time.sleep(0.15)
+    assert gate.changed(scene())
+    gate.reset()
+    assert gate.changed(scene())
+
+def test_disabled_in_config():
+    config = load_config("does-not-exist.ini")
+    config.set("MOTION", "enabled", "false")
+    assert MotionGate.from_config(config) is None
+    config.set("MOTION", "enabled", "true")
+    assert isinstance(MotionGate.from_config(config), MotionGate)
+
+def main():
+    print("🚀 Motion Gate Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_still_frames_are_skipped, test_drift_adds_up_against_the_analysed_frame,
+                 test_idle_and_reset_force_analysis, test_disabled_in_config):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Only frames that moved reach the detector")
+
+if __name__ == "__main__":
+    main()
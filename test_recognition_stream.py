@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Recognition stream test
+Run with: python test_recognition_stream.py (or pytest test_recognition_stream.py)
+
+While an analysis is running, newer frames replace each other instead of
+queueing: the next result is for the newest frame and the rest are counted
+as dropped. Streams are capped at max_streams, and a client reconnecting
+with its id replaces (and closes) its old stream without using a new slot.
+"""
+
+import sys
+import threading
+
+from recognition_stream import RecognitionStreams, StreamLimitReached
+
+def slow_analysis():
+    """analyze() that blocks on the first frame until released and records what it saw"""
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def analyze(data):
+        started.set()
+        release.wait(5)
+        seen.append(data.decode())
+        return {"frame": data.decode()}
+    return analyze, started, release, seen
+
+def test_newest_frame_wins():
+    streams = RecognitionStreams()
+    analyze, started, release, seen = slow_analysis()
+    stream = streams.open("kiosk", analyze)
+    try:
+        stream.submit(b"1")
+        assert started.wait(5)
+        for frame_no in range(2, 6):
+            stream.submit(str(frame_no).encode())
+        release.set()
+
+        # Results are newest-wins as well: whatever comes last is frame 5
+        result = stream.next_result(5)
+        while result[0] != 5:
+            result = stream.next_result(5)
+        assert result == (5, {"frame": "5"})
+        assert stream.next_result(0.2) is None
+        assert seen == ["1", "5"], seen
+        stats = streams.stats()
+        assert stats["frames"] == 5 and stats["analysed"] == 2 and stats["dropped"] == 3, stats
+    finally:
+        streams.close(stream)
+
+def test_limit_and_reconnect():
+    streams = RecognitionStreams(max_streams=2)
+    echo = lambda data: data
+    first = streams.open("a", echo)
+    streams.open("b", echo)
+    try:
+        streams.open("c", echo)
+    except StreamLimitReached:
+        pass
+    else:
+        raise AssertionError("a third stream should be refused")
+
+    # Reconnecting reuses the client's slot and closes the stream it replaces
+    again = streams.open("a", echo)
+    assert again is not first and first.closed and streams.get("a") is again
+
+    # The old connection closing late must not drop the new stream
+    streams.close(first)
+    assert streams.get("a") is again
+    assert streams.stats()["open"] == 2 and streams.stats()["opened"] == 3
+
+    for stream_id in ("a", "b"):
+        streams.close(streams.get(stream_id))
+    assert streams.stats()["open"] == 0
+
+def main():
+    print("🚀 Recognition Stream Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_newest_frame_wins, test_limit_and_reconnect):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Slow analyses never build a queue")
+
+if __name__ == "__main__":
+    main()
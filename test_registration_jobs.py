@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Registration job test
+Run with: python test_registration_jobs.py (or pytest test_registration_jobs.py)
+
+Jobs report their steps and finish exactly once. A job whose group commit is
+held up waits for it, however long, and ends as the commit did, instead of
+reporting failure for a face that is registered a moment later.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+import numpy as np
+
+from face_gallery import FaceGallery, LiveGallery
+from face_index import BruteForceIndex
+from face_store import EncodingStore
+from registration_jobs import JOB_STEPS, JobQueueFull, RegistrationJobs
+from registration_writer import RegistrationWriter
+from user_registry import open_registry
+
+def wait_finished(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.finished, f"job still {job.status}"
+
+def test_job_reports_steps_and_result():
+    seen = []
+
+    def process(job, name):
+        for step in ("decoding", "detecting", "checking", "saving"):
+            job.update(step, step)
+            seen.append(job.to_dict()["progress"])
+        job.finish(True, f"registered {name}", user_id="00000001")
+
+    jobs = RegistrationJobs(process, workers=1)
+    job = jobs.submit("Alice", "Alice")
+    wait_finished(job)
+    jobs.shutdown()
+
+    assert seen == sorted(seen) and all(step in JOB_STEPS for step in ("decoding", "detecting", "checking", "saving"))
+    result = job.to_dict()
+    assert result["success"] and result["progress"] == 100 and result["user_id"] == "00000001"
+    assert jobs.pending() == 0
+
+def test_crash_and_queue_limit():
+    release = threading.Event()
+
+    def process(job, fail):
+        release.wait(5)
+        if fail:
+            raise RuntimeError("boom")
+
+    jobs = RegistrationJobs(process, workers=1, max_pending=2)
+    crashed = jobs.submit("Bob", True)
+    queued = jobs.submit("Carol", False)
+    try:
+        jobs.submit("Dave", False)
+    except JobQueueFull:
+        pass
+    else:
+        raise AssertionError("a third pending job should be refused")
+    release.set()
+    wait_finished(crashed)
+    wait_finished(queued)
+    jobs.shutdown()
+
+    assert crashed.status == "failed" and crashed.http_status == 500 and "boom" in crashed.message
+    # Returned without finishing: reported, not left pending forever
+    assert queued.status == "failed" and queued.http_status == 500
+
+def test_slow_commit_is_waited_for():
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = EncodingStore(os.path.join(work_dir, "face_store"))
+        live = LiveGallery(FaceGallery(), BruteForceIndex())
+        writer = RegistrationWriter(store, open_registry(os.path.join(work_dir, "users.db"), None, store), live).start()
+        messages = []
+
+        def process(job, name):
+            job.update("saving", "Saving registration")
+            pending = writer.submit(name, np.full(128, 0.05, dtype=np.float32),
+                                    os.path.join(work_dir, "Eve.jpg"), "00000005", b"jpeg")
+            job.wait_for(pending, 0.05, "Still saving")
+            messages.append(job.message)
+            job.finish(pending.success, pending.message, 200 if pending.success else 500)
+
+        jobs = RegistrationJobs(process, workers=1)
+        # Hold the writer well past several progress intervals
+        with live.write_lock:
+            job = jobs.submit("Eve", "Eve")
+            time.sleep(0.4)
+            assert not job.finished and job.message == "Still saving"
+        wait_finished(job)
+        jobs.shutdown()
+        writer.stop(timeout=5)
+
+        assert job.success and job.status == "done"
+        assert messages == ["Still saving"]
+        assert store.count() == 1 and live.snapshot.gallery.names[0] == "Eve"
+
+def main():
+    print("🚀 Registration Jobs Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_job_reports_steps_and_result, test_crash_and_queue_limit, test_slow_commit_is_waited_for):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Jobs end as their registrations did")
+
+if __name__ == "__main__":
+    main()
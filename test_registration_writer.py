@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Registration writer group-commit test
+Run with: python test_registration_writer.py (or pytest test_registration_writer.py)
+
+Registrations queued together are committed as one batch: a face already in
+the gallery, or registered earlier in the same batch, is rejected. When the
+store write fails the images are removed; when only the in-memory gallery
+update fails the committed faces keep their images and the gallery is
+rebuilt from the store.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from face_gallery import FaceGallery, LiveGallery
+from face_index import BruteForceIndex
+from face_store import EncodingStore
+from registration_writer import RegistrationWriter
+from user_registry import open_registry
+
+def face_encoding(face_no):
+    return np.random.default_rng(face_no).normal(0, 0.1, 128).astype(np.float32)
+
+class FailingStore(EncodingStore):
+    """Face store whose next append_many() raises"""
+    fail = True
+
+    def append_many(self, encodings, records):
+        if self.fail:
+            raise OSError("disk full")
+        return super().append_many(encodings, records)
+
+class FailingLiveGallery(LiveGallery):
+    """Live gallery whose extend() raises after the store write"""
+    def extend(self, names, encodings, metadata):
+        raise MemoryError("index update failed")
+
+def open_writer(work_dir, store_class=EncodingStore, live_class=LiveGallery):
+    store = store_class(os.path.join(work_dir, "face_store"))
+    registry = open_registry(os.path.join(work_dir, "users.db"), None, store)
+    live = live_class(FaceGallery(), BruteForceIndex())
+
+    def reload():
+        def build():
+            vectors, metadata = store.load()
+            gallery = FaceGallery.from_arrays(vectors, [entry["name"] for entry in metadata], metadata)
+            index = BruteForceIndex()
+            index.build(gallery)
+            return gallery, index
+        return live.rebuild(build)
+
+    return RegistrationWriter(store, registry, live, reload=reload), store, live
+
+def submit(writer, work_dir, name, face_no, unique_id):
+    image_path = os.path.join(work_dir, "images", f"{name}_{unique_id}.jpg")
+    return writer.submit(name, face_encoding(face_no), image_path, unique_id, image_bytes=b"jpeg")
+
+def commit_all(writer, pendings):
+    """Start the writer after queueing, so everything lands in one batch"""
+    writer.start()
+    writer.stop(timeout=10)
+    assert all(pending.done for pending in pendings)
+
+def test_duplicates_rejected_within_and_across_batches():
+    with tempfile.TemporaryDirectory() as work_dir:
+        writer, store, live = open_writer(work_dir)
+        alice = submit(writer, work_dir, "Alice", 1, "00000001")
+        again = submit(writer, work_dir, "Alice2", 1, "00000002")
+        bob = submit(writer, work_dir, "Bob", 2, "00000003")
+        commit_all(writer, [alice, again, bob])
+
+        assert alice.success and bob.success
+        assert not again.success and again.duplicate_of == "Alice"
+        assert alice.batch_size == 3
+        assert store.count() == 2 and len(live.snapshot) == 2
+
+        later = submit(writer, work_dir, "Mallory", 2, "00000004")
+        commit_all(writer, [later])
+        assert not later.success and later.duplicate_of == "Bob"
+        assert store.count() == 2
+        assert writer.stats()["rejected"] == 2
+
+def test_failed_store_write_removes_images():
+    with tempfile.TemporaryDirectory() as work_dir:
+        writer, store, live = open_writer(work_dir, store_class=FailingStore)
+        pending = submit(writer, work_dir, "Carol", 3, "00000005")
+        commit_all(writer, [pending])
+
+        assert not pending.success
+        assert not os.path.exists(pending.image_path)
+        assert store.count() == 0 and len(live.snapshot) == 0
+
+def test_failed_gallery_update_keeps_committed_faces():
+    with tempfile.TemporaryDirectory() as work_dir:
+        writer, store, live = open_writer(work_dir, live_class=FailingLiveGallery)
+        pending = submit(writer, work_dir, "Dave", 4, "00000006")
+        commit_all(writer, [pending])
+
+        assert pending.success
+        assert os.path.exists(pending.image_path)
+        assert store.count() == 1
+        # Rebuilt from the store instead of being rolled back
+        assert len(live.snapshot) == 1 and live.snapshot.gallery.names[0] == "Dave"
+
+def main():
+    print("🚀 Registration Writer Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_duplicates_rejected_within_and_across_batches, test_failed_store_write_removes_images,
+                 test_failed_gallery_update_keeps_committed_faces):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Store, gallery and images agree")
+
+if __name__ == "__main__":
+    main()
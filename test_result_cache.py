@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Result cache test
+Run with: python test_result_cache.py (or pytest test_result_cache.py)
+
+A cached result is only served for the gallery version it was computed on:
+registering a face publishes a new version and every older entry misses.
+Entries also expire after the TTL, the least recently used one is evicted
+first, and the perceptual key matches a re-encoded copy of the same frame.
+"""
+
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from face_gallery import LiveGallery
+from result_cache import ResultCache, content_key, perceptual_key
+
+def frame():
+    """Smooth 480x640 gradient with a dark block, like a still camera view"""
+    rows, cols = np.mgrid[0:480, 0:640]
+    image = np.stack([(rows // 2) % 256, (cols // 3) % 256, ((rows + cols) // 4) % 256], axis=2).astype(np.uint8)
+    image[100:250, 300:450] = 20
+    return image
+
+def test_new_gallery_version_invalidates():
+    live = LiveGallery()
+    cache = ResultCache()
+    key = content_key(b"jpeg bytes")
+    result = {"faces": [], "message": "No faces detected"}
+
+    version = live.snapshot.version
+    cache.put([key], result, version)
+    assert cache.get(key, live.snapshot.version) == result
+
+    live.append("alice", np.random.default_rng(1).normal(0, 0.1, 128), {"id": "1"})
+    assert live.snapshot.version != version
+    assert cache.get(key, live.snapshot.version) is None
+    # The stale entry is dropped, not just skipped
+    assert cache.get(key, version) is None
+    assert cache.stats()["stale"] == 1 and cache.stats()["entries"] == 0
+
+def test_ttl_and_lru_eviction():
+    cache = ResultCache(max_entries=2, ttl=0.1)
+    cache.put(["a"], 1, 1)
+    cache.put(["b"], 2, 1)
+    assert cache.get("a", 1) == 1
+    cache.put(["c"], 3, 1)
+    # "b" was the least recently used
+    assert cache.get("b", 1) is None and cache.get("a", 1) == 1 and cache.get("c", 1) == 3
+
+    time.sleep(0.15)
+    assert cache.get("a", 1) is None
+
+def test_perceptual_key_matches_a_re_encoded_frame():
+    original = frame()
+    ok, jpeg = cv2.imencode(".jpg", original, [cv2.IMWRITE_JPEG_QUALITY, 60])
+    assert ok
+    copy = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+    assert content_key(original.tobytes()) != content_key(copy.tobytes())
+    assert perceptual_key(copy) == perceptual_key(original)
+
+    other = original.copy()
+    other[:, :320] = other[:, 320:][:, ::-1]
+    assert perceptual_key(other) != perceptual_key(original)
+
+def main():
+    print("🚀 Result Cache Test")
+    print("=" * 50)
+    failed = 0
+    for test in (test_new_gallery_version_invalidates, test_ttl_and_lru_eviction,
+                 test_perceptual_key_matches_a_re_encoded_frame):
+        try:
+            test()
+            print(f"   ✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ {test.__name__}: {e}")
+    if failed:
+        sys.exit(1)
+    print("🎉 Cached results never outlive their gallery")
+
+if __name__ == "__main__":
+    main()
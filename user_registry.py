@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+User Registry Module - Transactional SQLite registry of registered users
+
+Replaces the read/concat/rewrite of registered_users.xlsx on every
+registration. Lookups by id and (case-insensitive) name are indexed; the
+spreadsheet is still available as an on-demand or batched export.
+"""
+
+import os
+import sys
+import sqlite3
+from datetime import datetime
+
+REGISTRY_FILE = "registered_users.db"
+EXCEL_FILE = "registered_users.xlsx"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    image_path TEXT NOT NULL DEFAULT '',
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Active'
+);
+CREATE INDEX IF NOT EXISTS users_name_key ON users (name_key);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+USER_COLUMNS = "id, name, image_path, timestamp, status"
+
+class UserRegistry:
+    """SQLite-backed registry; every call uses its own short-lived connection"""
+
+    def __init__(self, db_path=REGISTRY_FILE, excel_path=EXCEL_FILE, excel_export_every=0):
+        self.db_path = db_path
+        self.excel_path = excel_path
+        self.excel_export_every = int(excel_export_every)
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return _Transaction(conn)
+
+    @staticmethod
+    def _row_to_user(row):
+        return dict(row) if row is not None else None
+
+    def add_user(self, name, unique_id, image_path="", timestamp=None, status="Active"):
+        """Register one user in its own transaction"""
+        return self.add_users([{
+            "name": name,
+            "id": unique_id,
+            "image_path": image_path,
+            "timestamp": timestamp,
+            "status": status
+        }])
+
+    def add_users(self, users, export=True):
+        """Register several users atomically; existing ids are left untouched"""
+        rows = [(
+            user["id"],
+            user["name"],
+            user["name"].strip().lower(),
+            user.get("image_path") or "",
+            user.get("timestamp") or datetime.now().isoformat(),
+            user.get("status") or "Active"
+        ) for user in users]
+
+        with self._connect() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO users (id, name, name_key, image_path, timestamp, status) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            added = cursor.rowcount
+
+        if export:
+            self.export_excel_if_due()
+        return added
+
+    def name_exists(self, name):
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM users WHERE name_key = ? LIMIT 1",
+                               (name.strip().lower(),)).fetchone()
+        return row is not None
+
+    def get_user(self, unique_id):
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {USER_COLUMNS} FROM users WHERE id = ?", (unique_id,)).fetchone()
+        return self._row_to_user(row)
+
+    def find_by_name(self, name):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {USER_COLUMNS} FROM users WHERE name_key = ? ORDER BY seq",
+                                (name.strip().lower(),)).fetchall()
+        return [self._row_to_user(row) for row in rows]
+
+    @staticmethod
+    def _prefix_filter(prefix):
+        """Index-friendly range condition for a case-insensitive name prefix"""
+        if not prefix:
+            return "", ()
+        key = prefix.strip().lower()
+        return " WHERE name_key >= ? AND name_key < ?", (key, key + "\U0010ffff")
+
+    def list_users(self, offset=0, limit=None, prefix=None):
+        """Users in registration order, optionally one page and/or a name prefix"""
+        where, params = self._prefix_filter(prefix)
+        query = f"SELECT {USER_COLUMNS} FROM users{where} ORDER BY seq"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += (int(limit), int(offset))
+        elif offset:
+            query += " LIMIT -1 OFFSET ?"
+            params += (int(offset),)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._row_to_user(row) for row in rows]
+
+    def count(self, prefix=None):
+        where, params = self._prefix_filter(prefix)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM users{where}", params).fetchone()[0]
+
+    def sync_with_store(self, store):
+        """Mirror face store rows the registry has not seen yet (e.g. a failed registry write)
+
+        Follows the store's metadata sidecar from the last synced byte offset,
+        so each call only reads what was appended since the previous one.
+        """
+        with self._connect() as conn:
+            offset = int(self._get_setting(conn, "store_synced_offset", 0))
+
+        records, next_offset = store.read_metadata_from(offset)
+        if next_offset == offset:
+            return 0
+
+        added = self.add_users(records, export=False)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('store_synced_offset', ?)",
+                         (str(next_offset),))
+        if added:
+            print(f"📇 Registry picked up {added} face(s) from {store.store_dir}")
+        return added
+
+    def _get_setting(self, conn, key, default=None):
+        row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def export_excel(self, path=None):
+        """Write the whole registry to an Excel workbook (same columns as before)"""
+        import pandas as pd
+
+        path = path or self.excel_path
+        with self._connect() as conn:
+            rows = conn.execute("SELECT seq, name, id, image_path, timestamp, status FROM users ORDER BY seq").fetchall()
+            last_seq = rows[-1]["seq"] if rows else 0
+
+        df = pd.DataFrame(
+            [[row["name"], row["id"], row["image_path"], row["timestamp"], row["status"]] for row in rows],
+            columns=["Name", "ID", "Image", "Timestamp", "Status"]
+        )
+        df.to_excel(path, index=False)
+
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('excel_exported_seq', ?)",
+                         (str(last_seq),))
+
+        print(f"📊 Exported {len(df)} users to {path}")
+        return len(df)
+
+    def export_excel_if_due(self):
+        """Batched export: rewrite the workbook once every `excel_export_every` registrations"""
+        if self.excel_export_every <= 0:
+            return False
+
+        with self._connect() as conn:
+            exported_seq = int(self._get_setting(conn, "excel_exported_seq", 0))
+            pending = conn.execute("SELECT COUNT(*) FROM users WHERE seq > ?", (exported_seq,)).fetchone()[0]
+
+        if pending < self.excel_export_every:
+            return False
+
+        try:
+            self.export_excel()
+            return True
+        except Exception as e:
+            print(f"⚠️ Excel export warning: {e}")
+            return False
+
+    def import_excel(self, path=None):
+        """One-shot import of an existing registered_users.xlsx"""
+        import pandas as pd
+
+        path = path or self.excel_path
+        df = pd.read_excel(path)
+        users = []
+        for _, row in df.iterrows():
+            if pd.isna(row.get("ID")) or pd.isna(row.get("Name")):
+                continue
+            users.append({
+                "id": str(row["ID"]),
+                "name": str(row["Name"]),
+                "image_path": "" if pd.isna(row.get("Image")) else str(row["Image"]),
+                "timestamp": None if pd.isna(row.get("Timestamp")) else str(row["Timestamp"]),
+                "status": "Active" if pd.isna(row.get("Status")) else str(row["Status"])
+            })
+        return self.add_users(users, export=False)
+
+class _Transaction:
+    """Context manager: commit on success, roll back on error, always close"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+def open_registry(db_path=REGISTRY_FILE, excel_path=EXCEL_FILE, store=None, excel_export_every=0):
+    """Open the registry, seeding it from the legacy workbook and face store on first use"""
+    registry = UserRegistry(db_path, excel_path, excel_export_every)
+
+    if registry.count() == 0:
+        imported = 0
+        if excel_path and os.path.exists(excel_path):
+            try:
+                imported += registry.import_excel(excel_path)
+            except Exception as e:
+                print(f"⚠️  Could not import {excel_path}: {e}")
+
+        if imported:
+            print(f"📇 Seeded user registry {db_path} with {imported} users from {excel_path}")
+
+    # Faces without a registry row (older versions, failed writes) still count as users
+    if store is not None and store.exists():
+        registry.sync_with_store(store)
+
+    return registry
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--export-excel":
+        path = sys.argv[2] if len(sys.argv) > 2 else EXCEL_FILE
+        UserRegistry().export_excel(path)
+    else:
+        registry = UserRegistry()
+        print(f"📇 {registry.db_path}: {registry.count()} users")
+        print("💡 Usage: python user_registry.py --export-excel [path]")